@@ -21,19 +21,15 @@ def validate_pmid(pmid):
         return False
 
 pmids = list(set(open(filename, 'r').readlines()))
-
-for pmid in [item.strip() for item in pmids if validate_pmid(item)]:
-    print(pmid)
-    try:
-        src = FindIt(pmid=pmid, debug=True)
-        print(pmid, src.doi, src.pma.title)
-        if src.url:
-            print(src.url)
-        else:
-            print(src.reason)
-    except Exception as error:
-        print(error)
+pmids = [item.strip() for item in pmids if validate_pmid(item)]
+
+# FindIt.batch looks up PMIDs already in the FindIt cache in bulk, and runs the rest
+# concurrently (with a limit on requests to any one publisher).
+for result in FindIt.batch(pmids, workers=8):
+    print(result.pmid, result.doi, result.journal)
+    if result.url:
+        print(result.url)
+    else:
+        print(result.reason)
 
     print()
-
-
@@ -5,15 +5,20 @@ __path__ = extend_path(__path__, __name__)
 
 from .pubmedarticle import PubMedArticle
 from .pubmedauthor import PubMedAuthor
+from .pubmedrecord import PubMedRecord
 from .pubmedfetcher import PubMedFetcher
 from .medgenfetcher import MedGenFetcher
 from .medgenconcept import MedGenConcept
 from .clinvarfetcher import ClinVarFetcher
 from .clinvarvariant import ClinVarVariant
 from .crossref import CrossRef
-from .findit import FindIt
+from .findit import FindIt, FindItPool
 from .dx_doi import DxDOI
 from .urlreverse import UrlReverse
 
+import six
+if six.PY3:
+    from .asyncpubmedfetcher import AsyncPubMedFetcher
+
 __version__ = '0.4.3.5'
 
@@ -0,0 +1,222 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.AsyncPubMedFetcher -- asyncio interface to PubMed via NCBI's E-utilities (python 3 only)'''
+
+import asyncio
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .eutils_common import get_cache_path, get_eutils_client, check_eutils_response
+from .pubmedarticle import PubMedArticle
+from .pubmedfetcher import (build_pubmed_query, parse_esearch_result, split_pubmed_article_set,
+                            parse_related_pmids_result)
+from . import ratelimit
+from .exceptions import MetaPubError, EutilsRequestError, InvalidPMID
+from .config import DEFAULT_EMAIL
+
+if aiohttp is None:
+    _RETRY_ERRORS = (asyncio.TimeoutError, )
+else:
+    _RETRY_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class AsyncPubMedFetcher(object):
+    '''AsyncPubMedFetcher (requires python 3 and aiohttp: pip install metapub[async])
+
+    Asyncio counterpart of PubMedFetcher. All lookups are coroutines, so many of them
+    can be in flight at once while NCBI's request limits (3 requests per second, or
+    10 per second with an api_key) are respected by the token bucket shared by every
+    fetcher and NCBI request in the process.
+
+    The SQLite cache is the same file, with the same keys, as PubMedFetcher's, so
+    results fetched by one are cache hits for the other.
+
+    Basic Usage:
+
+        async with AsyncPubMedFetcher() as fetch:
+            paper = await fetch.article_by_pmid('123456')
+            papers = await fetch.articles_by_pmids(list_of_pmids)
+            pmids = await fetch.pmids_for_query('breast cancer', since='2015')
+            related = await fetch.related_pmids('123456')
+
+    If not used as a context manager, call `await fetch.close()` when done.
+
+    AsyncPubMedFetcher is not a Borg: its HTTP session belongs to the event loop
+    in which it was first used, so create one per event loop.
+    '''
+
+    _cache_filename = 'eutils-cache.db'
+    _log = logging.getLogger('metapub.AsyncPubMedFetcher')
+
+    def __init__(self, api_key=None, email=DEFAULT_EMAIL, cachedir='default', max_connections=10,
+                 session=None):
+        if aiohttp is None and session is None:
+            raise MetaPubError('AsyncPubMedFetcher requires the aiohttp package (pip install aiohttp)')
+
+        self._cache_path = get_cache_path(cachedir, self._cache_filename)
+        # the synchronous client supplies query args, cache keys and cache storage,
+        # so that both fetchers read and write identical cache entries.
+        self.qs = get_eutils_client(self._cache_path, email=email, api_key=api_key)
+        self.bucket = ratelimit.get_ncbi_bucket(api_key)
+        self.max_connections = max_connections
+        self.last_missing_pmids = []
+        self._session = session
+        self._own_session = session is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """ closes the HTTP session (if this fetcher created it). """
+        if self._session is not None and self._own_session:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._own_session = True
+        return self._session
+
+    async def _query(self, path, args):
+        """ returns content of reply to the eutils `path` (e.g. '/efetch.fcgi') for
+        query `args`, from the cache if possible. Network requests are throttled by
+        the shared NCBI token bucket, and retried as by metapub.ratelimit.request.
+
+        :rtype: bytes
+        """
+        url, full_args, cache_key = self.qs.prepare_query(path, args)
+
+        # cache reads and writes block (SQLite, decompression), so they run in the
+        # loop's default executor rather than stalling every other request.
+        loop = asyncio.get_event_loop()
+        content = await loop.run_in_executor(None, self.qs.cache_get, cache_key)
+        if content is not None:
+            return content
+
+        policy = ratelimit.get_policy(url)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.bucket.reserve())
+            try:
+                async with self._get_session().post(url, data=full_args) as response:
+                    content = await response.read()
+            except _RETRY_ERRORS as error:
+                if attempt >= policy.retries:
+                    raise
+                delay = policy.backoff(attempt)
+                self._log.info('POST %s failed (%r); retrying in %.1fs', url, error, delay)
+            else:
+                if response.status not in ratelimit.RETRY_STATUS_CODES or attempt >= policy.retries:
+                    break
+                delay = policy.backoff(attempt, response)
+                self._log.info('POST %s returned %i; retrying in %.1fs', url, response.status, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        check_eutils_response(response.status, response.reason, content)
+
+        await loop.run_in_executor(None, self.qs.cache_put, cache_key, content)
+        return content
+
+    async def efetch(self, args):
+        return await self._query('/efetch.fcgi', args)
+
+    async def esearch(self, args):
+        return await self._query('/esearch.fcgi', args)
+
+    async def elink(self, args):
+        return await self._query('/elink.fcgi', args)
+
+    async def article_by_pmid(self, pmid):
+        '''returns a PubMedArticle for the given pmid.
+
+        :param: pmid (string or int)
+        :return: PubMedArticle
+        :raises InvalidPMID: if pmid is not found in pubmed
+        '''
+        pmid = str(pmid)
+        try:
+            result = await self.efetch({'db': 'pubmed', 'id': pmid})
+        except EutilsRequestError:
+            raise MetaPubError('Invalid ID "%s" (rejected by Eutils); please check the number and try again.' % pmid)
+        pma = PubMedArticle(result)
+        if pma.pmid is None:
+            raise InvalidPMID('Pubmed ID "%s" not found' % pmid)
+        return pma
+
+    async def articles_by_pmids(self, pmids, chunk_size=200):
+        '''returns a list of PubMedArticle objects for the supplied pubmed IDs,
+        requesting them in batches of `chunk_size` PMIDs per efetch. All batches
+        are requested concurrently (subject to the rate limit); articles are returned
+        in batch order, each batch in the order eutils returns it.
+
+        As with PubMedFetcher.articles_by_pmids, PMIDs that are malformed, rejected
+        by eutils, or absent from the results are collected in self.last_missing_pmids.
+
+        :param: pmids (list of strings or ints)
+        :param: chunk_size (int) default 200
+        :return: list of PubMedArticle objects
+        '''
+        missing = []
+        wanted = []
+        seen = set()
+        for pmid in pmids:
+            pmid = str(pmid).strip()
+            if not pmid.isdigit():
+                self._log.debug('Skipping invalid PMID "%s"', pmid)
+                missing.append(pmid)
+            elif pmid not in seen:
+                seen.add(pmid)
+                wanted.append(pmid)
+
+        chunks = [wanted[idx:idx + chunk_size] for idx in range(0, len(wanted), chunk_size)]
+        results = await asyncio.gather(*[self.efetch({'db': 'pubmed', 'id': ','.join(chunk)})
+                                         for chunk in chunks], return_exceptions=True)
+
+        articles = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, EutilsRequestError):
+                self._log.info('efetch of %i PMIDs rejected by Eutils: %r', len(chunk), result)
+                missing.extend(chunk)
+                continue
+            elif isinstance(result, BaseException):
+                raise result
+
+            found = set()
+            for pmid, xml in split_pubmed_article_set(result):
+                found.add(pmid)
+                articles.append(PubMedArticle(xml))
+            missing.extend([pmid for pmid in chunk if pmid not in found])
+
+        self.last_missing_pmids = missing
+        return articles
+
+    async def pmids_for_query(self, query='', since=None, until=None, retstart=0, retmax=250,
+                              pmc_only=False, **kwargs):
+        '''returns list of pmids for given freeform query string plus keyword arguments.
+        See PubMedFetcher.pmids_for_query for the supported parameters.
+
+        :return: list of pmids (strings)
+        '''
+        query = build_pubmed_query(query, since=since, until=until, pmc_only=pmc_only, **kwargs)
+        result = await self.esearch({'db': 'pubmed', 'term': query, 'retstart': retstart, 'retmax': retmax})
+        return parse_esearch_result(result)
+
+    async def related_pmids(self, pmid):
+        '''For supplied pmid, return related ids of related pubmed articles,
+        organized into a dictionary keyed by type of relation.  See
+        PubMedFetcher.related_pmids.
+
+        :return: dict
+        '''
+        xmlstr = await self.elink({'dbfrom': 'pubmed', 'id': pmid, 'cmd': 'neighbor'})
+        return parse_related_pmids_result(xmlstr)
@@ -39,6 +39,22 @@ def parse_elink_response(xmlstr):
     return None
 
 
+def first_children(elem, tags):
+    """ returns dict of tag -> first child element of elem with that tag, for each of
+    tags found among elem's children, in one pass over them (cheaper than a find()
+    per tag for the small elements of PubMed XML, e.g. an Author or a MeshHeading).
+
+    :param elem: lxml element
+    :param tags: set (or frozenset) of tag names
+    :return: dict
+    """
+    found = {}
+    for child in elem.iterchildren():
+        if child.tag in tags and child.tag not in found:
+            found[child.tag] = child
+    return found
+
+
 class MetaPubObject(object):
     """ Base class for XML parsing objects (e.g. PubMedArticle)
     """
@@ -46,13 +62,16 @@ class MetaPubObject(object):
     def __init__(self, xml, root=None, *args, **kwargs):
         '''Instantiate with "xml" as string or bytes containing valid XML.
 
-        Supply name of root element (string) to set virtual top level. (optional).''' 
- 
+        Supply name of root element (string) to set virtual top level. (optional).
+
+        With retain_xml=False (keyword), the xml isn't kept as self.xml (which is then
+        None), so that it can be freed once parsed.'''
+
         if not xml:
             if xml == '':
                 xml = 'empty'
             raise MetaPubError('Cannot build MetaPubObject; xml string was %s' % xml)
-        self.xml = xml
+        self.xml = xml if kwargs.get('retain_xml', True) else None
         self.content = self.parse_xml(xml, root)
 
     @staticmethod
@@ -0,0 +1,706 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.cache_backends -- choose where metapub caches its results
+
+Every metapub cache (eutils, FindIt, CrossRef, DxDOI, UrlReverse, PMC id
+conversion...) is opened through open_cache, so any of them can be kept in
+any of these backends, chosen by giving a URL instead of a directory as the
+`cachedir` of a fetcher (or for all caches, with the METAPUB_CACHE_URL
+environment variable):
+
+    sqlite:///path/to/dir           SQLite files in dir, in WAL mode (add ?wal=0 to
+                                    turn it off). A plain directory path (the
+                                    default) also means SQLite files, but leaves
+                                    their journal mode as it is, so that other
+                                    readers of existing files aren't affected.
+    lmdb:///path/to/dir             LMDB environments in dir (requires the lmdb package)
+    memory://?max=100000            bounded in-memory LRU per cache, in this process
+    redis://localhost:6379/0        keys in Redis, prefixed with the cache name
+                                    (requires the redis package)
+
+e.g.
+    fetch = PubMedFetcher(cachedir='lmdb:///data/metapub-cache')
+    src = FindIt(pmid, cachedir='redis://cachehost/1')
+
+LMDB and Redis let many worker processes on one host (or, with Redis, many
+hosts) read and write a cache concurrently without SQLite's file locking.
+
+Any of these but memory:// can have a bounded in-memory LRU tier in front of
+it, so hot keys are answered without reading (and unpickling) from the backend:
+
+    fetch = PubMedFetcher(cachedir='sqlite:///data/cache?lru=10000&lru_bytes=50000000')
+
+    # or, for every cache opened from now on:
+    from metapub.cache_backends import configure_memory_tier, cache_stats
+    configure_memory_tier(max_entries=10000)
+    ...
+    print(cache_stats())    # hits / misses per cache and tier
+
+SQLite caches can be bounded in age and size (see MetaPubCache.compact):
+
+    configure_cache_limits(max_age=90 * 86400, max_bytes=2 * 1024 ** 3)
+    fetch = PubMedFetcher(cachedir='sqlite:///data/cache?max_entries=1000000')
+
+All backends provide the same mapping interface as MetaPubCache: cache[key],
+cache[key] = value, del cache[key], key in cache, get_many, set_many,
+delete_many and transaction(). Keys and values may be anything picklable.
+'''
+
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import six
+from six.moves.urllib.parse import urlsplit, parse_qsl, urlencode
+
+from eutils.sqlitecache import key_to, val_to, val_from
+
+from .cache_utils import MetaPubCache, pack_value, unpack_value
+from .config import DEFAULT_CACHE_DIR
+from .exceptions import MetaPubError
+
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = logging.getLogger('metapub.cache_backends')
+
+# map size for new LMDB environments (the most a cache file may grow to; disk
+# space is only used as needed).
+DEFAULT_LMDB_MAP_SIZE = 16 * 1024 ** 3
+
+# entries per cache for memory:// caches with no max.
+DEFAULT_MEMORY_MAX = 100000
+
+# size of the in-memory tier put in front of persistent caches (see configure_memory_tier);
+# no tier if both are None.
+MEMORY_TIER_ENTRIES = None
+MEMORY_TIER_BYTES = None
+
+# limits of SQLite caches (see configure_cache_limits); None: unlimited.
+CACHE_MAX_AGE = None
+CACHE_MAX_ENTRIES = None
+CACHE_MAX_BYTES = None
+
+_UNPICKLED_TYPES = (bytes, six.text_type, bool, float) + six.integer_types
+_SIZED_TYPES = (bytes, six.text_type)
+
+
+class CacheBackend(object):
+    """ Base class for cache backends: subclasses implement __getitem__, __setitem__ and
+    __delitem__ (on picklable keys and values); bulk methods default to a loop.
+    """
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    # an open cache is true even when empty (callers test `if cache:`).
+    def __bool__(self):
+        return True
+    __nonzero__ = __bool__
+
+    def get_many(self, keys):
+        """ returns dict of {key: value} for those of keys found in the cache. """
+        found = {}
+        for key in keys:
+            try:
+                found[key] = self[key]
+            except KeyError:
+                pass
+        return found
+
+    def set_many(self, items):
+        """ stores every (key, value) in items (a dict or iterable of pairs). """
+        if hasattr(items, 'items'):
+            items = items.items()
+        with self.transaction():
+            for key, value in items:
+                self[key] = value
+
+    def delete_many(self, keys):
+        """ deletes keys (those present); returns number deleted. """
+        count = 0
+        with self.transaction():
+            for key in keys:
+                try:
+                    del self[key]
+                    count += 1
+                except KeyError:
+                    pass
+        return count
+
+    @contextmanager
+    def transaction(self):
+        """ groups the writes within it, where the backend supports that. """
+        yield self
+
+    def compact(self, max_age=None, max_entries=None, max_bytes=None, vacuum=True):
+        """ as MetaPubCache.compact; backends that bound their own size (memory LRU,
+        Redis with a maxmemory policy, LMDB with its map size) do nothing here.
+        """
+        return {'expired': 0, 'evicted': 0}
+
+    def close(self):
+        pass
+
+
+class MemoryLRUCache(CacheBackend):
+    """ Bounded in-process cache, dropping the least recently used entries beyond
+    max_entries (and, if given, beyond max_bytes in total).
+
+    Strings, bytes and numbers are stored as they are; other values are stored
+    pickled, so callers can't modify cached values through the objects they stored
+    or got back. Sizes are those of the stored strings or pickles.
+
+    :param max_entries: (int) maximum number of entries
+    :param max_bytes: (int) maximum total size of the stored values (default: no limit)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_MAX, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        # key: (pickled, stored value, size)
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+            self._data[key] = entry
+            self.hits += 1
+        return val_from(entry[1], False) if entry[0] else entry[1]
+
+    def __setitem__(self, key, value):
+        if isinstance(value, _UNPICKLED_TYPES):
+            entry = (False, value, len(value) if isinstance(value, _SIZED_TYPES) else 8)
+        else:
+            stored = val_to(value, False)
+            entry = (True, stored, len(stored))
+        with self._lock:
+            self._remove(key)
+            self._data[key] = entry
+            self.size += entry[2]
+            while self._data and (len(self._data) > self.max_entries or
+                                  (self.max_bytes is not None and self.size > self.max_bytes)):
+                self.size -= self._data.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            if not self._remove(key):
+                raise KeyError(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= entry[2]
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        """ returns dict of hits, misses, evictions, entries and bytes. """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._data), 'bytes': self.size}
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield self
+
+
+class TieredCache(CacheBackend):
+    """ A MemoryLRUCache in front of a persistent cache: reads are answered from memory
+    when possible (otherwise from the persistent cache, keeping the result in memory),
+    writes go to both.
+
+    The memory tier only sees this process's writes, so it is best suited to caches
+    whose entries don't change once written (or where a slightly stale entry is fine).
+
+    :param persistent: cache object (MetaPubCache or other CacheBackend)
+    :param memory: MemoryLRUCache
+    """
+
+    def __init__(self, persistent, memory):
+        self.persistent = persistent
+        self.memory = memory
+        self.hits = self.misses = 0
+        # the tiers lock themselves; this only guards the counters.
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        try:
+            return self.memory[key]
+        except KeyError:
+            pass
+        try:
+            value = self.persistent[key]
+        except KeyError:
+            self._count(0, 1)
+            raise
+        self._count(1, 0)
+        self.memory[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.persistent[key] = value
+        self.memory[key] = value
+
+    def __delitem__(self, key):
+        try:
+            del self.memory[key]
+        except KeyError:
+            pass
+        del self.persistent[key]
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            try:
+                found[key] = self.memory[key]
+            except KeyError:
+                missing.append(key)
+        if missing:
+            from_disk = self.persistent.get_many(missing)
+            self._count(len(from_disk), len(missing) - len(from_disk))
+            for key, value in from_disk.items():
+                self.memory[key] = value
+            found.update(from_disk)
+        return found
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def set_many(self, items):
+        if hasattr(items, 'items'):
+            items = items.items()
+        items = list(items)
+        self.persistent.set_many(items)
+        for key, value in items:
+            self.memory[key] = value
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            try:
+                del self.memory[key]
+            except KeyError:
+                pass
+        return self.persistent.delete_many(keys)
+
+    @contextmanager
+    def transaction(self):
+        """ the persistent cache's transaction; if it's rolled back, the memory tier is
+        cleared (so it can't keep values that were never stored).
+        """
+        try:
+            with self.persistent.transaction():
+                yield self
+        except Exception:
+            self.memory.clear()
+            raise
+
+    def compact(self, max_age=None, max_entries=None, max_bytes=None, vacuum=True):
+        self.memory.clear()
+        return self.persistent.compact(max_age=max_age, max_entries=max_entries, max_bytes=max_bytes,
+                                       vacuum=vacuum)
+
+    def stats(self):
+        """ returns dict of stats per tier: {'memory': {...}, 'persistent': {'hits', 'misses'}}
+        (persistent counts only include reads that missed the memory tier).
+        """
+        return {'memory': self.memory.stats(),
+                'persistent': {'hits': self.hits, 'misses': self.misses}}
+
+    def close(self):
+        self.persistent.close()
+
+
+class LMDBCache(CacheBackend):
+    """ Cache kept in an LMDB environment (a directory), which many processes can read
+    and write at once. Values are pickled and compressed (see metapub.cache_utils.pack_value).
+
+    As with any LMDB environment, open it after forking worker processes, not before.
+
+    :param path: directory of the LMDB environment (created if needed)
+    :param map_size: (int) maximum size in bytes
+    """
+
+    def __init__(self, path, map_size=DEFAULT_LMDB_MAP_SIZE):
+        if lmdb is None:
+            raise MetaPubError('lmdb:// caches require the lmdb package (pip install lmdb)')
+        self.path = path
+        self._env = lmdb.open(path, map_size=map_size, subdir=True)
+        self._local = threading.local()
+
+    def _txn(self):
+        return getattr(self._local, 'txn', None)
+
+    def __getitem__(self, key):
+        txn = self._txn()
+        if txn is not None:
+            value = txn.get(key_to(key))
+        else:
+            with self._env.begin() as txn:
+                value = txn.get(key_to(key))
+        if value is None:
+            raise KeyError(key)
+        return unpack_value(value)
+
+    def __setitem__(self, key, value):
+        txn = self._txn()
+        if txn is not None:
+            txn.put(key_to(key), pack_value(value))
+        else:
+            with self._env.begin(write=True) as txn:
+                txn.put(key_to(key), pack_value(value))
+
+    def __delitem__(self, key):
+        txn = self._txn()
+        if txn is not None:
+            found = txn.delete(key_to(key))
+        else:
+            with self._env.begin(write=True) as txn:
+                found = txn.delete(key_to(key))
+        if not found:
+            raise KeyError(key)
+
+    def get_many(self, keys):
+        found = {}
+        with self._env.begin() as txn:
+            for key in keys:
+                value = txn.get(key_to(key))
+                if value is not None:
+                    found[key] = unpack_value(value)
+        return found
+
+    @contextmanager
+    def transaction(self):
+        """ one LMDB write transaction (in this thread) for everything within it. """
+        if self._txn() is not None:
+            yield self
+            return
+        with self._env.begin(write=True) as txn:
+            self._local.txn = txn
+            try:
+                yield self
+            finally:
+                self._local.txn = None
+
+    def close(self):
+        self._env.close()
+
+
+class RedisCache(CacheBackend):
+    """ Cache kept in Redis, under keys prefixed with "<prefix>:". Values are pickled
+    and compressed (see metapub.cache_utils.pack_value).
+
+    :param url: redis:// url, as for redis.Redis.from_url
+    :param prefix: (str) key prefix (usually the cache name)
+    """
+
+    def __init__(self, url, prefix='metapub'):
+        if redis is None:
+            raise MetaPubError('redis:// caches require the redis package (pip install redis)')
+        self.prefix = prefix.encode('utf-8') + b':'
+        self._redis = redis.Redis.from_url(url)
+        self._local = threading.local()
+
+    def _key(self, key):
+        return self.prefix + key_to(key)
+
+    def _writer(self):
+        pipeline = getattr(self._local, 'pipeline', None)
+        return self._redis if pipeline is None else pipeline
+
+    def __getitem__(self, key):
+        value = self._redis.get(self._key(key))
+        if value is None:
+            raise KeyError(key)
+        return unpack_value(value)
+
+    def __setitem__(self, key, value):
+        self._writer().set(self._key(key), pack_value(value))
+
+    def __delitem__(self, key):
+        if not self._redis.delete(self._key(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return bool(self._redis.exists(self._key(key)))
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._redis.mget([self._key(key) for key in keys])
+        return dict((key, unpack_value(value)) for key, value in zip(keys, values) if value is not None)
+
+    def delete_many(self, keys):
+        keys = [self._key(key) for key in keys]
+        return self._redis.delete(*keys) if keys else 0
+
+    @contextmanager
+    def transaction(self):
+        """ writes within are sent together (MULTI/EXEC) at the end; reads aren't affected. """
+        if getattr(self._local, 'pipeline', None) is not None:
+            yield self
+            return
+        self._local.pipeline = self._redis.pipeline(transaction=True)
+        try:
+            yield self
+            self._local.pipeline.execute()
+        finally:
+            self._local.pipeline = None
+
+
+def _open_sqlite(path, name, params):
+    return _open_sqlite_file(os.path.join(path, name + '.db'), params, wal=True)
+
+
+def _open_sqlite_file(path, params, wal=False):
+    """ opens a MetaPubCache; WAL mode is used if wal=True (sqlite:// urls) unless the
+    wal parameter says otherwise. Plain paths get wal=False, so existing cache files
+    (which plain eutils SQLiteCache readers may share) keep their journal mode.
+    """
+    limits = {}
+    for param, default in (('max_age', CACHE_MAX_AGE), ('max_entries', CACHE_MAX_ENTRIES),
+                           ('max_bytes', CACHE_MAX_BYTES)):
+        limits[param] = int(params[param]) if param in params else default
+    if 'wal' in params:
+        wal = params['wal'] not in ('0', 'false')
+    return MetaPubCache(path, wal=wal, **limits)
+
+
+def _open_lmdb(path, name, params):
+    return LMDBCache(os.path.join(path, name + '.lmdb'),
+                     map_size=int(params.get('map_size', DEFAULT_LMDB_MAP_SIZE)))
+
+
+_MEMORY_CACHES = {}
+_MEMORY_LOCK = threading.Lock()
+
+def _open_memory(path, name, params):
+    max_entries = int(params.get('max', DEFAULT_MEMORY_MAX))
+    with _MEMORY_LOCK:
+        # one cache per name (and size) per process, however many times it's opened.
+        cache = _MEMORY_CACHES.get((name, max_entries))
+        if cache is None:
+            cache = _MEMORY_CACHES[(name, max_entries)] = MemoryLRUCache(max_entries)
+    return cache
+
+
+def _open_redis(url, name, params):
+    return RedisCache(url, prefix=params.get('prefix', 'metapub') + ':' + name)
+
+
+# scheme: (opener, whether the opener takes a filesystem path (else the url minus our params))
+_BACKENDS = {'sqlite': (_open_sqlite, True),
+             'lmdb': (_open_lmdb, True),
+             'memory': (_open_memory, True),
+             'redis': (_open_redis, False),
+             'rediss': (_open_redis, False),
+             }
+
+# query parameters handled here rather than passed on to a backend's url.
+_OWN_PARAMS = ('name', 'wal', 'map_size', 'max', 'prefix', 'lru', 'lru_bytes', 'max_age', 'max_entries',
+               'max_bytes')
+
+
+def register_backend(scheme, opener, takes_path=True):
+    """ adds a cache backend for urls starting with scheme://.
+
+    :param scheme: (str) url scheme
+    :param opener: callable(path_or_url, name, params) returning a cache object,
+                   where params is a dict of the url's query parameters
+    :param takes_path: (bool) pass the url's path (True) or the url itself (False)
+    """
+    _BACKENDS[scheme] = (opener, takes_path)
+
+
+def is_cache_url(cachedir):
+    return cachedir is not None and '://' in cachedir
+
+
+def cache_url_for(cache_url, filename):
+    """ returns url of the named cache (e.g. 'findit-cache.db') within cache_url. """
+    name = filename[:-3] if filename.endswith('.db') else filename
+    # (not urlunsplit, which drops the // of urls without a host, e.g. memory://)
+    base, _, query = cache_url.partition('?')
+    params = [(key, value) for key, value in parse_qsl(query) if key != 'name'] + [('name', name)]
+    return base + '?' + urlencode(params)
+
+
+def configure_cache_limits(max_age=None, max_entries=None, max_bytes=None):
+    """ sets the limits (see MetaPubCache) of every SQLite cache opened from now on --
+    call it before using any fetcher. With no arguments, caches opened from now on
+    are unlimited.
+
+    A single cache can be given limits of its own with the max_age, max_entries and
+    max_bytes parameters of its url, e.g. cachedir='sqlite:///data/cache?max_age=2592000'.
+
+    :param max_age: (int) seconds after which entries expire
+    :param max_entries: (int) maximum entries per cache
+    :param max_bytes: (int) maximum total size of the values kept per cache
+    """
+    global CACHE_MAX_AGE, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+    CACHE_MAX_AGE = max_age
+    CACHE_MAX_ENTRIES = max_entries
+    CACHE_MAX_BYTES = max_bytes
+
+
+def compact_caches(cachedir=DEFAULT_CACHE_DIR, max_age=None, max_entries=None, max_bytes=None, vacuum=True):
+    """ compacts (see MetaPubCache.compact) every SQLite cache file in cachedir, skipping
+    other SQLite files there (e.g. a local PubMed store).
+
+    :param cachedir: directory of cache files
+    :return: dict of {filename: {'expired': n, 'evicted': n}}
+    """
+    return dict((os.path.basename(path), _maintain(path, 'compact', max_age=max_age, max_entries=max_entries,
+                                                   max_bytes=max_bytes, vacuum=vacuum))
+                for path in _cache_files(cachedir))
+
+
+def recompress_caches(cachedir=DEFAULT_CACHE_DIR, codec=None):
+    """ recompresses (see MetaPubCache.recompress) every SQLite cache file in cachedir.
+
+    :param cachedir: directory of cache files
+    :param codec: 'zstd', 'zlib' or 'none' (default: metapub.cache_utils.DEFAULT_CODEC)
+    :return: dict of {filename: {'recompressed': n, 'before': bytes, 'after': bytes}}
+    """
+    return dict((os.path.basename(path), _maintain(path, 'recompress', codec))
+                for path in _cache_files(cachedir))
+
+
+def _maintain(path, method, *args, **kwargs):
+    """ calls MetaPubCache method on the cache file at path, opened with wal=False so
+    that the file's journal mode is left as it was (plain eutils SQLiteCache readers
+    in other processes may not expect WAL), and closes it again.
+    """
+    cache = MetaPubCache(path, wal=False)
+    try:
+        return getattr(cache, method)(*args, **kwargs)
+    finally:
+        cache.close()
+
+
+def _cache_files(cachedir):
+    """ returns sorted list of paths of the metapub / eutils cache files in cachedir. """
+    paths = []
+    for path in sorted(glob.glob(os.path.join(os.path.expanduser(cachedir), '*.db'))):
+        con = sqlite3.connect(path)
+        try:
+            tables = set(row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+        except sqlite3.DatabaseError:
+            tables = set()
+        finally:
+            con.close()
+        if tables == set(['cache', 'meta']):
+            paths.append(path)
+    return paths
+
+
+def configure_memory_tier(max_entries=None, max_bytes=None):
+    """ puts an in-memory LRU tier (see TieredCache) in front of every persistent cache
+    opened from now on -- call it before using any fetcher. With no arguments, caches
+    opened from now on get no tier.
+
+    A single cache can be given a tier of its own with the lru (entries) and lru_bytes
+    parameters of its url, e.g. cachedir='sqlite:///data/cache?lru=10000'.
+
+    :param max_entries: (int) maximum entries per cache
+    :param max_bytes: (int) maximum total size of the values kept per cache
+    """
+    global MEMORY_TIER_ENTRIES, MEMORY_TIER_BYTES
+    MEMORY_TIER_ENTRIES = max_entries
+    MEMORY_TIER_BYTES = max_bytes
+
+
+_TIERED_CACHES = {}
+
+def cache_stats():
+    """ returns dict of {cache name: stats per tier} for every cache opened with a memory
+    tier in this process (see TieredCache.stats).
+    """
+    return dict((name, cache.stats()) for name, cache in _TIERED_CACHES.items())
+
+
+def open_cache(path_or_url):
+    """ opens the cache at path_or_url: a path to an SQLite file, or a cache url with a
+    name parameter (see cache_url_for and the module docstring), with an in-memory
+    tier in front of it if configured (see configure_memory_tier).
+
+    :return: cache object (MetaPubCache or other CacheBackend)
+    :raises MetaPubError: for unknown schemes, or backends whose packages are missing
+    """
+    if not is_cache_url(path_or_url):
+        name = os.path.basename(path_or_url)
+        name = name[:-3] if name.endswith('.db') else name
+        return _with_memory_tier(_open_sqlite_file(path_or_url, {}), name, {})
+
+    parts = urlsplit(path_or_url)
+    try:
+        opener, takes_path = _BACKENDS[parts.scheme]
+    except KeyError:
+        raise MetaPubError('Unknown cache backend "%s" (known: %s)' % (parts.scheme, ', '.join(sorted(_BACKENDS))))
+
+    params = dict(parse_qsl(parts.query))
+    name = params.get('name', 'metapub-cache')
+    if takes_path:
+        path = os.path.expanduser(parts.netloc + parts.path)
+        if path and not os.path.isdir(path):
+            os.makedirs(path)
+        target = path
+    else:
+        base = path_or_url.partition('?')[0]
+        query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if key not in _OWN_PARAMS])
+        target = base + '?' + query if query else base
+    log.debug('Opening %s cache %s at %s', parts.scheme, name, target)
+    cache = opener(target, name, params)
+    if isinstance(cache, MemoryLRUCache):
+        return cache
+    return _with_memory_tier(cache, name, params)
+
+
+def _with_memory_tier(cache, name, params):
+    max_entries = int(params['lru']) if 'lru' in params else MEMORY_TIER_ENTRIES
+    max_bytes = int(params['lru_bytes']) if 'lru_bytes' in params else MEMORY_TIER_BYTES
+    if not max_entries and not max_bytes:
+        return cache
+    cache = TieredCache(cache, MemoryLRUCache(max_entries or DEFAULT_MEMORY_MAX, max_bytes))
+    _TIERED_CACHES[name] = cache
+    return cache
@@ -1,7 +1,120 @@
 from __future__ import division, absolute_import, unicode_literals
 
+import logging
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
 
+from eutils.compat import pickle
+from eutils.sqlitecache import SQLiteCache, key_to, val_from
+
+from .exceptions import MetaPubError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger('metapub.cache_utils')
+
+# How cached values are encoded: pickled, then compressed with one of these codecs.
+# The codec is stored with each value (in the value_compressed column of SQLite
+# caches, whose 0 and 1 mean the same as in eutils' SQLiteCache; as a header byte
+# elsewhere), so entries written with any codec can be read back.
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODECS = {'none': CODEC_NONE, 'zlib': CODEC_ZLIB, 'zstd': CODEC_ZSTD}
+
+# codec for new values: zstd if the zstandard package is installed, else zlib.
+# (Caches holding zstd values can't be read by eutils' SQLiteCache, nor by metapub
+# without zstandard; use configure_compression('zlib') if that matters.)
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# pickles shorter than this are stored uncompressed.
+MIN_COMPRESS_SIZE = 128
+
+
+def configure_compression(codec=None, zlib_level=None, zstd_level=None, min_size=None):
+    """ sets how values are compressed from now on (already cached values are read as
+    they are; see MetaPubCache.recompress to convert them).
+
+    :param codec: 'zstd', 'zlib' or 'none'
+    :param zlib_level: (int) 1-9
+    :param zstd_level: (int) 1-22
+    :param min_size: (int) values smaller than this (pickled) aren't compressed
+    :raises MetaPubError: for unknown codecs, or 'zstd' without the zstandard package
+    """
+    global DEFAULT_CODEC, ZLIB_LEVEL, ZSTD_LEVEL, MIN_COMPRESS_SIZE
+    if codec is not None:
+        DEFAULT_CODEC = _codec_id(codec)
+    if zlib_level is not None:
+        ZLIB_LEVEL = zlib_level
+    if zstd_level is not None:
+        ZSTD_LEVEL = zstd_level
+    if min_size is not None:
+        MIN_COMPRESS_SIZE = min_size
+
+
+def _codec_id(codec):
+    if codec in CODECS.values():
+        codec_id = codec
+    elif codec in CODECS:
+        codec_id = CODECS[codec]
+    else:
+        raise MetaPubError('Unknown cache codec %r (known: %s)' % (codec, ', '.join(sorted(CODECS))))
+    if codec_id == CODEC_ZSTD and zstandard is None:
+        raise MetaPubError('zstd cache compression requires the zstandard package (pip install zstandard)')
+    return codec_id
+
+
+def encode_value(obj, codec=None):
+    """ returns (codec, data): obj pickled and compressed with codec (default:
+    DEFAULT_CODEC), or uncompressed (codec CODEC_NONE) if small.
+    """
+    codec = DEFAULT_CODEC if codec is None else codec
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    if codec == CODEC_NONE or len(data) < MIN_COMPRESS_SIZE:
+        return CODEC_NONE, data
+    if codec == CODEC_ZSTD:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, ZLIB_LEVEL)
+
+
+def decode_value(codec, data):
+    """ returns the object encoded by encode_value (or by eutils' val_to).
+
+    :raises MetaPubError: for zstd values without the zstandard package
+    """
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise MetaPubError('cached value is zstd-compressed; install the zstandard package to read it')
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec:
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+def pack_value(obj, codec=None):
+    """ returns obj encoded as bytes with a leading codec byte (for key-value stores). """
+    codec, data = encode_value(obj, codec)
+    return bytes(bytearray([codec])) + data
+
+
+def unpack_value(data):
+    """ returns the object packed by pack_value. Data without a codec byte, as written
+    by earlier versions (zlib streams, which start with 0x78), is also accepted.
+    """
+    data = bytes(data)
+    codec = bytearray(data[:1])[0]
+    if codec not in (CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD):
+        return val_from(data, True)
+    return decode_value(codec, data[1:])
+
 
 def datetime_to_timestamp(dt, epoch=datetime(1970,1,1)):
     """takes a python datetime object and converts it to a Unix timestamp.
@@ -14,3 +127,284 @@ def datetime_to_timestamp(dt, epoch=datetime(1970,1,1)):
     """
     td = dt - epoch
     return (td.microseconds + (td.seconds + td.days * 86400) * 10**6) / 10**6
+
+
+def sellby_timestamp(expiry_date=None, ttl=None):
+    """ returns the timestamp before which cached results are stale: the later of
+    expiry_date and (now - ttl), or 0 if neither is given.
+
+    :param expiry_date: datetime or timestamp (optional)
+    :param ttl: (int) maximum age in seconds (optional)
+    :return: timestamp
+    """
+    if hasattr(expiry_date, 'strftime'):
+        sellby = datetime_to_timestamp(expiry_date)
+    else:
+        sellby = expiry_date if expiry_date else 0
+    if ttl is not None:
+        sellby = max(sellby, time.time() - ttl)
+    return sellby
+
+
+class MetaPubCache(SQLiteCache):
+    """ SQLiteCache (same file format, so existing cache files keep working) with bulk
+    reads and writes and explicit transactions:
+
+        cache.set_many({key1: value1, key2: value2})     # one transaction
+        found = cache.get_many([key1, key2, key3])       # {key1: value1, key2: value2}
+
+        with cache.transaction():
+            for key, value in items:
+                cache[key] = value                       # committed together at the end
+
+    Each statement outside a transaction is committed on its own, so batching writes
+    this way saves a sync per item. The cache may be shared between threads; a
+    transaction holds the cache's lock until it ends.
+
+    With wal=True the database is put in WAL mode (with synchronous=NORMAL), so that
+    processes reading the cache aren't blocked by one writing to it, and commits
+    don't each wait for a sync. The mode is a property of the file, so this also
+    affects other programs opening it, and WAL doesn't work on filesystems (e.g. NFS)
+    without shared memory support; caches opened from a sqlite:// url use it (see
+    metapub.cache_backends), caches opened from a plain path don't.
+
+    compact() deletes entries older than max_age, then the oldest entries beyond
+    max_entries or max_bytes, and VACUUMs the file. When limits are given to the
+    constructor, they are also enforced (without the VACUUM) every
+    EVICT_CHECK_INTERVAL writes. Age is time since the entry was last written.
+
+    Values are compressed with zstd (if the zstandard package is installed) or zlib;
+    see configure_compression and recompress().
+
+    :param db_path: path to SQLite file
+    :param compress_values: (bool) default: True
+    :param wal: (bool) use WAL mode (default: False)
+    :param max_age: (int) seconds after which entries expire (default: never)
+    :param max_entries: (int) maximum number of entries (default: no limit)
+    :param max_bytes: (int) maximum total size of the stored values (default: no limit)
+    """
+
+    # keys per "IN (...)" query; SQLite allows at most 999 parameters per statement.
+    BULK_CHUNK_SIZE = 500
+
+    # seconds to wait for another process's write lock before giving up.
+    BUSY_TIMEOUT = 30
+
+    # writes between checks of the size limits.
+    EVICT_CHECK_INTERVAL = 1000
+
+    def __init__(self, db_path, compress_values=True, wal=False, max_age=None, max_entries=None, max_bytes=None):
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self._writes = 0
+        self.wal = wal
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        super(MetaPubCache, self).__init__(db_path, compress_values)
+        self._con.execute('PRAGMA busy_timeout = %i' % (self.BUSY_TIMEOUT * 1000))
+        if wal:
+            self._con.execute('PRAGMA journal_mode = WAL')
+            self._con.execute('PRAGMA synchronous = NORMAL')
+
+    def __getitem__(self, key):
+        if self.max_age is None:
+            row = self._execute('SELECT value, value_compressed FROM cache WHERE key = ?', [key_to(key)]).fetchone()
+        else:
+            row = self._execute('SELECT value, value_compressed FROM cache WHERE key = ? AND created >= ?',
+                                [key_to(key), self._oldest()]).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._decode(key, row[1], row[0])
+
+    def __contains__(self, key):
+        if self.max_age is None:
+            return bool(super(MetaPubCache, self).__contains__(key))
+        return bool(self._execute('SELECT EXISTS(SELECT 1 FROM cache WHERE key = ? AND created >= ?)',
+                                  [key_to(key), self._oldest()]).fetchone()[0])
+
+    def __setitem__(self, key, value):
+        codec, data = encode_value(value, self._codec())
+        self._execute('INSERT OR REPLACE INTO cache (key,value_compressed,value) VALUES (?,?,?)',
+                      [key_to(key), codec, data])
+        self._count_writes(1)
+
+    @contextmanager
+    def transaction(self):
+        """ context manager grouping the cache operations within it into one transaction,
+        rolled back if the block raises. Transactions may be nested (only the outermost
+        one commits).
+        """
+        with self._lock:
+            if self._transaction_depth == 0:
+                self._con.execute('BEGIN')
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._con.execute('ROLLBACK')
+                raise
+            else:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._con.execute('COMMIT')
+
+    def get_many(self, keys):
+        """ returns dict of {key: value} for those of keys found in the cache. """
+        found = {}
+        keys = list(keys)
+        for idx in range(0, len(keys), self.BULK_CHUNK_SIZE):
+            by_dbkey = dict((key_to(key), key) for key in keys[idx:idx + self.BULK_CHUNK_SIZE])
+            query = 'SELECT key, value, value_compressed FROM cache WHERE key IN (%s)' % \
+                    ','.join('?' * len(by_dbkey))
+            params = list(by_dbkey.keys())
+            if self.max_age is not None:
+                query += ' AND created >= ?'
+                params.append(self._oldest())
+            with self._lock:
+                rows = self._execute(query, params).fetchall()
+            for dbkey, value, codec in rows:
+                key = by_dbkey[bytes(dbkey)]
+                try:
+                    found[key] = self._decode(key, codec, value)
+                except KeyError:
+                    pass
+        return found
+
+    def set_many(self, items):
+        """ stores every (key, value) in items (a dict or iterable of pairs) in one transaction. """
+        if hasattr(items, 'items'):
+            items = items.items()
+        rows = [(key_to(key), ) + encode_value(value, self._codec()) for key, value in items]
+        with self.transaction():
+            self._con.executemany('INSERT OR REPLACE INTO cache (key,value_compressed,value) VALUES (?,?,?)', rows)
+        self._count_writes(len(rows))
+
+    def delete_many(self, keys):
+        """ deletes keys (those present) in one transaction; returns number deleted. """
+        with self.transaction():
+            cur = self._con.executemany('DELETE FROM cache WHERE key = ?', [(key_to(key), ) for key in keys])
+        return cur.rowcount
+
+    def recompress(self, codec=None, batch_size=1000, vacuum=True):
+        """ re-encodes every value not already stored with codec (default: DEFAULT_CODEC),
+        in transactions of batch_size entries, then VACUUMs the file to release the
+        space saved. Safe to interrupt, and to run while the cache is in use.
+
+        :param codec: 'zstd', 'zlib' or 'none'
+        :return: dict with counts of entries 'recompressed' and bytes 'before' and 'after'
+        """
+        codec = DEFAULT_CODEC if codec is None else _codec_id(codec)
+        counts = {'recompressed': 0, 'before': 0, 'after': 0}
+        last_rowid = 0
+        while True:
+            with self.transaction():
+                rows = self._con.execute('SELECT rowid, value_compressed, value FROM cache '
+                                         'WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                                         (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for rowid, old_codec, value in rows:
+                    if old_codec == codec:
+                        continue
+                    new_codec, data = encode_value(decode_value(old_codec, value), codec)
+                    if new_codec == old_codec:
+                        continue
+                    updates.append((new_codec, data, rowid))
+                    counts['before'] += len(value)
+                    counts['after'] += len(data)
+                self._con.executemany('UPDATE cache SET value_compressed = ?, value = ? WHERE rowid = ?', updates)
+                counts['recompressed'] += len(updates)
+                last_rowid = rows[-1][0]
+        if vacuum:
+            self.compact(vacuum=True)
+        log.info('Recompressed %i entries of %s: %i bytes -> %i bytes', counts['recompressed'], self._db_path,
+                 counts['before'], counts['after'])
+        return counts
+
+    def close(self):
+        """ closes the connection to the cache file. """
+        with self._lock:
+            self._con.close()
+
+    def compact(self, max_age=None, max_entries=None, max_bytes=None, vacuum=True):
+        """ deletes expired entries and, oldest first, entries beyond the size limits,
+        then (if vacuum=True) rebuilds the file to return the space to the filesystem.
+        Limits not given default to those the cache was opened with.
+
+        :param max_age: (int) delete entries written more than max_age seconds ago
+        :param max_entries: (int) keep at most this many entries
+        :param max_bytes: (int) keep at most this many bytes of (stored) values
+        :param vacuum: (bool) VACUUM afterwards (default: True; skipped inside a transaction)
+        :return: dict with counts of 'expired' and 'evicted' entries
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_entries = self.max_entries if max_entries is None else max_entries
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        expired = evicted = 0
+        with self.transaction():
+            self._con.execute('CREATE INDEX IF NOT EXISTS cache_created ON cache (created)')
+            if max_age is not None:
+                cur = self._con.execute("DELETE FROM cache WHERE created < strftime('%s','now') - ?", (max_age, ))
+                expired = cur.rowcount
+            if max_entries is not None:
+                cur = self._con.execute('DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache '
+                                        'ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)', (max_entries, ))
+                evicted += cur.rowcount
+            if max_bytes is not None:
+                total = 0
+                doomed = []
+                for rowid, size in self._con.execute('SELECT rowid, length(value) FROM cache '
+                                                     'ORDER BY created DESC, rowid DESC'):
+                    total += size or 0
+                    if total > max_bytes:
+                        doomed.append((rowid, ))
+                self._con.executemany('DELETE FROM cache WHERE rowid = ?', doomed)
+                evicted += len(doomed)
+
+        if vacuum:
+            with self._lock:
+                if self._transaction_depth:
+                    log.warning('Not vacuuming %s inside a transaction', self._db_path)
+                else:
+                    self._con.execute('VACUUM')
+                    # (the file's journal mode, which may be WAL even if this cache
+                    # was opened with wal=False.)
+                    if self._con.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+                        self._con.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        if expired or evicted:
+            log.info('Compacted %s: %i expired, %i evicted', self._db_path, expired, evicted)
+        return {'expired': expired, 'evicted': evicted}
+
+    def _codec(self):
+        return None if self.compress_values else CODEC_NONE
+
+    def _decode(self, key, codec, value):
+        try:
+            return decode_value(codec, value)
+        except MetaPubError as error:
+            # e.g. zstd values in a cache shared with a machine without zstandard: a miss.
+            log.warning('Cache %s: %s', self._db_path, error)
+            raise KeyError(key)
+
+    def _oldest(self):
+        """ returns creation time (int timestamp) of the oldest unexpired entries. """
+        return int(time.time()) - self.max_age
+
+    def _count_writes(self, count):
+        if self.max_age is None and self.max_entries is None and self.max_bytes is None:
+            return
+        with self._lock:
+            self._writes += count
+            if self._writes < self.EVICT_CHECK_INTERVAL or self._transaction_depth:
+                return
+            self._writes = 0
+            self.compact(vacuum=False)
+
+    def _execute(self, query, params=[]):
+        with self._lock:
+            return super(MetaPubCache, self)._execute(query, params)
@@ -0,0 +1,375 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.columnar -- export many parsed articles as columns (Arrow, Parquet, NumPy)
+
+Builds column-oriented batches from any iterable of PubMedArticle or PubMedRecord
+objects (e.g. fetch.articles_by_pmids(...) or medline.iter_medline_file(...)),
+without making a dict per article:
+
+    from metapub.columnar import write_parquet, to_arrow_table, to_numpy
+
+    write_parquet(fetch.articles_by_pmids(pmids), 'articles.parquet')   # requires pyarrow
+    table = to_arrow_table(articles)                                    # requires pyarrow
+    df = table.to_pandas()
+
+    arrays = to_numpy(articles)          # requires numpy only
+    arrays['pmid'], arrays['journal'], arrays['journal.dictionary']
+
+Columns (see COLUMNS): pmid as int64 and year as int16; journal, issn and
+pubmed_type dictionary-encoded; doi, title, abstract etc. as strings; authors,
+MeSH descriptor names and UIs, chemicals and publication types as lists of
+strings.
+
+Without pyarrow, to_numpy returns a flat dict of NumPy arrays, laid out as Arrow
+would: missing integers are NULL_INT; strings are object arrays (None where
+missing); a dictionary-encoded column is int32 codes (NULL_INT where missing)
+plus '<name>.dictionary'; a list column is the concatenated values plus
+'<name>.offsets' (int64, one more than there are rows). write_numpy saves that
+dict with numpy.savez_compressed (load it with allow_pickle=True).
+'''
+
+import logging
+from collections import OrderedDict
+
+from .exceptions import MetaPubError
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger('metapub.columnar')
+
+# articles per batch.
+DEFAULT_BATCH_SIZE = 10000
+
+# missing values in NumPy integer columns.
+NULL_INT = -1
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _year(value):
+    # article years are strings, book years ints.
+    return None if value is None else _int(str(value)[:4])
+
+
+def _mesh_field(field):
+    def extract(article):
+        mesh = article.mesh
+        if not mesh:
+            return []
+        if isinstance(mesh, dict):
+            # PubMedArticle: {ui: {...}}
+            return list(mesh.keys()) if field == 'ui' else [item[field] for item in mesh.values()]
+        # PubMedRecord: tuple of MeshRecords
+        return [getattr(item, field) for item in mesh]
+    return extract
+
+
+def _chemicals(article):
+    chemicals = article.chemicals
+    if not chemicals:
+        return []
+    if isinstance(chemicals, dict):
+        return [item['substance_name'] for item in chemicals.values()]
+    return [item.substance_name for item in chemicals]
+
+
+def _publication_types(article):
+    pubtypes = article.publication_types
+    if not pubtypes:
+        return []
+    if isinstance(pubtypes, dict):
+        return list(pubtypes.values())
+    return [name for ui, name in pubtypes]
+
+
+def _attr(name):
+    return lambda article: getattr(article, name)
+
+
+# column name: (type, extractor taking a PubMedArticle or PubMedRecord).
+# Types: 'int64', 'int16', 'string', 'dictionary' (of strings), 'list' (of strings).
+COLUMNS = OrderedDict([
+    ('pmid', ('int64', lambda article: _int(article.pmid))),
+    ('pubmed_type', ('dictionary', _attr('pubmed_type'))),
+    ('year', ('int16', lambda article: _year(article.year))),
+    ('journal', ('dictionary', _attr('journal'))),
+    ('issn', ('dictionary', _attr('issn'))),
+    ('volume', ('string', _attr('volume'))),
+    ('issue', ('string', _attr('issue'))),
+    ('pages', ('string', _attr('pages'))),
+    ('first_page', ('string', _attr('first_page'))),
+    ('doi', ('string', _attr('doi'))),
+    ('pmc', ('string', _attr('pmc'))),
+    ('pii', ('string', _attr('pii'))),
+    ('title', ('string', _attr('title'))),
+    ('abstract', ('string', _attr('abstract'))),
+    ('authors', ('list', lambda article: article.authors or [])),
+    ('mesh', ('list', _mesh_field('descriptor_name'))),
+    ('mesh_ui', ('list', _mesh_field('ui'))),
+    ('chemicals', ('list', _chemicals)),
+    ('publication_types', ('list', _publication_types)),
+])
+
+
+class DictionaryEncoder(object):
+    """ assigns int codes to values, in order of first appearance (None stays None). """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        if value is None:
+            return None
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ColumnBatch(object):
+    """ Columns of a batch of articles, as Python lists:
+
+        int and string columns: list of values (None where missing)
+        dictionary columns: (list of codes, list of distinct values)
+        list columns: (list of offsets, list of values) -- row i is values[offsets[i]:offsets[i + 1]]
+
+    :param columns: OrderedDict of {name: column data} as above
+    :param num_rows: (int)
+    """
+
+    def __init__(self, columns, num_rows):
+        self.columns = columns
+        self.num_rows = num_rows
+
+    def __len__(self):
+        return self.num_rows
+
+    def column(self, name):
+        """ returns the values of column name as a list of Python values (decoded). """
+        kind = COLUMNS[name][0]
+        data = self.columns[name]
+        if kind == 'dictionary':
+            codes, dictionary = data
+            return [None if code is None else dictionary[code] for code in codes]
+        if kind == 'list':
+            offsets, values = data
+            return [values[offsets[idx]:offsets[idx + 1]] for idx in range(self.num_rows)]
+        return list(data)
+
+    def to_arrow(self):
+        """ returns pyarrow.RecordBatch of the columns.
+
+        :raises MetaPubError: if pyarrow isn't installed
+        """
+        _require('pyarrow', pyarrow)
+        arrays = []
+        for name, data in self.columns.items():
+            kind = COLUMNS[name][0]
+            if kind == 'dictionary':
+                codes, dictionary = data
+                arrays.append(pyarrow.DictionaryArray.from_arrays(pyarrow.array(codes, type=pyarrow.int32()),
+                                                                  pyarrow.array(dictionary, type=pyarrow.string())))
+            elif kind == 'list':
+                offsets, values = data
+                arrays.append(pyarrow.ListArray.from_arrays(pyarrow.array(offsets, type=pyarrow.int32()),
+                                                            pyarrow.array(values, type=pyarrow.string())))
+            else:
+                arrays.append(pyarrow.array(data, type=_ARROW_TYPES[kind]()))
+        return pyarrow.RecordBatch.from_arrays(arrays, list(self.columns.keys()))
+
+    def to_numpy(self):
+        """ returns flat dict of NumPy arrays (see module docstring).
+
+        :raises MetaPubError: if numpy isn't installed
+        """
+        _require('numpy', numpy)
+        arrays = OrderedDict()
+        for name, data in self.columns.items():
+            kind = COLUMNS[name][0]
+            if kind == 'dictionary':
+                codes, dictionary = data
+                arrays[name] = numpy.array([NULL_INT if code is None else code for code in codes], dtype='int32')
+                arrays[name + '.dictionary'] = _object_array(dictionary)
+            elif kind == 'list':
+                offsets, values = data
+                arrays[name] = _object_array(values)
+                arrays[name + '.offsets'] = numpy.array(offsets, dtype='int64')
+            elif kind == 'string':
+                arrays[name] = _object_array(data)
+            else:
+                arrays[name] = numpy.array([NULL_INT if value is None else value for value in data], dtype=kind)
+        return arrays
+
+
+def iter_batches(articles, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+    """ Yields ColumnBatches of up to batch_size articles each.
+
+    Dictionary-encoded columns share one dictionary across the batches (each batch
+    holds the dictionary as it stood when the batch was made), so codes mean the
+    same thing in every batch.
+
+    :param articles: iterable of PubMedArticle or PubMedRecord objects
+    :param batch_size: (int) rows per batch (None: everything in one batch)
+    :param columns: names of the columns to include (default: all of COLUMNS)
+    :return: generator of ColumnBatch
+    """
+    names = list(COLUMNS) if columns is None else list(columns)
+    for name in names:
+        if name not in COLUMNS:
+            raise MetaPubError('Unknown column %r (known: %s)' % (name, ', '.join(COLUMNS)))
+    extractors = [(name, COLUMNS[name][0], COLUMNS[name][1]) for name in names]
+    encoders = dict((name, DictionaryEncoder()) for name, kind, _ in extractors if kind == 'dictionary')
+
+    def new_columns():
+        data = OrderedDict()
+        for name, kind, _ in extractors:
+            data[name] = ([0], []) if kind == 'list' else []
+        return data
+
+    data = new_columns()
+    num_rows = 0
+    for article in articles:
+        for name, kind, extract in extractors:
+            value = extract(article)
+            if kind == 'dictionary':
+                data[name].append(encoders[name].encode(value))
+            elif kind == 'list':
+                offsets, values = data[name]
+                values.extend(value)
+                offsets.append(len(values))
+            else:
+                data[name].append(value)
+        num_rows += 1
+        if batch_size and num_rows >= batch_size:
+            yield _finish_batch(data, encoders, num_rows)
+            data = new_columns()
+            num_rows = 0
+    if num_rows or batch_size is None:
+        yield _finish_batch(data, encoders, num_rows)
+
+
+def _finish_batch(data, encoders, num_rows):
+    for name, encoder in encoders.items():
+        data[name] = (data[name], list(encoder.values))
+    return ColumnBatch(data, num_rows)
+
+
+def to_arrow_table(articles, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+    """ returns a pyarrow.Table of the articles (see iter_batches). """
+    _require('pyarrow', pyarrow)
+    batches = [batch.to_arrow() for batch in iter_batches(articles, batch_size, columns)]
+    return pyarrow.Table.from_batches(batches)
+
+
+def write_parquet(articles, path, batch_size=DEFAULT_BATCH_SIZE, columns=None, compression='zstd'):
+    """ writes the articles to a Parquet file, batch by batch (so memory use depends on
+    batch_size, not on the number of articles).
+
+    :return: number of articles written
+    """
+    _require('pyarrow', pyarrow)
+    writer = None
+    count = 0
+    try:
+        for batch in iter_batches(articles, batch_size, columns):
+            record_batch = batch.to_arrow()
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, record_batch.schema, compression=compression)
+            writer.write_table(pyarrow.Table.from_batches([record_batch]))
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    log.info('Wrote %i articles to %s', count, path)
+    return count
+
+
+def write_arrow(articles, path, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+    """ writes the articles to an Arrow IPC stream file (read it with pyarrow.ipc.open_stream),
+    batch by batch. Dictionaries grow from batch to batch, which the stream format
+    allows (as dictionary deltas).
+
+    :return: number of articles written
+    """
+    _require('pyarrow', pyarrow)
+    writer = None
+    count = 0
+    with pyarrow.OSFile(path, 'wb') as sink:
+        try:
+            for batch in iter_batches(articles, batch_size, columns):
+                record_batch = batch.to_arrow()
+                if writer is None:
+                    options = pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                    writer = pyarrow.ipc.new_stream(sink, record_batch.schema, options=options)
+                writer.write_batch(record_batch)
+                count += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+    log.info('Wrote %i articles to %s', count, path)
+    return count
+
+
+def to_numpy(articles, columns=None):
+    """ returns flat dict of NumPy arrays holding all the articles (see module docstring). """
+    return next(iter_batches(articles, batch_size=None, columns=columns)).to_numpy()
+
+
+def write_numpy(articles, path, columns=None):
+    """ writes to_numpy(articles) to path with numpy.savez_compressed.
+
+    :return: number of articles written
+    """
+    _require('numpy', numpy)
+    batch = next(iter_batches(articles, batch_size=None, columns=columns))
+    numpy.savez_compressed(path, **batch.to_numpy())
+    log.info('Wrote %i articles to %s', len(batch), path)
+    return len(batch)
+
+
+def export(articles, path, **kwargs):
+    """ writes the articles to path, as Parquet (.parquet), an Arrow IPC stream
+    (.arrow, .arrows) or NumPy arrays (.npz), chosen by extension.
+
+    :return: number of articles written
+    """
+    if path.endswith('.parquet'):
+        return write_parquet(articles, path, **kwargs)
+    if path.endswith('.arrow') or path.endswith('.arrows'):
+        return write_arrow(articles, path, **kwargs)
+    if path.endswith('.npz'):
+        kwargs.pop('batch_size', None)
+        return write_numpy(articles, path, **kwargs)
+    raise MetaPubError('Unknown export format for %s (use .parquet, .arrow or .npz)' % path)
+
+
+def _object_array(values):
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _require(name, module):
+    if module is None:
+        raise MetaPubError('%s is required for this export (pip install %s)' % (name, name))
+
+
+_ARROW_TYPES = {'int64': lambda: pyarrow.int64(),
+                'int16': lambda: pyarrow.int16(),
+                'string': lambda: pyarrow.string()}
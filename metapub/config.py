@@ -16,6 +16,10 @@ if not os.access(DEFAULT_CACHE_DIR, os.W_OK):
     import tempfile
     DEFAULT_CACHE_DIR = tempfile.gettempdir()
 
+# cache url used in place of DEFAULT_CACHE_DIR, e.g. 'lmdb:///data/metapub-cache'
+# (see metapub.cache_backends). Unset: SQLite files in the default cache directory.
+DEFAULT_CACHE_URL = os.getenv('METAPUB_CACHE_URL')
+
 # email address submitted to eutils with requests (as required by their api).
 DEFAULT_EMAIL = os.getenv('EUTILS_EMAIL', 'metapub@nthmost.com')
 
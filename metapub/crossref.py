@@ -11,9 +11,10 @@ import json
 #py3k / py2k compatibility
 from six.moves import urllib
 
-import requests
+from . import sessions
 
-from .eutils_common import SQLiteCache, get_cache_path
+from .eutils_common import get_cache_path
+from .cache_backends import open_cache
 from .exceptions import *
 from .config import DEFAULT_CACHE_DIR
 
@@ -96,7 +97,7 @@ class CrossRef(Borg):
         
         if cachedir:
             self._cache_path = get_cache_path(cachedir, CACHE_FILENAME)
-            self._cache = SQLiteCache(self._cache_path)
+            self._cache = open_cache(self._cache_path)
         else:
             self._cache_path = None
             self._cache = None
@@ -140,7 +141,7 @@ class CrossRef(Borg):
         return self.query(search, params)
 
     def _query_api(self, q):
-        response = requests.get(q)
+        response = sessions.get(q)
         if response.status_code == 200:
             return response.text
         else:
@@ -2,9 +2,10 @@ from __future__ import print_function, absolute_import, unicode_literals
 
 import logging
 
-import requests
+from . import sessions
 
-from .eutils_common import SQLiteCache, get_cache_path
+from .eutils_common import get_cache_path
+from .cache_backends import open_cache
 from .base import Borg
 from .config import DEFAULT_CACHE_DIR
 from .exceptions import BadDOI, DxDOIError
@@ -19,7 +20,7 @@ def _get_dx_doi_cache(cachedir=DEFAULT_CACHE_DIR):
     global DX_DOI_CACHE
     if not DX_DOI_CACHE:
         _cache_path = get_cache_path(cachedir, CACHE_FILENAME)
-        DX_DOI_CACHE = SQLiteCache(_cache_path)
+        DX_DOI_CACHE = open_cache(_cache_path)
     return DX_DOI_CACHE
 
 
@@ -64,7 +65,7 @@ class DxDOI(Borg):
         return doi
 
     def _query_api(self, doi):
-        response = requests.get(DX_DOI_URL % doi)
+        response = sessions.get(DX_DOI_URL % doi)
         if response.status_code in [200, 401, 301, 302, 307, 308, 416]:
             return response.url
         else:
@@ -1,11 +1,21 @@
 from __future__ import absolute_import, unicode_literals
 
 import os, logging
+import hashlib
+
+from lxml import etree
+
+from eutils.queryservice import QueryService, url_base, default_cache_path
+from eutils.exceptions import EutilsRequestError, EutilsNCBIError
+from eutils.compat import pickle
 
 # this import is used by other modules (but not in this one):
 from eutils.sqlitecache import SQLiteCache
 
-from .config import DEFAULT_EMAIL, PKGNAME
+from .config import DEFAULT_EMAIL, DEFAULT_CACHE_URL, PKGNAME
+from .cache_utils import MetaPubCache
+from .cache_backends import open_cache, is_cache_url, cache_url_for
+from . import ratelimit, sessions
 from .exceptions import MetaPubError
 
 EUTILS_DEFAULT_CACHEDIR = os.path.expanduser('~/.cache')
@@ -15,17 +25,166 @@ logging.getLogger('eutils').setLevel(logging.WARNING)
 logging.getLogger('requests').setLevel(logging.ERROR)
 # ==
 
+_log = logging.getLogger('metapub.eutils')
+
+
+class MetaPubQueryService(QueryService):
+    """ eutils QueryService with uncached access to the NCBI History server.
+
+    Requests that create or read a WebEnv (usehistory=y) are only valid for a few
+    hours after the esearch that created them, so they are neither answered from
+    nor stored in the SQLite cache. All requests are throttled and retried by the
+    process-wide NCBI rate limiter (metapub.ratelimit) rather than per client.
+
+    The cache is a MetaPubCache (same file format as eutils' SQLiteCache), which
+    adds bulk access and thread safety, or any other backend opened from a cache
+    url (see metapub.cache_backends).
+
+    prepare_query, cache_get and cache_put are the steps of _query other clients
+    (e.g. AsyncPubMedFetcher) use to share its query args, cache keys and cache.
+    """
+
+    def __init__(self, *args, **kwargs):
+        cache = kwargs.pop('cache', False)
+        super(MetaPubQueryService, self).__init__(*args, cache=False, **kwargs)
+        if cache is True:
+            cache = default_cache_path
+        if not cache:
+            self._cache = None
+        elif hasattr(cache, 'get_many'):
+            self._cache = cache
+        else:
+            self._cache = open_cache(cache)
+
+    def esearch_history(self, args):
+        """ execute an uncached, throttled esearch query with usehistory=y.
+
+        :param dict args: dict of query items, containing at least 'db' and 'term' keys
+        :returns: content of reply (containing WebEnv and QueryKey)
+        :rtype: bytes
+        """
+        args = dict(args, usehistory='y')
+        return self._query('/esearch.fcgi', args, skip_cache=True, store_cache=False)
+
+    def efetch_history(self, args):
+        """ execute an uncached, throttled efetch query against the History server.
+
+        :param dict args: dict of query items, containing at least 'db', 'WebEnv'
+                          and 'query_key' keys (and usually 'retstart' and 'retmax')
+        :returns: content of reply
+        :rtype: bytes
+        """
+        return self._query('/efetch.fcgi', args, skip_cache=True, store_cache=False)
+
+    def _query(self, path, args=None, skip_cache=False, skip_sleep=False, store_cache=True):
+        """return results for a NCBI query, possibly from the cache
+
+        Same as eutils.QueryService._query, plus the store_cache param (whether to
+        write the result into the cache), except that requests are throttled by the
+        process-wide NCBI rate limiter and transient failures (429/5xx) are retried
+        (see metapub.ratelimit).
+
+        :param: path: relative query path (e.g., 'einfo.fcgi')
+        :param: args: dictionary of query args
+        :param: skip_cache: whether to bypass the cache on reading
+        :param: skip_sleep: whether to bypass query throttling
+        :param: store_cache: whether to store the result in the cache
+        :rtype: xml string
+        """
+        url, full_args, cache_key = self.prepare_query(path, args)
+
+        if not skip_cache:
+            content = self.cache_get(cache_key)
+            if content is not None:
+                return content
+
+        if skip_sleep:
+            r = sessions.post(url, full_args)
+        else:
+            r = ratelimit.post(url, full_args, api_key=self.api_key)
+
+        check_eutils_response(r.status_code, r.reason, r.content)
+
+        if store_cache:
+            self.cache_put(cache_key, r.content)
+        return r.content
+
+    def prepare_query(self, path, args=None):
+        """ returns (url, full_args, cache_key) for the given eutils path and query args.
+
+        The cache key intentionally excludes the identifying args (tool and email), and
+        is computed exactly as eutils.QueryService computes it, so cache files are
+        interchangeable between eutils and metapub (sync or async) clients.
+        """
+        if args is None:
+            args = {}
+        url = url_base + path
+        defining_args = dict(list(self.default_args.items()) + list(args.items()))
+        full_args = dict(list(self._ident_args.items()) + list(defining_args.items()))
+        cache_key = hashlib.md5(pickle.dumps((url, sorted(defining_args.items())))).hexdigest()
+        if self.api_key:
+            url += '?api_key={self.api_key}'.format(self=self)
+        return url, full_args, cache_key
+
+    def cache_get(self, cache_key):
+        """ returns cached content for cache_key, or None if not cached (or no cache). """
+        if self._cache is None:
+            return None
+        try:
+            content = self._cache[cache_key]
+            _log.debug('cache hit for key %s', cache_key)
+            return content
+        except KeyError:
+            _log.debug('cache miss for key %s', cache_key)
+            return None
+
+    def cache_put(self, cache_key, content):
+        """ stores content under cache_key (unless it's an error reply, or there's no cache). """
+        if self._cache is not None and _cacheable(content):
+            self._cache[cache_key] = content
+            _log.debug('cached results for key %s', cache_key)
+
+
+def check_eutils_response(status_code, reason, content):
+    """ raises the appropriate eutils exception if an eutils reply indicates failure.
+
+    :param status_code: (int) HTTP status code
+    :param reason: (str) HTTP reason phrase
+    :param content: (bytes) body of reply
+    :raises EutilsRequestError: when NCBI replies, but the request failed
+    :raises EutilsNCBIError: when the reply to a failed request can't be parsed
+    """
+    ok = status_code < 400
+    if ok and b'<ERROR>' not in content and b'<error>' not in content:
+        return
+
+    try:
+        error = etree.fromstring(content).findtext('ERROR')
+    except Exception as ex:
+        raise EutilsNCBIError('Error parsing response object from NCBI: {}'.format(ex))
+
+    if error or not ok:
+        raise EutilsRequestError('{reason} ({status_code}): {error}'.format(
+                                 reason=reason, status_code=status_code, error=error))
+
+
+def _cacheable(content):
+    """ return False if content shouldn't be cached (contains a no-cache meta line). """
+    return not (b'no-cache' in content and
+                etree.XML(content).xpath("//meta/@content='no-cache'"))
+
 
 def get_eutils_client(cache_path, email=DEFAULT_EMAIL, api_key=None):
     """
-    :param cache_path: valid filesystem path to SQLite cache file
+    :param cache_path: valid filesystem path to SQLite cache file, cache url (see
+                       metapub.cache_backends) or already-open cache object
     :param email: (optional) email address to submit with cache queries
+    :param api_key: (optional) NCBI api key
     :return: eutils QueryService client object
     """
-    from eutils import Client
     if cache_path is None:
-        return Client(api_key=api_key)
-    return Client(cache=cache_path, api_key=api_key)
+        return MetaPubQueryService(email=email, tool=PKGNAME, api_key=api_key)
+    return MetaPubQueryService(cache=cache_path, email=email, tool=PKGNAME, api_key=api_key)
 
 
 
@@ -35,21 +194,31 @@ def get_cache_path(cachedir, filename='metapub-cache.db'):
 
         if cachedir is None, returns None.
         if cachedir is 'default', returns the eutils default of '~/.cache/<filename>'
+        (or, if the METAPUB_CACHE_URL environment variable is set, a cache url
+        within it, as below).
+        if cachedir is a cache url (e.g. 'lmdb:///data/cache', see metapub.cache_backends),
+        returns the url of the cache named for filename within it.
 
         Supports expansion of user directory shortcut '~' to full path.
 
-    :param cachedir: directory to store
+    :param cachedir: directory to store, or cache url
     :param filename: name of cache file
-    :return: path to SQLite DB file
+    :return: path to SQLite DB file (or cache url)
     :raises MetaPubError
     """
     if cachedir is None:
         return None
 
+    elif cachedir == 'default' and DEFAULT_CACHE_URL:
+        cachedir = DEFAULT_CACHE_URL
+
     elif cachedir == 'default':
         cachedir = EUTILS_DEFAULT_CACHEDIR
 
-    elif cachedir.find('~') > -1:
+    if is_cache_url(cachedir):
+        return cache_url_for(cachedir, filename)
+
+    if cachedir.find('~') > -1:
         cachedir = os.path.expanduser(cachedir)
 
     if _require_dir(cachedir):
@@ -10,10 +10,17 @@ if six.PY2:
 else:
     from urllib.parse import urlsplit, urljoin
 
+import time
+import logging
+
 import requests
 from lxml.html import HTMLParser
 from lxml import etree
 
+from .. import sessions
+from ..config import DEFAULT_CACHE_DIR
+from ..eutils_common import get_cache_path
+from ..cache_backends import open_cache
 from ..dx_doi import DxDOI, DX_DOI_URL
 from ..pubmedarticle import square_voliss_data_for_pma
 from ..exceptions import AccessDenied, NoPDFLink, BadDOI, DxDOIError
@@ -57,19 +64,175 @@ def standardize_journal_name(journal_name):
     '''Returns a "standardized" journal name with periods stripped out.'''
     return remove_chars(journal_name, '.')
 
-def verify_pdf_url(pdfurl, publisher_name=''):
-    res = requests.get(pdfurl)
+# How verify_pdf_url checks a url:
+#   'head':  HEAD request; if that doesn't show a PDF, fall back to 'range' (unless the
+#            error status is definitive, i.e. not in HEAD_FALLBACK_STATUS_CODES).
+#   'range': GET of just the first VERIFY_RANGE_BYTES bytes (connection closed after
+#            reading them), checked for the %PDF magic number.
+#   'get':   plain GET of the whole url, checking the content-type (the old way).
+VERIFY_METHODS = ('head', 'range', 'get')
+DEFAULT_VERIFY_METHOD = 'head'
+
+# per-publisher (publisher_name as passed to verify_pdf_url) or per-hostname overrides,
+# for hosts that mishandle HEAD or Range requests. See set_verify_method.
+PUBLISHER_VERIFY_METHODS = {}
+
+VERIFY_RANGE_BYTES = 1024
+
+# error statuses some hosts give HEAD requests only; other errors aren't retried.
+HEAD_FALLBACK_STATUS_CODES = (403, 405, 501)
+
+PDF_MAGIC = b'%PDF'
+
+def set_verify_method(publisher_or_host, method):
+    '''Sets how verify_pdf_url checks urls for the given publisher name (e.g. 'Wiley')
+    or hostname (e.g. 'onlinelibrary.wiley.com'). method=None restores the default.'''
+    if method is None:
+        PUBLISHER_VERIFY_METHODS.pop(publisher_or_host, None)
+    elif method not in VERIFY_METHODS:
+        raise ValueError('verify method must be one of %r' % (VERIFY_METHODS, ))
+    else:
+        PUBLISHER_VERIFY_METHODS[publisher_or_host] = method
+
+def _verify_method_for(pdfurl, publisher_name):
+    if publisher_name in PUBLISHER_VERIFY_METHODS:
+        return PUBLISHER_VERIFY_METHODS[publisher_name]
+    hostname = (urlsplit(pdfurl).hostname or '').lower()
+    return PUBLISHER_VERIFY_METHODS.get(hostname, DEFAULT_VERIFY_METHOD)
+
+# Outcomes of verify_pdf_url are cached by url, good ones for VERIFY_CACHE_TTL seconds and
+# bad ones (DENIED, or TXERROR from an error status) for VERIFY_CACHE_NEGATIVE_TTL seconds,
+# since those are more likely to change. (Connection errors aren't cached.)
+# See configure_verify_cache.
+VERIFY_CACHE_FILENAME = 'findit-verify-cache.db'
+VERIFY_CACHE_DIR = DEFAULT_CACHE_DIR
+VERIFY_CACHE_TTL = 7 * 24 * 3600
+VERIFY_CACHE_NEGATIVE_TTL = 24 * 3600
+
+VERIFY_CACHE = None
+
+log = logging.getLogger('metapub.findit.dances')
+
+def configure_verify_cache(cachedir=DEFAULT_CACHE_DIR, ttl=None, negative_ttl=None):
+    '''Sets where verify_pdf_url results are cached (cachedir=None disables the cache)
+    and, optionally, how long good (ttl) and bad (negative_ttl) results are kept, in seconds.'''
+    global VERIFY_CACHE, VERIFY_CACHE_DIR, VERIFY_CACHE_TTL, VERIFY_CACHE_NEGATIVE_TTL
+    VERIFY_CACHE = None
+    VERIFY_CACHE_DIR = cachedir
+    if ttl is not None:
+        VERIFY_CACHE_TTL = ttl
+    if negative_ttl is not None:
+        VERIFY_CACHE_NEGATIVE_TTL = negative_ttl
+
+def _get_verify_cache():
+    global VERIFY_CACHE
+    if VERIFY_CACHE is None and VERIFY_CACHE_DIR is not None:
+        VERIFY_CACHE = open_cache(get_cache_path(VERIFY_CACHE_DIR, VERIFY_CACHE_FILENAME))
+    return VERIFY_CACHE
+
+def _query_verify_cache(cache, pdfurl):
+    '''Returns cached verify_pdf_url outcome for pdfurl (a dict with status, content_type,
+    reason and timestamp keys), or None if there isn't one or it has expired.'''
+    try:
+        entry = cache[pdfurl]
+    except KeyError:
+        return None
+    ttl = VERIFY_CACHE_TTL if entry['reason'] is None else VERIFY_CACHE_NEGATIVE_TTL
+    if entry['timestamp'] + ttl < time.time():
+        log.debug('Verify cache: expunging result for %s', pdfurl)
+        try:
+            del cache[pdfurl]
+        except KeyError:
+            pass
+        return None
+    return entry
+
+def _is_pdf_content_type(res):
+    return res.headers.get('content-type', '').find('pdf') > -1
+
+def _status_reason(res, pdfurl, publisher_name):
     if res.status_code==401:
-        raise NoPDFLink('DENIED: %s url (%s) requires login.' % (publisher_name, pdfurl))
+        return 'DENIED: %s url (%s) requires login.' % (publisher_name, pdfurl)
 
     if not res.ok:
-        raise NoPDFLink('TXERROR: %i status returned from %s url (%s)' % (res.status_code, 
-                            publisher_name, pdfurl))
+        return 'TXERROR: %i status returned from %s url (%s)' % (res.status_code,
+                            publisher_name, pdfurl)
+    return None
+
+def _check_pdf_url(pdfurl, publisher_name, method):
+    '''Does the checking for verify_pdf_url. Returns (status code, content-type, reason),
+    with reason None if pdfurl leads to a PDF.'''
+    not_pdf = 'DENIED: %s url (%s) did not result in a PDF' % (publisher_name, pdfurl)
+
+    if method == 'head':
+        res = sessions.head(pdfurl, allow_redirects=True)
+        content_type = res.headers.get('content-type')
+        if res.ok and _is_pdf_content_type(res):
+            return res.status_code, content_type, None
+        if not res.ok and res.status_code not in HEAD_FALLBACK_STATUS_CODES:
+            # e.g. 401, 404, 410: a GET would get the same answer.
+            return res.status_code, content_type, _status_reason(res, pdfurl, publisher_name)
+        # some hosts answer HEAD with 405, 403 or an html content-type; ask for the bytes.
+        method = 'range'
+
+    if method == 'range':
+        res = sessions.get(pdfurl, headers={'Range': 'bytes=0-%i' % (VERIFY_RANGE_BYTES - 1)}, stream=True)
+        content_type = res.headers.get('content-type')
+        try:
+            reason = _status_reason(res, pdfurl, publisher_name)
+            if reason:
+                return res.status_code, content_type, reason
+            # (a server ignoring Range sends the whole file; only the start is read.)
+            start = next(res.iter_content(VERIFY_RANGE_BYTES), b'')
+        finally:
+            res.close()
+        if start.find(PDF_MAGIC) > -1 or (not start and _is_pdf_content_type(res)):
+            return res.status_code, content_type, None
+        return res.status_code, content_type, not_pdf
+
+    res = sessions.get(pdfurl)
+    content_type = res.headers.get('content-type')
+    reason = _status_reason(res, pdfurl, publisher_name)
+    if reason:
+        return res.status_code, content_type, reason
+
+    if res.status_code in OK_STATUS_CODES and _is_pdf_content_type(res):
+        return res.status_code, content_type, None
+    return res.status_code, content_type, not_pdf
+
+def verify_pdf_url(pdfurl, publisher_name='', method=None, use_cache=True):
+    '''Checks that pdfurl leads to a PDF, without downloading the whole file (see
+    VERIFY_METHODS). Returns pdfurl if it does.
+
+    Outcomes are cached by url (see configure_verify_cache), so urls checked recently
+    aren't requested again.
 
-    if res.status_code in OK_STATUS_CODES and res.headers['content-type'].find('pdf') > -1:
-        return pdfurl
+    Args:
+        pdfurl (str)
+        publisher_name (str): used in error messages, and to pick the verify method
+        method (str): 'head', 'range' or 'get' (default: set_verify_method setting
+                      for this publisher or host, else DEFAULT_VERIFY_METHOD)
+        use_cache (bool): default True
+
+    Raises:
+        NoPDFLink (reason starting with DENIED or TXERROR) if url doesn't lead to a PDF
+    '''
+    cache = _get_verify_cache() if use_cache else None
+    entry = None if cache is None else _query_verify_cache(cache, pdfurl)
+
+    if entry is None:
+        status, content_type, reason = _check_pdf_url(pdfurl, publisher_name,
+                                                      method or _verify_method_for(pdfurl, publisher_name))
+        entry = {'status': status, 'content_type': content_type, 'reason': reason,
+                 'timestamp': time.time()}
+        if cache is not None:
+            cache[pdfurl] = entry
     else:
-        raise NoPDFLink('DENIED: %s url (%s) did not result in a PDF' % (publisher_name, pdfurl))
+        log.debug('Verify cache: returning result for %s', pdfurl)
+
+    if entry['reason']:
+        raise NoPDFLink(entry['reason'])
+    return pdfurl
 
 def rectify_pma_for_vip_links(pma):
     '''takes a PubMedArticle object and "squares" the volume/issue/page info (sometimes there
@@ -170,7 +333,7 @@ def the_pii_polka(pma, verify=True):
         raise NoPDFLink('MISSING: pii missing from PubMedArticle XML (pii format)')
 
     if url:
-        res = requests.get(url)
+        res = sessions.get(url)
         if res.text.find('Access Denial') > -1:
             raise AccessDenied('DENIED: Access Denied by ScienceDirect (%s)' % url)
 
@@ -221,7 +384,7 @@ def the_najms_mazurka(pma, verify=True):
         raise NoPDFLink('MISSING: pii, doi (doi lookup failed)')
 
     url = ''
-    response = requests.get(starturl)
+    response = sessions.get(starturl)
     if response.ok:
         body = etree.fromstring(response.content, parser=HTMLParser()).find('body')
         href = body.findall('table/tr/td/p/a')[0].get('href')
@@ -258,7 +421,7 @@ def the_sciencedirect_disco(pma, verify=True):
         raise NoPDFLink('MISSING: pii, doi (doi lookup failed)')
 
     try:
-        res = requests.get(starturl)
+        res = sessions.get(starturl)
     except requests.exceptions.TooManyRedirects:
         raise NoPDFLink('TXERROR: ScienceDirect TooManyRedirects: cannot reach %s via %s' %
                         (pma.journal, starturl))
@@ -310,13 +473,13 @@ def the_scielo_chula(pma, verify=True):
     page_text = None
     baseurl_pii = 'http://www.scielo.br/scielo.php?script=sci_arttext&pid=%s'
     if pma.pii:
-        response = requests.get(baseurl_pii % pma.pii)
+        response = sessions.get(baseurl_pii % pma.pii)
         if response.ok:
             page_text = response.content
 
     if page_text is None:
         if pma.doi:
-            response = requests.get(the_doi_2step(pma.doi))
+            response = sessions.get(the_doi_2step(pma.doi))
             if response.ok:
                 page_text = response.content
         else:
@@ -355,46 +518,12 @@ def the_aaas_tango(pma, verify=True):
     #except NoPDFLink:
         # try the pmid-based approach
     baseurl = 'http://www.sciencemag.org/cgi/pmidlookup?view=long&pmid=%s' % pma.pmid
-    res = requests.get(baseurl)
+    res = sessions.get(baseurl)
     pdfurl = res.url.replace('.long', '.full') + '.pdf'
 
     if not verify:
         return pdfurl
-
-    response = requests.get(pdfurl)
-    if response.status_code == 200 and response.headers['content-type'].find('pdf') > -1:
-        return response.url
-
-    elif response.status_code == 200 and response.headers['content-type'].find('html') > -1:
-        tree = etree.fromstring(response.content, HTMLParser())
-
-        if not tree.find('head/title').text.find('Sign In') > -1:
-            raise NoPDFLink('TXERROR: AAAS returned unexpected HTML response for url %s' % (pdfurl))
-        else:
-            # some items are acquirable via free account registration... but let's not mess with this just yet.
-            raise NoPDFLink('DENIED: AAAS paper subscription-only or requires site registration (url: %s)' % pdfurl)
-    
-        form = tree.cssselect('form')[0]
-        fbi = form.fields.get('form_build_id')
-
-        baseurl = urlsplit(response.url)
-        post_url = baseurl.scheme + '://' + baseurl.hostname + form.action
-
-        payload = {'pass': AAAS_PASSWORD, 'name': AAAS_USERNAME,
-                   'form_build_id': fbi, 'remember_me': 1}
-        print("SUBMITTING TO AAAS")
-        print(payload)
-
-        response = requests.post(post_url, data=payload)
-        if response.status_code == 403:
-            return AccessDenied('DENIED: AAAS subscription-only paper (url: %s)')
-        elif response.headers['content-type'].find('pdf') > -1:
-            return response.url
-        elif response.headers['content-type'].find('html') > -1:
-            #if response.content.find('access-denied') > -1:
-            raise NoPDFLink('DENIED: AAAS subscription-only paper (url: %s)' % pdfurl)
-    else:
-        raise NoPDFLink('TXERROR: AAAS returned %s for url %s' % (response.status_code, pdfurl))
+    return verify_pdf_url(pdfurl, 'AAAS')
 
 def the_jama_dance(pma, verify=True):
     '''  :param: pma (PubMedArticle object)
@@ -406,7 +535,7 @@ def the_jama_dance(pma, verify=True):
         raise NoPDFLink('MISSING: doi needed for JAMA article.')
 
     baseurl = the_doi_2step(pma.doi)
-    res = requests.get(baseurl)
+    res = sessions.get(baseurl)
     parser = HTMLParser()
     tree = etree.fromstring(res.content, parser)
     # we're looking for a meta tag like this:
@@ -429,7 +558,7 @@ def the_jstage_dive(pma, verify=True):
     '''
     if pma.doi:
         url = the_doi_2step(pma.doi)
-        res = requests.get(url)
+        res = sessions.get(url)
         if res.url.find('jstage') > -1:
             url = res.url.replace('_article', '_pdf')
             pdfpos = url.find('_pdf')
@@ -459,7 +588,7 @@ def the_wiley_shuffle(pma, verify=True):
         return url
 
     # wiley sometimes buries PDF links in HTML pages we have to parse.
-    res = requests.get(url)
+    res = sessions.get(url)
     if res.headers['content-type'].find('html') > -1:
         if 'ACCESS DENIED' in res.text:
             raise AccessDenied('DENIED: Wiley E Publisher says no to %s' % res.url)
@@ -651,12 +780,12 @@ def the_wolterskluwer_volta(pma, verify=True):
     doiurl = 'http://content.wkhealth.com/linkback/openurl?doi=%s'
     volissurl = 'http://content.wkhealth.com/linkback/openurl?issn={a.issn}&volume={a.volume}&issue={a.issue}&spage={a.first_page}'
     if pma.doi:
-        baseurl = requests.get(doiurl % pma.doi).url
+        baseurl = sessions.get(doiurl % pma.doi).url
     elif pma.issn:
         pma = rectify_pma_for_vip_links(pma)  #raises NoPDFLink if missing data
-        baseurl = requests.get(volissurl.format(a=pma)).url
+        baseurl = sessions.get(volissurl.format(a=pma)).url
         
-    res = requests.get(baseurl)
+    res = sessions.get(baseurl)
     tree = etree.fromstring(res.content, HTMLParser())
     try:
         item = tree.cssselect('li.ej-box-01-body-li-article-tools-pdf')[0]
@@ -20,11 +20,12 @@ from ..utils import asciify
 from ..config import DEFAULT_CACHE_DIR
 from ..pubmedfetcher import PubMedFetcher
 from ..convert import PubMedArticle2doi_with_score, doi2pmid
-from ..eutils_common import SQLiteCache, get_cache_path
+from ..eutils_common import get_cache_path
 
 from .logic import find_article_from_pma
 from .dances import the_sciencedirect_disco, the_doi_2step, the_wiley_shuffle, the_wolterskluwer_volta
-from ..cache_utils import datetime_to_timestamp
+from ..cache_utils import sellby_timestamp
+from ..cache_backends import open_cache
 
 """ findit/findit.py
 
@@ -57,15 +58,50 @@ from ..cache_utils import datetime_to_timestamp
 
 CACHE_FILENAME = 'findit-cache.db'
 
-FINDIT_CACHE = None
+# seconds after which cached results are looked up afresh (None: never).
+CACHE_TTL = None
+
+# open caches, by path (or cache url).
+FINDIT_CACHES = {}
 
 
 def _get_findit_cache(cachedir=DEFAULT_CACHE_DIR):
-    global FINDIT_CACHE
-    if not FINDIT_CACHE:
-        _cache_path = get_cache_path(cachedir, CACHE_FILENAME)
-        FINDIT_CACHE = SQLiteCache(_cache_path)
-    return FINDIT_CACHE
+    _cache_path = get_cache_path(cachedir, CACHE_FILENAME)
+    cache = FINDIT_CACHES.get(_cache_path)
+    if cache is None:
+        cache = FINDIT_CACHES[_cache_path] = open_cache(_cache_path)
+    return cache
+
+
+def usable_cache_result(cache_result, verify=True, retry_errors=False, expiry_date=None):
+    """ Returns True if a cached FindIt result can be used as is (see
+    FindIt.load_from_cache): it exists, hasn't expired, was verified if verify=True,
+    and its reason isn't one that calls for a fresh try.
+
+    :param cache_result: dict from the FindIt cache, or None
+    :param verify: (bool) default: True
+    :param retry_errors: (bool) also retry results with TXERROR reasons (default: False)
+    :param expiry_date: datetime or timestamp; older results have expired (as do those
+                        older than CACHE_TTL seconds, if set)
+    :rtype: bool
+    """
+    if not cache_result:
+        return False
+
+    if cache_result.get('timestamp', 0) < sellby_timestamp(expiry_date, CACHE_TTL):
+        return False
+
+    retry_reasons = ['PAYWALL', 'TODO', 'NOFORMAT', 'CANTDO']
+    if retry_errors:
+        retry_reasons.append('TXERROR')
+
+    reason = '' if cache_result['reason'] is None else cache_result['reason']
+
+    # Prefer cached results that were verified.
+    # Don't return cached results in retry_reasons list above. (i.e. retry)
+    if cache_result.get('verify', False) or verify == False:
+        return not reason.split(':')[0] in retry_reasons
+    return False
 
 
 class FindIt(object):
@@ -97,6 +133,13 @@ class FindIt(object):
         If CrossRef came into play during the process to find a DOI that was missing
         for the PubMedArticle object, the doi_score will come from the CrossRef "top
         result".
+
+        When starting from a PMID, the cache is checked first; on a hit, no requests
+        are made and the PubMedArticle (source.pma) is only fetched if it's used.
+        FindIt.lookup_cached(pmid) returns just the cached result, if any.
+
+        Cached results older than the expiry_date keyword argument (a datetime or
+        timestamp), or than CACHE_TTL seconds if that's set, are looked up afresh.
     """
 
     def __init__(self, pmid=None, fetcher=None, **kwargs):
@@ -112,10 +155,12 @@ class FindIt(object):
         self.doi_min_score = kwargs.get('doi_min_score', 2.3)
         self.tmpdir = kwargs.get('tmpdir', '/tmp')
         self.doi_score = None
-        self.pma = None
+        self._pma = None
+        self._cache_result = None
         self._backup_url = None
 
         self.verify = kwargs.get('verify', True)
+        self.expiry_date = kwargs.get('expiry_date', None)
         retry_errors = kwargs.get('retry_errors', False)
 
         cachedir = kwargs.get('cachedir', DEFAULT_CACHE_DIR)
@@ -128,6 +173,13 @@ class FindIt(object):
             self._log.setLevel(logging.INFO)
 
         if self.pmid:
+            # check the cache before fetching the article: a hit needs no requests at all,
+            # and the PubMedArticle is only fetched if self.pma is used.
+            if self._cache:
+                cached = self._cached_url_and_reason(verify=self.verify, retry_errors=retry_errors)
+                if cached is not None:
+                    self.url, self.reason = cached
+                    return
             self._load_pma_from_pmid()
         elif self.doi:
             self._load_pma_from_doi()
@@ -141,9 +193,27 @@ class FindIt(object):
             else:
                 self.url, self.reason = self.load(verify=self.verify)
 
-        except requests.exceptions.ConnectionError as error:
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
             self.reason = 'TXERROR: %r' % error
 
+    @staticmethod
+    def batch(pmids, workers=4, **kwargs):
+        """ Looks up many PMIDs concurrently (see findit.pool.FindItPool), yielding a
+        FindItResult (pmid, doi, doi_score, url, reason, journal, year) for each
+        as soon as it's done:
+
+            for result in FindIt.batch(pmids, workers=8, verify=False):
+                print(result.pmid, result.url, result.reason)
+
+        :param pmids: iterable of PMIDs
+        :param workers: (int) number of worker threads (default: 4)
+        Other keyword arguments (max_per_host, host_limits, and FindIt arguments
+        such as verify) are passed to FindItPool.
+        :return: generator of FindItResult, in order of completion
+        """
+        from .pool import FindItPool
+        return FindItPool(workers=workers, **kwargs).imap(pmids)
+
     def load(self, verify=True):
         """ Interface to logic.find_article_from_pma; uses self.pma to return
         a (url, reason) tuple.
@@ -179,20 +249,9 @@ class FindIt(object):
         :param retry_errors: (bool) default: False
         :return: (url, reason) (string or None, string or None)
         """
-        retry_reasons = ['PAYWALL', 'TODO', 'NOFORMAT', 'CANTDO']
-        if retry_errors:
-            retry_reasons.append('TXERROR')
-
-        cache_result = self._query_cache(self.pmid)
-        if cache_result:
-            url = cache_result['url']
-            reason = '' if cache_result['reason'] is None else cache_result['reason']
-
-            # Prefer cached results that were verified.
-            # Don't return cached results in retry_reasons list above. (i.e. retry)
-            if cache_result.get('verify', False) or verify == False:
-                if not reason.split(':')[0] in retry_reasons:
-                    return (url, reason)
+        cached = self._cached_url_and_reason(verify=verify, retry_errors=retry_errors)
+        if cached is not None:
+            return cached
 
         # === RETRY === #
         # we're here for one of the following reasons:
@@ -200,9 +259,62 @@ class FindIt(object):
         # 2) previous result was unverified and now verify=True
         # 3) previous result had a "reason" in retry_reasons
         url, reason = self.load(verify=verify)
-        self._store_cache(self.pmid, url=url, reason=reason, verify=verify)
+        pma = self.pma
+        self._store_cache(self.pmid, url=url, reason=reason, verify=verify, doi=self.doi,
+                          doi_score=self.doi_score, journal=pma.journal, year=pma.year)
         return (url, reason)
 
+    def _cached_url_and_reason(self, verify=True, retry_errors=False):
+        """ Returns (url, reason) from the cache for self.pmid if there's a usable
+        result there (see load_from_cache), else None. Sets self.doi and self.doi_score
+        from the cached result if they're not already known.
+        """
+        cache_result = self._query_cache(self.pmid, self.expiry_date)
+        if usable_cache_result(cache_result, verify=verify, retry_errors=retry_errors):
+            self._cache_result = cache_result
+            if self.doi is None:
+                self.doi = cache_result.get('doi')
+                self.doi_score = cache_result.get('doi_score')
+            return (cache_result['url'], cache_result['reason'] or '')
+        return None
+
+    @staticmethod
+    def lookup_cached(pmid, verify=False, cachedir=DEFAULT_CACHE_DIR):
+        """ Returns the cached FindIt result for pmid without making any requests, or
+        None if there isn't one (or pmid isn't a number). Results are dictionaries with (at least) url, reason,
+        verify and timestamp keys; results cached by recent versions also have doi,
+        doi_score, journal and year.
+
+        :param pmid: (str or int)
+        :param verify: (bool) only return results that were verified (default: False)
+        :param cachedir: FindIt cache directory
+        :return: dict or None
+        """
+        # (the same check as FindItPool's bulk lookups.)
+        pmid = str(pmid).strip()
+        if not pmid.isdigit():
+            return None
+        try:
+            result = _get_findit_cache(cachedir)[int(pmid)]
+        except KeyError:
+            return None
+        if verify and not result.get('verify', False):
+            return None
+        if result.get('timestamp', 0) < sellby_timestamp(ttl=CACHE_TTL):
+            return None
+        return result
+
+    @property
+    def pma(self):
+        """ The PubMedArticle for this lookup, fetched on first use. """
+        if self._pma is None and self.pmid:
+            self._load_pma_from_pmid()
+        return self._pma
+
+    @pma.setter
+    def pma(self, pma):
+        self._pma = pma
+
     @property
     def backup_url(self):
         """ Returns a backup url to try if the first url doesn't pan out.
@@ -285,12 +397,17 @@ class FindIt(object):
             self.doi = self.pma.doi
             self.doi_score = 10.0
 
+        elif self.doi:
+            # already looked up (this is a lazy load following a cache hit).
+            self.pma.doi = self.doi
+
         if self.pma.doi == None:
             if self.use_crossref:
                 self.pma.doi, self.doi_score = PubMedArticle2doi_with_score(
                                                     self.pma, min_score=self.doi_min_score)
                 if self.pma.doi == None:
-                    self.reason = 'MISSING: doi (CrossRef lookup failed)'
+                    if self.reason is None:
+                        self.reason = 'MISSING: doi (CrossRef lookup failed)'
                 else:
                     self.doi = self.pma.doi
 
@@ -327,7 +444,7 @@ class FindIt(object):
 
         A time.time() timestamp will be added to the value dictionary when stored.
 
-        There is no return from this function. Exceptions from the SQLiteCache 
+        There is no return from this function. Exceptions from the cache 
         object may be raised.
         """
         cache_value = kwargs.copy()
@@ -340,8 +457,9 @@ class FindIt(object):
 
         Cache results are stored with a time.time() timestamp.
 
-        When expiry_date is supplied, results from the cache past their
-        sell-by date will be expunged from the cache and return will be None.
+        Results older than expiry_date (when supplied) or than CACHE_TTL seconds
+        (if set) are past their sell-by date: they are expunged from the cache and
+        return will be None.
 
         expiry_date can be either a python datetime or a timestamp. 
 
@@ -350,27 +468,26 @@ class FindIt(object):
         :rtype: (url, reason) or None
         """
 
-        if hasattr(expiry_date, 'strftime'):
-            # convert to timestamp
-            sellby = datetime_to_timestamp(expiry_date)
-        else:
-            # make sure sellby is a number, not None
-            sellby = expiry_date if expiry_date else 0
+        sellby = sellby_timestamp(expiry_date, CACHE_TTL)
 
         if self._cache:
             cache_key = self._make_cache_key(pmid)
             try:
                 res = self._cache[cache_key]
-                timestamp = res['timestamp']
-                if timestamp < sellby:
-                    self._log.debug('Cache: expunging result for %s (%i)', cache_key, timestamp)
-                else:
-                    self._log.debug('Cache: returning result for %s (%i)', cache_key, timestamp)
-                return res
-
             except KeyError:
                 self._log.debug('Cache: no result for key %s', cache_key)
                 return None
+
+            timestamp = res['timestamp']
+            if timestamp < sellby:
+                self._log.debug('Cache: expunging result for %s (%i)', cache_key, timestamp)
+                try:
+                    del self._cache[cache_key]
+                except KeyError:
+                    pass
+                return None
+            self._log.debug('Cache: returning result for %s (%i)', cache_key, timestamp)
+            return res
         else:
             self._log.debug('Cache disabled (self._cache is None)')
             return None
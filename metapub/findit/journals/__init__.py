@@ -30,10 +30,10 @@ from .paywalled import (schattauer_journals, RSC_journals,
                        thieme_journals, weird_paywall_publishers)
 
 # JCI == Journal of Clinical Investigation
-jci_journals = ('J Clin Invest')
+jci_journals = ('J Clin Invest', )
 
 # NAJMS == North Am J Med Sci
-najms_journals = ('N Am J Med Sci')
+najms_journals = ('N Am J Med Sci', )
 
 paywall_journals = schattauer_journals + thieme_journals + \
                    weird_paywall_publishers + RSC_journals
@@ -41,7 +41,7 @@ paywall_journals = schattauer_journals + thieme_journals + \
 # TODO
 # doiserbia (Library of Serbia) articles can be grabbed by doing the_doi_2step,
 # then ...?
-doiserbia_journals = ('Genetika')
+doiserbia_journals = ('Genetika', )
 
 # simple_formats_pmid: links to PDFs that can be constructed using the
 # pubmed ID
@@ -54,7 +54,7 @@ simple_formats_pmid = {
 doi2step_journals = (
     # ex.
     # http://www.palgrave-journals.com/jphp/journal/v36/n2/pdf/jphp201453a.pdf
-    'J Public Health Policy'
+    'J Public Health Policy',
 )
 
 todo_journals = {
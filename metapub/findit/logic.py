@@ -9,24 +9,106 @@ from ..exceptions import MetaPubError
 from .dances import *
 
 
-PUBMED_SWITCHBOARD = {
-    'jstage':   {'journals': jstage_journals, 'dance': the_jstage_dive,     },
-    'springer': {'journals': springer_journals, 'dance': the_springer_shag, },
-    'wiley':    {'journals': wiley_journals, 'dance': the_wiley_shuffle,    },
-    'jama':     {'journals': jama_journals, 'dance': the_jama_dance,        },
-    'aaas':     {'journals': aaas_journals, 'dance': the_aaas_tango,        },
-    'spandidos': {'journals': spandidos_journals, 'dance': the_spandidos_lambada, },
-    'jci':      {'journals': jci_journals, 'dance': the_jci_jig,            },
-    'scielo':   {'journals': scielo_journals, 'dance': the_scielo_chula,    },
-    'najms':    {'journals': najms_journals, 'dance': the_najms_mazurka,    },
-    'biomchemsoc': {'journals': biochemsoc_journals, 'dance': the_biochemsoc_saunter,   },
-    'nature':   {'journals': nature_journals, 'dance': the_nature_ballet,   },
-    'cell':     {'journals': cell_journals, 'dance': the_cell_pogo,         },
-    'lancet':   {'journals': lancet_journals, 'dance': the_lancet_tango,    },
-    'sciencedirect': {'journals': sciencedirect_journals, 'dance': the_sciencedirect_disco, },
-    'karger':   {'journals': karger_journals, 'dance': the_karger_conga,    },
-    'wolterskluwer': {'journals': wolterskluwer_journals, 'dance': the_wolterskluwer_volta, },
-}
+from collections import namedtuple, OrderedDict
+
+# publisher lists. Where a journal is in several, the one listed last is tried first
+# (see resolve_strategies).
+PUBMED_SWITCHBOARD = OrderedDict([
+    ('jstage',   {'journals': jstage_journals, 'dance': the_jstage_dive,     }),
+    ('springer', {'journals': springer_journals, 'dance': the_springer_shag, }),
+    ('wiley',    {'journals': wiley_journals, 'dance': the_wiley_shuffle,    }),
+    ('jama',     {'journals': jama_journals, 'dance': the_jama_dance,        }),
+    ('aaas',     {'journals': aaas_journals, 'dance': the_aaas_tango,        }),
+    ('spandidos', {'journals': spandidos_journals, 'dance': the_spandidos_lambada, }),
+    ('jci',      {'journals': jci_journals, 'dance': the_jci_jig,            }),
+    ('scielo',   {'journals': scielo_journals, 'dance': the_scielo_chula,    }),
+    ('najms',    {'journals': najms_journals, 'dance': the_najms_mazurka,    }),
+    ('biomchemsoc', {'journals': biochemsoc_journals, 'dance': the_biochemsoc_saunter,   }),
+    ('nature',   {'journals': nature_journals, 'dance': the_nature_ballet,   }),
+    ('cell',     {'journals': cell_journals, 'dance': the_cell_pogo,         }),
+    ('lancet',   {'journals': lancet_journals, 'dance': the_lancet_tango,    }),
+    ('sciencedirect', {'journals': sciencedirect_journals, 'dance': the_sciencedirect_disco, }),
+    ('karger',   {'journals': karger_journals, 'dance': the_karger_conga,    }),
+    ('wolterskluwer', {'journals': wolterskluwer_journals, 'dance': the_wolterskluwer_volta, }),
+])
+
+# identifier-based lists, in order of precedence; these are tried before publisher lists.
+IDENTIFIER_SWITCHBOARD = OrderedDict([
+    ('pii',  {'journals': simple_formats_pii, 'dance': the_pii_polka,   }),
+    ('pmid', {'journals': simple_formats_pmid, 'dance': the_pmid_pogo,  }),
+    ('doi',  {'journals': simple_formats_doi, 'dance': the_doi_slide,   }),
+    ('vip',  {'journals': vip_journals, 'dance': the_vip_shake,         }),
+    ('vip_nonstandard', {'journals': vip_journals_nonstandard, 'dance': the_vip_nonstandard_shake, }),
+])
+
+Strategy = namedtuple('Strategy', ['name', 'dance', 'verify'])
+Strategy.__doc__ = '''How FindIt handles a journal: name of the list it's in, the dance
+(None for "todo" and "cantdo" journals), and whether the dance is passed the verify flag.'''
+
+_BMC_STRATEGY = Strategy('bmc', the_biomed_calypso, True)
+
+_STRATEGY_INDEX = None
+
+
+def _build_strategy_index():
+    """ returns dict of {journal: tuple of Strategies} covering every journal in the
+    FindIt lists, in the order FindIt tries them (see resolve_strategies).
+    """
+    index = {}
+
+    def add(journals, strategy):
+        for jrnl in journals:
+            strategies = index.setdefault(jrnl, [])
+            if strategy not in strategies:
+                strategies.append(strategy)
+
+    for name, entry in IDENTIFIER_SWITCHBOARD.items():
+        add(entry['journals'], Strategy(name, entry['dance'], True))
+
+    # a journal in several publisher lists used to be sent to each of them in turn,
+    # the last to succeed winning; trying them in reverse keeps the same winners.
+    for name, entry in reversed(list(PUBMED_SWITCHBOARD.items())):
+        add(entry['journals'], Strategy(name, entry['dance'], False))
+
+    # Many Biomed Central journals start with "BMC" (see also resolve_strategies).
+    add(BMC_journals, _BMC_STRATEGY)
+    for entry in PUBMED_SWITCHBOARD.values():
+        add([jrnl for jrnl in entry['journals'] if jrnl.startswith('BMC')], _BMC_STRATEGY)
+
+    add(todo_journals, Strategy('todo', None, False))
+    add(JOURNAL_CANTDO_LIST, Strategy('cantdo', None, False))
+    return dict((jrnl, tuple(strategies)) for jrnl, strategies in index.items())
+
+
+def resolve_strategies(jrnl):
+    """ returns the Strategies FindIt tries for articles in the given journal, in order:
+    identifier lists (pii, pmid, doi, vip), then publisher lists, then BMC, then the
+    "todo" and "cantdo" markers. FindIt uses the url from the first dance that finds
+    one. Lookups take constant time (the index of all journal lists is built on
+    first use).
+
+    :param jrnl: (str) standardized journal name (see dances.standardize_journal_name)
+    :return: tuple of Strategies (empty if FindIt has no format for the journal)
+    """
+    global _STRATEGY_INDEX
+    if _STRATEGY_INDEX is None:
+        _STRATEGY_INDEX = _build_strategy_index()
+    strategies = _STRATEGY_INDEX.get(jrnl, ())
+    if jrnl.startswith('BMC') and _BMC_STRATEGY not in strategies:
+        # ...but many more don't, hence BMC_journals.
+        strategies = strategies + (_BMC_STRATEGY, )
+    return strategies
+
+
+def resolve_strategy(jrnl):
+    """ returns the Strategy FindIt tries first for articles in the given journal, or
+    None if FindIt has no format for it (see resolve_strategies).
+
+    :param jrnl: (str) standardized journal name (see dances.standardize_journal_name)
+    :return: Strategy or None
+    """
+    strategies = resolve_strategies(jrnl)
+    return strategies[0] if strategies else None
 
 
 """ findit/logic.py
@@ -108,56 +190,29 @@ def find_article_from_pma(pma, verify=True, use_nih=False):
         except MetaPubError as error:
             reason = str(error)
 
-    # === IDENTIFIER-BASED LISTS === #
-
-    if jrnl in simple_formats_pii.keys():
-        try:
-            url = the_pii_polka(pma, verify)
-        except MetaPubError as error:
-            reason = str(error)
-
-    elif jrnl in simple_formats_pmid.keys():
-        try:
-            url = the_pmid_pogo(pma, verify)
-        except MetaPubError as error:
-            reason = str(error)
-
-    elif jrnl in simple_formats_doi.keys():
-        try:
-            url = the_doi_slide(pma, verify)
-        except MetaPubError as error:
-            reason = str(error)
-
-    elif jrnl in vip_journals.keys():
-        try:
-            url = the_vip_shake(pma, verify)
-        except MetaPubError as error:
-            reason = str(error)
-
-    elif jrnl in vip_journals_nonstandard.keys():
-        try:
-            url = the_vip_nonstandard_shake(pma, verify)
-        except MetaPubError as error:
-            reason = str(error)
-
-    if url:
-        return (url, reason)
+    # === JOURNAL LISTS === #
+    #
+    #   Identifier-based lists (pii, pmid, doi, vip) are tried before publisher
+    #   lists; if a dance finds no url, the next one is tried (see resolve_strategies).
 
-    # === PUBLISHER BASED LISTS === #
+    strategies = resolve_strategies(jrnl)
 
-    # Many Biomed Central journals start with "BMC", but many more don't.
-    if jrnl.find('BMC') == 0 or jrnl in BMC_journals:
+    dance_reason = None
+    for strategy in strategies:
+        if strategy.dance is None:
+            continue
         try:
-            url = the_biomed_calypso(pma, verify)
+            if strategy.verify:
+                url = strategy.dance(pma, verify)
+            else:
+                url = strategy.dance(pma)
         except MetaPubError as error:
-            reason = str(error)
-
-    for publisher in list(PUBMED_SWITCHBOARD.keys()):
-        if jrnl in PUBMED_SWITCHBOARD[publisher]['journals']:
-            try:
-                url = PUBMED_SWITCHBOARD[publisher]['dance'](pma)
-            except MetaPubError as error:
-                reason = str(error)
+            if dance_reason is None:
+                dance_reason = str(error)
+        if url:
+            break
+    if dance_reason is not None:
+        reason = dance_reason
 
     if url:
         return (url, reason)
@@ -165,10 +220,11 @@ def find_article_from_pma(pma, verify=True, use_nih=False):
     #if jrnl in paywall_journals:
     #    reason = 'PAYWALL: this journal has been marked in a list as "never free"'
 
-    elif jrnl in todo_journals:
+    names = [strategy.name for strategy in strategies]
+    if 'todo' in names:
         reason = 'TODO: format example: %s' % todo_journals[jrnl]['example']
 
-    elif jrnl in JOURNAL_CANTDO_LIST:
+    elif 'cantdo' in names:
         reason = 'CANTDO: this journal has been marked as unsourceable'
 
     # aka if url is STILL None...
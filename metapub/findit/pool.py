@@ -0,0 +1,239 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+__author__ = 'nthmost'
+
+import logging
+import sys
+import threading
+from collections import namedtuple
+from itertools import islice
+
+import requests
+import six
+from six.moves import queue
+
+from .. import sessions
+from ..config import DEFAULT_CACHE_DIR
+from ..pubmedfetcher import PubMedFetcher
+from .findit import FindIt, usable_cache_result, _get_findit_cache
+
+""" findit/pool.py
+
+    Provides FindItPool, which runs FindIt lookups for many PMIDs at once in a
+    pool of worker threads, yielding a FindItResult for each as soon as it's done:
+
+    pool = FindItPool(workers=8)
+    for result in pool.imap(pmids):
+        print(result.pmid, result.url, result.reason)
+
+    (or, equivalently: for result in FindIt.batch(pmids, workers=8): ...)
+
+    Most of a FindIt lookup is spent waiting on publisher websites, some of
+    which block clients that open too many connections (informa, for one). So
+    besides the number of workers, the pool caps the number of requests its
+    workers have in flight to any one host (max_per_host, plus per-host overrides
+    in host_limits), with a sessions.HostLimiter of its own: other users of
+    metapub.sessions in the process aren't affected.
+
+    PMIDs are checked against the FindIt cache in bulk (PREFETCH_SIZE at a time) as
+    they're read; those with usable cached results are answered straight away, and
+    only the rest are handed to the workers.
+
+    Each result's pmid is the input PMID as a string, stripped of whitespace (so
+    results can be matched up with the input even for e.g. '0123').
+"""
+
+# default number of worker threads.
+DEFAULT_WORKERS = 4
+
+# default maximum number of requests in flight at once to any one host.
+DEFAULT_MAX_PER_HOST = 2
+
+# hosts known to block clients making many connections in a short time.
+HOST_LIMITS = {'informahealthcare.com': 1,
+               'www.tandfonline.com': 1,
+               }
+
+# number of PMIDs looked up in the FindIt cache at once.
+PREFETCH_SIZE = 500
+
+FindItResult = namedtuple('FindItResult', ['pmid', 'doi', 'doi_score', 'url', 'reason', 'journal', 'year'])
+FindItResult.__doc__ = '''Outcome of one FindIt lookup. When the lookup itself failed (e.g. an
+invalid PMID), url is None and reason starts with "ERROR:".'''
+
+_DONE = object()
+
+
+def _normalize_pmid(pmid):
+    return str(pmid).strip()
+
+
+def result_from_cache(pmid, cache_result):
+    """ returns FindItResult for a pmid's FindIt cache entry. """
+    return FindItResult(pmid=str(pmid), doi=cache_result.get('doi'), doi_score=cache_result.get('doi_score'),
+                        url=cache_result['url'], reason=cache_result['reason'] or '',
+                        journal=cache_result.get('journal'), year=cache_result.get('year'))
+
+
+def result_from_source(source):
+    """ returns FindItResult for a FindIt object (without fetching its PubMedArticle if
+    the result came from the cache). """
+    if source._pma is not None:
+        journal, year = source._pma.journal, source._pma.year
+    elif source._cache_result is not None:
+        journal, year = source._cache_result.get('journal'), source._cache_result.get('year')
+    else:
+        journal = year = None
+    return FindItResult(pmid=None if source.pmid is None else str(source.pmid), doi=source.doi,
+                        doi_score=source.doi_score, url=source.url, reason=source.reason,
+                        journal=journal, year=year)
+
+
+class FindItPool(object):
+    """ FindItPool: concurrent FindIt lookups with per-host concurrency limits.
+
+    :param workers: (int) number of worker threads (default: DEFAULT_WORKERS)
+    :param max_per_host: (int) maximum requests in flight to any one host
+                         (default: DEFAULT_MAX_PER_HOST; None for no limit)
+    :param host_limits: (dict) {hostname: max requests in flight}, in addition to
+                        (and overriding) HOST_LIMITS
+    :param fetcher: (optional) PubMedFetcher shared by all lookups
+    Other keyword arguments (verify, use_nih, use_crossref, cachedir, retry_errors...)
+    are passed through to FindIt.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_per_host=DEFAULT_MAX_PER_HOST, host_limits=None,
+                 fetcher=None, **kwargs):
+        self.workers = workers
+        self.fetcher = fetcher or PubMedFetcher()
+        self.findit_kwargs = kwargs
+        self._log = logging.getLogger('metapub.FindItPool')
+
+        limits = dict(HOST_LIMITS)
+        limits.update(host_limits or {})
+        self.limiter = sessions.HostLimiter(max_per_host, limits)
+
+        # open the shared cache here rather than racing to do so in the workers.
+        cachedir = kwargs.get('cachedir', DEFAULT_CACHE_DIR)
+        self._cache = None if cachedir is None else _get_findit_cache(cachedir)
+
+    def lookup(self, pmid):
+        """ runs FindIt for one pmid (in the calling thread).
+
+        :return: FindItResult
+        """
+        pmid = _normalize_pmid(pmid)
+        try:
+            source = FindIt(pmid, fetcher=self.fetcher, **self.findit_kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            return FindItResult(pmid, None, None, None, 'TXERROR: %r' % error, None, None)
+        except Exception as error:
+            self._log.debug('FindIt failed for %s: %r', pmid, error)
+            return FindItResult(pmid, None, None, None, 'ERROR: %r' % error, None, None)
+        return result_from_source(source)._replace(pmid=pmid)
+
+    def _cached_results(self, pmids):
+        """ returns {pmid: FindItResult} for those of pmids (normalized strings) with
+        usable cached results. """
+        if self._cache is None:
+            return {}
+        pmids = [pmid for pmid in pmids if pmid.isdigit()]
+        found = self._cache.get_many(set(int(pmid) for pmid in pmids))
+        verify = self.findit_kwargs.get('verify', True)
+        retry_errors = self.findit_kwargs.get('retry_errors', False)
+        expiry_date = self.findit_kwargs.get('expiry_date', None)
+        results = {}
+        for pmid in pmids:
+            cache_result = found.get(int(pmid))
+            if usable_cache_result(cache_result, verify=verify, retry_errors=retry_errors, expiry_date=expiry_date):
+                results[pmid] = result_from_cache(pmid, cache_result)
+        return results
+
+    def imap(self, pmids):
+        """ looks up every pmid concurrently, yielding FindItResults in order of
+        completion (not input order). pmids may be any iterable, e.g. a generator
+        reading a file; it's consumed as the workers need more.
+
+        An exception raised reading pmids (or the cache) is raised here, after the
+        results of the PMIDs read before it.
+
+        :param pmids: iterable of PMIDs
+        :return: generator of FindItResult
+        """
+        todo = queue.Queue(maxsize=self.workers * 2)
+        # bounded, so that cached results read ahead by feed() wait for the consumer
+        # rather than piling up.
+        done = queue.Queue(maxsize=self.workers * 2 + PREFETCH_SIZE)
+        stop = threading.Event()
+        # exc_info of an exception raised in feed(), re-raised in the consumer.
+        feed_error = []
+
+        def deliver(item):
+            # gives up once the consumer has gone away, so no thread is left blocked.
+            while not stop.is_set():
+                try:
+                    done.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def feed():
+            try:
+                it = iter(pmids)
+                while not stop.is_set() and not feed_error:
+                    chunk = []
+                    try:
+                        for pmid in islice(it, PREFETCH_SIZE):
+                            chunk.append(_normalize_pmid(pmid))
+                    except Exception:
+                        # hand out the PMIDs read so far, then stop.
+                        feed_error.append(sys.exc_info())
+                    if not chunk:
+                        break
+                    cached = self._cached_results(chunk)
+                    for pmid in chunk:
+                        if stop.is_set():
+                            break
+                        if pmid in cached:
+                            deliver(cached[pmid])
+                        else:
+                            todo.put(pmid)
+            except Exception:
+                feed_error.append(sys.exc_info())
+            finally:
+                for _ in range(self.workers):
+                    todo.put(_DONE)
+
+        def work():
+            sessions.use_limiter(self.limiter)
+            while True:
+                pmid = todo.get()
+                if pmid is _DONE:
+                    deliver(_DONE)
+                    return
+                if not stop.is_set():
+                    deliver(self.lookup(pmid))
+
+        threads = [threading.Thread(target=feed)] + [threading.Thread(target=work) for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        running = self.workers
+        try:
+            while running:
+                result = done.get()
+                if result is _DONE:
+                    running -= 1
+                else:
+                    yield result
+            if feed_error:
+                six.reraise(*feed_error[0])
+        finally:
+            # consumer went away early: let the threads drain the queue and exit.
+            stop.set()
+
+    def map(self, pmids):
+        """ returns list of FindItResults for a list of pmids, in input order. """
+        results = dict((result.pmid, result) for result in self.imap(pmids))
+        return [results[_normalize_pmid(pmid)] for pmid in pmids]
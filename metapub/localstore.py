@@ -0,0 +1,346 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.localstore -- a local, indexed copy of PubMed built from MEDLINE files
+
+LocalPubMedStore keeps the XML of every article (compressed) in an SQLite file
+keyed by PMID, with indexes on DOI, PMCID and journal/year/volume/first page, so
+that PubMedFetcher(method='local') can answer lookups without contacting NCBI.
+A journal can be given by its ISO abbreviation, its MEDLINE abbreviation or its
+full title (see the journal_aliases table):
+
+    from metapub.localstore import LocalPubMedStore
+
+    store = LocalPubMedStore('/data/pubmed-local.db')
+    store.load_files(sorted(glob.glob('/data/pubmed/baseline/*.xml.gz')))
+
+    fetch = PubMedFetcher('local', local_store='/data/pubmed-local.db')
+    article = fetch.article_by_doi('10.1016/0006-291x(75)90507-0')
+
+Baseline and update files can be downloaded from https://ftp.ncbi.nlm.nih.gov/pubmed/
+
+The store records every file it has loaded, so keeping it current is a matter of
+applying NCBI's daily update files in order (see also sbin/sync_local_pubmed.py):
+
+    store.sync('/data/pubmed/updatefiles', download=True)
+
+Each file is applied in one transaction (changed articles replaced, articles in
+DeleteCitation blocks removed) together with its entry in the applied_files
+table, so an interrupted sync can simply be run again.
+'''
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+from .medline import iter_medline_elements, record_from_element, article_xml, deleted_pmids_from_element, DELETE_TAG
+from .pubmedarticle import PubMedArticle
+from .exceptions import MetaPubError
+from . import ratelimit
+
+log = logging.getLogger('metapub.localstore')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS articles (
+        pmid INTEGER PRIMARY KEY,
+        doi TEXT,
+        pmcid TEXT,
+        journal TEXT,
+        year TEXT,
+        volume TEXT,
+        first_page TEXT,
+        author1_last TEXT,
+        xml BLOB NOT NULL)''',
+    'CREATE INDEX IF NOT EXISTS articles_doi ON articles (doi)',
+    'CREATE INDEX IF NOT EXISTS articles_pmcid ON articles (pmcid)',
+    'CREATE INDEX IF NOT EXISTS articles_citation ON articles (journal, year, volume, first_page)',
+    # normalized names (ISOAbbreviation, MedlineTA, Title) of each articles.journal.
+    '''CREATE TABLE IF NOT EXISTS journal_aliases (
+        alias TEXT NOT NULL,
+        journal TEXT NOT NULL,
+        PRIMARY KEY (alias, journal))''',
+    '''CREATE TABLE IF NOT EXISTS applied_files (
+        filename TEXT PRIMARY KEY,
+        applied INTEGER DEFAULT (strftime('%s', 'now')),
+        upserted INTEGER,
+        deleted INTEGER)''',
+]
+
+UPDATEFILES_URL = 'https://ftp.ncbi.nlm.nih.gov/pubmed/updatefiles/'
+
+re_medline_filename = re.compile(r'pubmed\d+n\d+\.xml(?:\.gz)?$')
+re_medline_href = re.compile(r'href="(pubmed\d+n\d+\.xml\.gz)"')
+
+# number of articles written per transaction when loading files.
+LOAD_BATCH_SIZE = 5000
+
+re_journal_junk = re.compile(r'[^\w\s]', re.UNICODE)
+re_whitespace = re.compile(r'\s+', re.UNICODE)
+
+
+def normalize_journal(journal):
+    """ returns journal title or abbreviation in the form used by the citation index:
+    lowercased, without punctuation, e.g. 'Biochem. Biophys. Res. Commun.' and
+    'Biochem Biophys Res Commun' both become 'biochem biophys res commun'.
+    """
+    if not journal:
+        return None
+    return re_whitespace.sub(' ', re_journal_junk.sub(' ', journal.lower())).strip()
+
+
+def normalize_doi(doi):
+    return None if not doi else doi.strip().lower()
+
+
+def normalize_pmcid(pmcid):
+    """ returns PMCID as 'PMC' + number; accepts bare numbers and any case of prefix. """
+    if not pmcid:
+        return None
+    pmcid = str(pmcid).strip().upper()
+    return pmcid if pmcid.startswith('PMC') else 'PMC' + pmcid
+
+
+class LocalPubMedStore(object):
+    """ SQLite store of PubMed article XML keyed by PMID.
+
+    :param path: path to SQLite file (created if it doesn't exist)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        self._con.execute('PRAGMA journal_mode=WAL')
+        with self._con:
+            for statement in SCHEMA:
+                self._con.execute(statement)
+
+    def close(self):
+        self._con.close()
+
+    def __len__(self):
+        return self._fetchone('SELECT COUNT(*) FROM articles')[0]
+
+    def __contains__(self, pmid):
+        return self._fetchone('SELECT 1 FROM articles WHERE pmid = ?', (int(pmid), )) is not None
+
+    ## Reading
+
+    def get_xml(self, pmid):
+        """ returns article XML (bytes) for pmid, or None if not in the store. """
+        row = self._fetchone('SELECT xml FROM articles WHERE pmid = ?', (int(pmid), ))
+        return None if row is None else zlib.decompress(row[0])
+
+    def get_article(self, pmid, lazy=False):
+        """ returns PubMedArticle for pmid, or None if not in the store. """
+        xml = self.get_xml(pmid)
+        return None if xml is None else PubMedArticle(xml, lazy=lazy)
+
+    def pmid_for_doi(self, doi):
+        row = self._fetchone('SELECT pmid FROM articles WHERE doi = ?', (normalize_doi(doi), ))
+        return None if row is None else str(row[0])
+
+    def pmid_for_pmcid(self, pmcid):
+        row = self._fetchone('SELECT pmid FROM articles WHERE pmcid = ?', (normalize_pmcid(pmcid), ))
+        return None if row is None else str(row[0])
+
+    def pmids_for_citation(self, journal=None, year=None, volume=None, first_page=None, author=None):
+        """ returns list of PMIDs (strings) matching all of the supplied citation details.
+        Journal matching ignores case and punctuation; the journal may be given by its
+        ISO abbreviation, MEDLINE abbreviation or full title.
+
+        The author string (e.g. 'Wiesmann UN' or 'Wiesmann UN, Herschkowitz NN') is only
+        used to choose between several matching articles: those whose first author's
+        last name appears in it are kept, if there are any.
+
+        At least one of journal, year, volume and first_page is required (returns []
+        otherwise).
+        """
+        clauses = []
+        params = []
+        journal = normalize_journal(journal)
+        if journal:
+            clauses.append('(journal = ? OR journal IN (SELECT journal FROM journal_aliases WHERE alias = ?))')
+            params.extend([journal, journal])
+        for column, value in (('year', year), ('volume', volume), ('first_page', first_page)):
+            if value:
+                clauses.append('%s = ?' % column)
+                params.append(str(value))
+        if not clauses:
+            return []
+
+        with self._lock:
+            rows = self._con.execute('SELECT pmid, author1_last FROM articles WHERE ' + ' AND '.join(clauses),
+                                     params).fetchall()
+        if len(rows) > 1 and author:
+            words = set(re_whitespace.split(re_journal_junk.sub(' ', author.lower())))
+            by_author = [row for row in rows if row[1] in words]
+            if by_author:
+                rows = by_author
+        return [str(row[0]) for row in rows]
+
+    def applied_files(self):
+        """ returns list of names of the files loaded into the store, in the order applied. """
+        with self._lock:
+            rows = self._con.execute('SELECT filename FROM applied_files ORDER BY applied, rowid').fetchall()
+        return [row[0] for row in rows]
+
+    def is_applied(self, path):
+        """ returns True if a file with this name (directory ignored) was already loaded. """
+        return self._fetchone('SELECT 1 FROM applied_files WHERE filename = ?',
+                              (os.path.basename(path), )) is not None
+
+    ## Writing
+
+    def load_files(self, paths, skip_applied=True):
+        """ applies the given baseline / update files, in the order given.
+
+        :param paths: list of paths to (gzipped) PubmedArticleSet files
+        :param skip_applied: (bool) skip files already loaded (default: True)
+        :return: number of articles written
+        """
+        count = 0
+        for path in paths:
+            if skip_applied and self.is_applied(path):
+                log.debug('Skipping %s (already applied)', path)
+                continue
+            count += self.load_file(path)
+        return count
+
+    def load_file(self, path):
+        """ applies a baseline / update file in a single transaction: every article in
+        it is added (or replaces the stored version), every PMID in its DeleteCitation
+        blocks is removed, and the file is recorded as applied.
+
+        :return: number of articles written
+        """
+        upserted = deleted = 0
+        batch = []
+        aliases = set()
+        with self._lock, self._con:
+            for tag, elem in iter_medline_elements(path):
+                if tag == DELETE_TAG:
+                    # keep document order: an article may be deleted after being revised.
+                    upserted += self._upsert(batch)
+                    batch = []
+                    pmids = [(int(pmid), ) for pmid in deleted_pmids_from_element(elem)]
+                    self._con.executemany('DELETE FROM articles WHERE pmid = ?', pmids)
+                    deleted += len(pmids)
+                    continue
+                row = _row_from_element(elem)
+                batch.append(row)
+                aliases.update(_journal_aliases(elem, row[3]))
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    upserted += self._upsert(batch)
+                    batch = []
+            upserted += self._upsert(batch)
+            self._con.executemany('INSERT OR IGNORE INTO journal_aliases VALUES (?, ?)', aliases)
+            self._con.execute('INSERT OR REPLACE INTO applied_files (filename, upserted, deleted) VALUES (?, ?, ?)',
+                              (os.path.basename(path), upserted, deleted))
+        log.info('Applied %s: %i articles written, %i deleted', path, upserted, deleted)
+        return upserted
+
+    def sync(self, update_dir, download=False, url=UPDATEFILES_URL):
+        """ brings the store up to date by applying, in filename order, every update file
+        in update_dir that hasn't been applied yet.
+
+        :param update_dir: directory holding pubmed*.xml.gz update files
+        :param download: (bool) first download update files not yet in update_dir
+                         (and not yet applied) from NCBI (default: False)
+        :param url: update files directory to download from
+        :return: list of names of the files applied
+        """
+        if download:
+            download_updatefiles(update_dir, url=url, skip=self.applied_files())
+        paths = [os.path.join(update_dir, name) for name in sorted(os.listdir(update_dir))
+                 if re_medline_filename.match(name) and not self.is_applied(name)]
+        for path in paths:
+            self.load_file(path)
+        return [os.path.basename(path) for path in paths]
+
+    def _upsert(self, rows):
+        """ writes rows; caller holds the lock and the transaction. """
+        if rows:
+            self._con.executemany('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def _fetchone(self, query, params=()):
+        with self._lock:
+            return self._con.execute(query, params).fetchone()
+
+
+def _row_from_element(elem):
+    rec = record_from_element(elem)
+    author1_last = elem.findtext('MedlineCitation/Article/AuthorList/Author/LastName')
+    return (int(rec.pmid),
+            normalize_doi(rec.doi),
+            normalize_pmcid(rec.pmc),
+            normalize_journal(rec.journal),
+            rec.year,
+            rec.volume,
+            rec.first_page,
+            author1_last.lower() if author1_last else None,
+            sqlite3.Binary(zlib.compress(article_xml(elem))))
+
+
+def _journal_aliases(elem, journal):
+    """ returns set of (alias, journal) for the normalized names of an article's journal. """
+    if journal is None:
+        return set()
+    names = (elem.findtext('MedlineCitation/Article/Journal/ISOAbbreviation'),
+             elem.findtext('MedlineCitation/Article/Journal/Title'),
+             elem.findtext('MedlineCitation/MedlineJournalInfo/MedlineTA'))
+    return set((normalize_journal(name), journal) for name in names if normalize_journal(name))
+
+
+def list_updatefiles(url=UPDATEFILES_URL):
+    """ returns sorted list of update file names available at url. """
+    response = ratelimit.get(url)
+    response.raise_for_status()
+    return sorted(set(re_medline_href.findall(response.text)))
+
+
+def download_updatefiles(update_dir, url=UPDATEFILES_URL, skip=()):
+    """ downloads update files from url not yet present in update_dir, checking each
+    against its published md5 sum.
+
+    :param update_dir: destination directory (created if needed)
+    :param url: update files directory listing
+    :param skip: names of files not to download (e.g. those already applied)
+    :return: list of paths downloaded
+    """
+    if not os.path.isdir(update_dir):
+        os.makedirs(update_dir)
+    skip = set(skip)
+    downloaded = []
+    for name in list_updatefiles(url):
+        path = os.path.join(update_dir, name)
+        if name in skip or os.path.exists(path):
+            continue
+        _download(url + name, path)
+        downloaded.append(path)
+    return downloaded
+
+
+def _download(url, path):
+    response = ratelimit.get(url + '.md5')
+    response.raise_for_status()
+    expected = response.text.strip().split()[-1].lower()
+
+    log.info('Downloading %s', url)
+    md5 = hashlib.md5()
+    tmppath = path + '.part'
+    response = ratelimit.get(url, stream=True)
+    response.raise_for_status()
+    with open(tmppath, 'wb') as fh:
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            md5.update(chunk)
+            fh.write(chunk)
+    if md5.hexdigest() != expected:
+        os.remove(tmppath)
+        raise MetaPubError('md5 mismatch for %s (expected %s, got %s)' % (url, expected, md5.hexdigest()))
+    # only complete files get their final name, so an interrupted download is redone.
+    os.rename(tmppath, path)
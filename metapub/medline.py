@@ -0,0 +1,265 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.medline -- stream articles out of PubMed/MEDLINE baseline and update files
+
+NCBI publishes all of PubMed as gzipped PubmedArticleSet files (the annual
+baseline plus daily update files):
+
+    https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/
+    https://ftp.ncbi.nlm.nih.gov/pubmed/updatefiles/
+
+The functions here read these files with lxml's iterparse, clearing each element
+once it has been handled, so memory use stays constant no matter how large the
+file is. Articles come out as PubMedArticle objects or, much faster, as
+MedlineRecord tuples holding just the citation fields:
+
+    from metapub.medline import iter_medline_file
+
+    for pma in iter_medline_file('pubmed24n0001.xml.gz'):
+        print(pma.pmid, pma.title)
+
+    for rec in iter_medline_file('pubmed24n0001.xml.gz', records=True):
+        print(rec.pmid, rec.doi, rec.journal, rec.year)
+
+Many files can be parsed in parallel (one file per worker process):
+
+    for rec in iter_medline_files(glob.glob('baseline/*.xml.gz'), records=True, processes=8):
+        ...
+
+    # or, to do the per-article work in the workers too:
+    for result in map_medline_files(my_function, paths, processes=8):
+        ...
+
+A single file can also be spread over several cores: its articles are then
+parsed by a parsepool.ParsePool and come out as PubMedRecords:
+
+    for record in iter_medline_file('pubmed24n0001.xml.gz', processes=8):
+        ...
+'''
+
+import gzip
+import logging
+import multiprocessing
+from collections import deque, namedtuple
+
+from lxml import etree
+
+from .pubmedarticle import PubMedArticle
+from .parsepool import parse_records
+from .exceptions import MetaPubError
+
+log = logging.getLogger('metapub.medline')
+
+ARTICLE_TAGS = ('PubmedArticle', 'PubmedBookArticle')
+DELETE_TAG = 'DeleteCitation'
+
+MedlineRecord = namedtuple('MedlineRecord', ['pmid', 'pubmed_type', 'doi', 'pmc', 'pii', 'journal',
+                                             'year', 'volume', 'issue', 'first_page', 'title'])
+MedlineRecord.__doc__ = '''Citation fields of one article, named as the corresponding
+PubMedArticle attributes (all strings or None).'''
+
+
+def _open(path_or_file):
+    if hasattr(path_or_file, 'read'):
+        return path_or_file
+    if path_or_file.endswith('.gz'):
+        return gzip.open(path_or_file, 'rb')
+    return open(path_or_file, 'rb')
+
+
+def iter_medline_elements(path_or_file):
+    """ Yields (tag, element) for each PubmedArticle, PubmedBookArticle and
+    DeleteCitation element of a PubmedArticleSet file (gzipped if the filename
+    ends in .gz), in document order.
+
+    Each element is cleared (and detached from the tree) as soon as the next one
+    is requested, so use it -- or copy what you need from it -- before moving on.
+
+    :param path_or_file: path to file, or a file object opened in binary mode
+    :return: generator of (tag, element) tuples
+    """
+    fh = _open(path_or_file)
+    try:
+        for event, elem in etree.iterparse(fh, events=('end', ), tag=ARTICLE_TAGS + (DELETE_TAG, ),
+                                           huge_tree=True):
+            yield elem.tag, elem
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+    finally:
+        if fh is not path_or_file:
+            fh.close()
+
+
+def article_xml(elem):
+    """ returns xml (bytes) for a PubmedArticle or PubmedBookArticle element, wrapped
+    in a PubmedArticleSet as expected by PubMedArticle.
+    """
+    return b'<PubmedArticleSet>' + etree.tostring(elem, with_tail=False) + b'</PubmedArticleSet>'
+
+
+def record_from_element(elem):
+    """ returns a MedlineRecord for a PubmedArticle or PubmedBookArticle element,
+    using the same rules as the corresponding PubMedArticle attributes.
+    """
+    if elem.tag == 'PubmedBookArticle':
+        return MedlineRecord(pmid=_text(elem, 'BookDocument/PMID'), pubmed_type='book',
+                             doi=None, pmc=None, pii=None,
+                             journal=_text(elem, 'BookDocument/Book/BookTitle'),
+                             year=_text(elem, 'BookDocument/ContributionDate/Year'),
+                             volume=None, issue=None, first_page=None,
+                             title=_text(elem, 'BookDocument/ArticleTitle'))
+
+    article = elem.find('MedlineCitation/Article')
+    if article is None:
+        article = etree.Element('Article')
+
+    journal = _text(article, 'Journal/ISOAbbreviation') or _text(article, 'Journal/Title')
+    year = _text(article, 'Journal/JournalIssue/PubDate/Year')
+    if year is None:
+        medline_date = _text(article, 'Journal/JournalIssue/PubDate/MedlineDate')
+        year = None if medline_date is None else medline_date[0:4]
+    pages = _text(article, 'Pagination/MedlinePgn')
+
+    ids = {}
+    for item in elem.iterfind('PubmedData/ArticleIdList/ArticleId'):
+        ids.setdefault(item.get('IdType'), item.text)
+    pmc = ids.get('pmc')
+
+    return MedlineRecord(pmid=_text(elem, 'MedlineCitation/PMID'), pubmed_type='article',
+                         doi=ids.get('doi'), pmc=None if pmc is None else pmc[3:], pii=ids.get('pii'),
+                         journal=journal, year=year,
+                         volume=_text(article, 'Journal/JournalIssue/Volume'),
+                         issue=_text(article, 'Journal/JournalIssue/Issue'),
+                         first_page=None if pages is None else pages.split('-')[0],
+                         title=_text(article, 'ArticleTitle'))
+
+
+def deleted_pmids_from_element(elem):
+    """ returns list of PMIDs (strings) listed in a DeleteCitation element. """
+    return [pmid.text.strip() for pmid in elem.iterfind('PMID')]
+
+
+def iter_medline_file(path_or_file, records=False, lazy=False, processes=None):
+    """ Yields every article in a PubMed baseline or update file, in constant memory.
+
+    (DeleteCitation entries in update files are skipped; see iter_medline_elements.)
+
+    With `processes` (a number of worker processes, or a parsepool.ParsePool), the
+    file is read here and its articles parsed by the workers, which send back
+    PubMedRecords (records and lazy are then ignored).
+
+    :param path_or_file: path to file (gzipped if name ends in .gz) or binary file object
+    :param records: (bool) yield MedlineRecord tuples instead of PubMedArticle objects
+    :param lazy: (bool) create PubMedArticle objects with lazy=True (see PubMedArticle)
+    :param processes: (int or ParsePool) parse articles in worker processes
+    :return: generator of PubMedArticle objects (or of MedlineRecords, or PubMedRecords)
+    """
+    if processes:
+        xmls = (article_xml(elem) for tag, elem in iter_medline_elements(path_or_file) if tag != DELETE_TAG)
+        for record in parse_records(xmls, processes):
+            yield record
+        return
+
+    for tag, elem in iter_medline_elements(path_or_file):
+        if tag == DELETE_TAG:
+            continue
+        if records:
+            yield record_from_element(elem)
+        else:
+            yield PubMedArticle(article_xml(elem), lazy=lazy)
+
+
+def _records_for_file(path):
+    return list(iter_medline_file(path, records=True))
+
+
+class _MapWorker(object):
+    """ picklable callable applying func to every article of a file (in a worker process). """
+
+    def __init__(self, func, lazy):
+        self.func = func
+        self.lazy = lazy
+
+    def __call__(self, path):
+        return [self.func(pma) for pma in iter_medline_file(path, lazy=self.lazy)]
+
+
+def iter_medline_files(paths, records=False, lazy=False, processes=None):
+    """ Yields every article in each of the given files, file by file, in order.
+
+    With processes > 1, files are parsed in parallel by a multiprocessing Pool;
+    since PubMedArticle objects can't be passed between processes, this requires
+    records=True (or see map_medline_files).
+
+    :param paths: list of paths
+    :param records: (bool) yield MedlineRecord tuples instead of PubMedArticle objects
+    :param lazy: (bool) create PubMedArticle objects with lazy=True
+    :param processes: (int) number of worker processes (default: parse in this process)
+    :return: generator of PubMedArticle objects (or of MedlineRecords)
+    """
+    if not processes or processes == 1:
+        for path in paths:
+            log.debug('Parsing %s', path)
+            for item in iter_medline_file(path, records=records, lazy=lazy):
+                yield item
+        return
+
+    if not records:
+        raise MetaPubError('iter_medline_files with processes > 1 requires records=True; '
+                           'use map_medline_files to process PubMedArticle objects in parallel, '
+                           'or iter_medline_file(path, processes=...) for PubMedRecords.')
+
+    for result in _imap(_records_for_file, paths, processes):
+        for record in result:
+            yield record
+
+
+def map_medline_files(func, paths, processes=None, lazy=True):
+    """ Applies func to every PubMedArticle in the given files, in worker processes
+    (one file at a time per worker), and yields the results in file order.
+
+    func must be picklable (e.g. a module-level function) and return something
+    picklable. Results for a whole file are returned by its worker at once, so keep
+    them small (e.g. a tuple of the attributes you need rather than the article).
+    Files are handed to the workers as results are consumed (at most two per process
+    at a time), so memory use doesn't grow with the number of files.
+
+    :param func: callable taking a PubMedArticle
+    :param paths: list of paths
+    :param processes: (int) number of worker processes (default: number of CPUs)
+    :param lazy: (bool) create PubMedArticle objects with lazy=True (default: True)
+    :return: generator of func's return values
+    """
+    for result in _imap(_MapWorker(func, lazy), paths, processes):
+        for item in result:
+            yield item
+
+
+def _imap(func, paths, processes):
+    """ yields func(path) for each of paths, in order, computed by a pool of worker
+    processes. At most two files per process are in flight at once, so that results
+    of whole files don't pile up when the consumer is slower than the workers (as
+    with ParsePool.imap).
+    """
+    pool = multiprocessing.Pool(processes)
+    max_pending = (processes or multiprocessing.cpu_count()) * 2
+    pending = deque()
+    try:
+        for path in paths:
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(func, (path, )))
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _text(elem, path):
+    found = elem.find(path)
+    return None if found is None else found.text
@@ -0,0 +1,150 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.parsepool -- parse article XML in worker processes
+
+Parsing a PubMedArticle is CPU-bound, so when articles arrive faster than one
+core can parse them (batched efetches, the local store, MEDLINE files) the parse
+can be moved to a pool of worker processes. Workers receive the raw XML (bytes)
+of each article and send back a PubMedRecord (see metapub.pubmedrecord), which
+is small and cheap to pickle:
+
+    from metapub.parsepool import ParsePool
+
+    with ParsePool(processes=32) as pool:
+        for record in pool.imap(xml_for_each_article):
+            print(record.pmid, record.journal)
+
+The fetcher's batch methods take the pool (or just a number of processes) and
+then yield PubMedRecords instead of PubMedArticles:
+
+    for record in fetch.articles_by_pmids(pmids, processes=pool):
+        ...
+
+Results come back in input order. At most max_pending chunks of `chunksize`
+articles are in flight at once: the input iterator is only read as results are
+consumed, so memory stays flat however many articles are fed through.
+'''
+
+import multiprocessing
+from collections import deque
+
+from .pubmedarticle import PubMedArticle
+from .exceptions import BaseXMLError, XMLSyntaxError
+
+# number of articles sent to a worker per task.
+DEFAULT_CHUNKSIZE = 20
+
+
+def parse_record(xml, drop=()):
+    """ returns PubMedRecord for the article xml (bytes or str).
+
+    Raises BaseXMLError if xml is not well-formed (lxml's XMLSyntaxError can't be
+    sent back from a worker process).
+    """
+    try:
+        return PubMedArticle(xml, retain_xml=False).to_record(drop=drop)
+    except XMLSyntaxError as error:
+        raise BaseXMLError('Could not parse article xml: %s' % error)
+
+
+class _ParseWorker(object):
+    """ picklable callable parsing a chunk of article xml (in a worker process). """
+
+    def __init__(self, drop):
+        self.drop = tuple(drop)
+
+    def __call__(self, chunk):
+        return [parse_record(xml, self.drop) for xml in chunk]
+
+
+class ParsePool(object):
+    """ A multiprocessing Pool turning article XML into PubMedRecords, with a
+    bounded number of chunks in flight.
+
+    With processes=1 no worker processes are started; articles are parsed in the
+    calling process (handy for debugging, or as a drop-in default).
+
+    :param processes: (int) number of worker processes (default: number of CPUs)
+    :param chunksize: (int) number of articles per task (default: DEFAULT_CHUNKSIZE)
+    :param max_pending: (int) maximum number of tasks in flight (default: 4 per process)
+    :param drop: names of PubMedRecord fields not to keep, e.g. ('abstract', )
+    """
+
+    def __init__(self, processes=None, chunksize=DEFAULT_CHUNKSIZE, max_pending=None, drop=()):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.max_pending = max_pending or self.processes * 4
+        self._worker = _ParseWorker(drop)
+        self._pool = None if self.processes == 1 else multiprocessing.Pool(self.processes)
+
+    def imap(self, xmls):
+        """ Yields a PubMedRecord for each article xml in xmls, in order. xmls may be
+        any iterable (e.g. a generator); it is read no further ahead than needed
+        to keep max_pending chunks in flight.
+
+        An exception raised parsing an article is raised here, when its chunk is
+        reached.
+
+        :param xmls: iterable of article xml (bytes)
+        :return: generator of PubMedRecords
+        """
+        if self._pool is None:
+            for xml in xmls:
+                yield parse_record(xml, self._worker.drop)
+            return
+
+        pending = deque()
+        for chunk in _chunks(xmls, self.chunksize):
+            if len(pending) >= self.max_pending:
+                for record in pending.popleft().get():
+                    yield record
+            pending.append(self._pool.apply_async(self._worker, (chunk, )))
+        while pending:
+            for record in pending.popleft().get():
+                yield record
+
+    def close(self):
+        """ stops the worker processes (the pool can't be used afterwards). """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_records(xmls, processes=None):
+    """ Yields PubMedRecords for an iterable of article xml using `processes`, which
+    is either a ParsePool (left open) or a number of processes for a ParsePool made
+    (and closed) for this call.
+
+    :param xmls: iterable of article xml (bytes)
+    :param processes: ParsePool or int
+    :return: generator of PubMedRecords
+    """
+    if isinstance(processes, ParsePool):
+        for record in processes.imap(xmls):
+            yield record
+        return
+
+    pool = ParsePool(processes)
+    try:
+        for record in pool.imap(xmls):
+            yield record
+    finally:
+        pool.close()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -7,11 +7,72 @@ from datetime import datetime
 from collections import OrderedDict
 
 import six
+from lxml import etree
 
-from .base import MetaPubObject
+from .base import MetaPubObject, first_children
 from .exceptions import MetaPubError
 from .text_mining import re_numbers
 from .pubmedauthor import PubMedAuthor
+from .pubmedrecord import PubMedRecord
+
+# Paths (relative to the PubmedArticle or PubmedBookArticle element) of the elements
+# read by PubMedArticle's _get_* methods. {root} is the citation element of articles
+# ('MedlineCitation', or '.' for bare MEDLINE citations). They are compiled once, for
+# each root, into etree.XPath objects (see _XPATHS), which are several times faster
+# to evaluate than the same path given to find() or findall().
+_PATHS = {
+    # article
+    'pmid': '{root}/PMID',
+    'title': '{root}/Article/ArticleTitle',
+    'abstract': '{root}/Article/Abstract/AbstractText',
+    'authors': '{root}/Article/AuthorList/Author',
+    'journal_abbreviation': '{root}/Article/Journal/ISOAbbreviation',
+    'journal_title': '{root}/Article/Journal/Title',
+    'issn': '{root}/Article/Journal/ISSN',
+    'journal_issue': '{root}/Article/Journal/JournalIssue',
+    'volume': '{root}/Article/Journal/JournalIssue/Volume',
+    'issue': '{root}/Article/Journal/JournalIssue/Issue',
+    'year': '{root}/Article/Journal/JournalIssue/PubDate/Year',
+    'medline_date': '{root}/Article/Journal/JournalIssue/PubDate/MedlineDate',
+    'pages': '{root}/Article/Pagination/MedlinePgn',
+    'doi': 'PubmedData/ArticleIdList/ArticleId[@IdType="doi"]',
+    'pii': 'PubmedData/ArticleIdList/ArticleId[@IdType="pii"]',
+    'pmc': 'PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]',
+    'history': 'PubmedData/History',
+    'mesh_headings': 'MedlineCitation/MeshHeadingList/MeshHeading',
+    'chemicals': 'MedlineCitation/ChemicalList/Chemical',
+    'publication_types': 'MedlineCitation/Article/PublicationTypeList/PublicationType',
+    'grants': 'MedlineCitation/GrantList',
+    # book
+    'book_article_ids': 'BookDocument/ArticleIdList/ArticleId',
+    'book_title': 'BookDocument/Book/BookTitle',
+    'book_article_title': 'BookDocument/ArticleTitle',
+    'book_authors': 'BookDocument/AuthorList/Author',
+    'book_editors': 'BookDocument/Book/AuthorList/Author',
+    'book_publisher': 'BookDocument/Book/Publisher/PublisherName',
+    'book_publisher_location': 'BookDocument/Book/Publisher/PublisherLocation',
+    'book_language': 'BookDocument/Language',
+    'book_abstracts': 'BookDocument/Abstract/AbstractText',
+    'book_copyright': 'BookDocument/Abstract/CopyrightInformation',
+    'book_sections': 'BookDocument/Sections/Section',
+    'book_medium': 'BookDocument/Book/Medium',
+    'book_contribution_date': 'BookDocument/ContributionDate',
+    'book_date_revised': 'BookDocument/DateRevised',
+    'book_item_list': 'BookDocument/ItemList',
+    'book_items': 'BookDocument/ItemList/Item',
+    'book_history': 'PubmedBookData/History/PubMedPubDate',
+    'book_publication_status': 'PubmedBookData/PublicationStatus',
+}
+
+_XPATHS = dict((root, dict((name, etree.XPath(path.replace('{root}', root))) for name, path in _PATHS.items()))
+               for root in ('MedlineCitation', 'BookDocument', '.'))
+
+# child elements read from (small) elements in one pass, with first_children().
+_DATE_TAGS = frozenset(['Year', 'Month', 'Day'])
+_VOLUME_ISSUE_TAGS = frozenset(['Volume', 'Issue'])
+_MESH_TAGS = frozenset(['DescriptorName', 'QualifierName'])
+_CHEMICAL_TAGS = frozenset(['NameOfSubstance', 'RegistryNumber'])
+_AU_NAME_TAGS = frozenset(['LastName', 'Initials', 'CollectiveName'])
 
 
 class PubMedArticle(MetaPubObject):
@@ -51,88 +112,129 @@ class PubMedArticle(MetaPubObject):
         * book_medium (default: None) - string (e.g. "Internet")
         * book_synonyms (default: None) - list of disease synonyms (applicable to "gene" book)
         * book_publication_status (default: None) - string (e.g. "ppublish")
-    """
-
-    def __init__(self, xmlstr, *args, **kwargs):
-        self.pubmed_type = determine_pubmed_xml_type(xmlstr)
-
-        if self.pubmed_type=='book':
-            self._root = 'BookDocument'
-            super(PubMedArticle, self).__init__(xmlstr, 'PubmedBookArticle', args, kwargs)
-        elif self.pubmed_type=='article':
-            self._root = 'MedlineCitation'
-            super(PubMedArticle, self).__init__(xmlstr, 'PubmedArticle', args, kwargs)
-        else:
-            # assume we're here because of predownloaded Medline XML.
-            self.pubmed_type = 'article'
-            self._root = '.'
-            super(PubMedArticle, self).__init__(xmlstr, None, args, kwargs)
 
-        pmt = self.pubmed_type
+    Lazy parsing:
+        With lazy=True, attributes are parsed from the XML on first access (and then
+        kept), rather than all at once during instantiation. Use this when only a few
+        attributes of each article are needed:
 
-        # shared between book and article types:
-        self.pmid = self._get_pmid()
-        self.url  = self._get_url()
-        self.authors = self._get_authors() if pmt == 'article' else self._get_book_authors()
-        self.author_list = self._get_author_list() if pmt == 'article' else self._get_book_author_list()
-        self.title = self._get_title() if pmt == 'article' else self._get_book_articletitle()
-        self.authors_str = self._get_authors_str()
-        self.author1_last_fm = self._get_author1_last_fm()
-        self.author1_lastfm = self._get_author1_lastfm()
+            paper = PubMedArticle(xml_string, lazy=True)
+            print(paper.pmid, paper.doi)      # nothing else is parsed
 
-        # 'article' only (not shared):
-        self.pages = None if pmt == 'book' else self._get_pages()
-        self.first_page = None if pmt == 'book' else self._get_first_page()
-        self.last_page = None if pmt == 'book' else self._get_last_page()
-        self.volume = None if pmt == 'book' else self._get_volume()
-        self.issue = None if pmt == 'book' else self._get_issue()
-        self.volume_issue = None if pmt == 'book' else self._get_volume_issue()
-        self.doi = None if pmt == 'book' else self._get_doi()
-        self.pii = None if pmt == 'book' else self._get_pii()
-        self.pmc = None if pmt == 'book' else self._get_pmc()
-        self.issn = None if pmt == 'book' else self._get_issn()
+        Attribute names, values and to_dict() output are the same in both modes.
 
-        # MeSH headings ('article' only)
-        self.mesh = self._get_mesh_headings()
+    Not keeping the XML:
+        With retain_xml=False, the xml string isn't kept as paper.xml (which is None),
+        so it can be freed as soon as it has been parsed. The parsed tree is still
+        kept (as paper.content), since lazy attributes are read from it.
 
-        # Chemical associations ('article' only)
-        self.chemicals = self._get_chemicals()
+    Compact records:
+        to_record() returns a PubMedRecord: the same attributes in __slots__, without
+        the XML and parsed tree, for holding many articles in memory (see
+        metapub.pubmedrecord).
+    """
 
-        # Grant information (?? 'article' only ??)
-        self.grants = self._get_grantlist()
+    def __init__(self, xmlstr, *args, **kwargs):
+        lazy = kwargs.pop('lazy', False)
+        retain_xml = kwargs.pop('retain_xml', True)
+        super(PubMedArticle, self).__init__(xmlstr, None, retain_xml=retain_xml)
+        # the type is read off the parsed document, rather than by searching xmlstr.
+        self.pubmed_type, self._root, self.content = _article_element(self.content)
+        self._xpaths = _XPATHS[self._root]
+
+        if not lazy:
+            idx = 0 if self.pubmed_type == 'article' else 1
+            for name, extractors in self._ATTRIBUTES.items():
+                extractor = extractors[idx]
+                setattr(self, name, None if extractor is None else getattr(self, extractor)())
+
+    # Attribute name -> (extractor method for 'article', extractor method for 'book').
+    # None means the attribute is always None for that pubmed_type.  When parsed
+    # eagerly, attributes are computed in this order (the shared oddballs, which
+    # depend on others, last).
+    _ATTRIBUTES = OrderedDict([
+        # shared between book and article types:
+        ('pmid', ('_get_pmid', '_get_pmid')),
+        ('url', ('_get_url', '_get_url')),
+        ('authors', ('_get_authors', '_get_book_authors')),
+        ('author_list', ('_get_author_list', '_get_book_author_list')),
+        ('title', ('_get_title', '_get_book_articletitle')),
+        ('authors_str', ('_get_authors_str', '_get_authors_str')),
+        ('author1_last_fm', ('_get_author1_last_fm', '_get_author1_last_fm')),
+        ('author1_lastfm', ('_get_author1_lastfm', '_get_author1_lastfm')),
 
-        # Publication Types (?? 'article' only ??)
-        self.publication_types = self._get_publication_types()
+        # 'article' only (not shared):
+        ('pages', ('_get_pages', None)),
+        ('first_page', ('_get_first_page', None)),
+        ('last_page', ('_get_last_page', None)),
+        ('volume', ('_get_volume', None)),
+        ('issue', ('_get_issue', None)),
+        ('volume_issue', ('_get_volume_issue', None)),
+        ('doi', ('_get_doi', None)),
+        ('pii', ('_get_pii', None)),
+        ('pmc', ('_get_pmc', None)),
+        ('issn', ('_get_issn', None)),
+
+        # MeSH headings and Chemical associations ('article' only)
+        ('mesh', ('_get_mesh_headings', '_get_mesh_headings')),
+        ('chemicals', ('_get_chemicals', '_get_chemicals')),
+
+        # Grant information and Publication Types (?? 'article' only ??)
+        ('grants', ('_get_grantlist', '_get_grantlist')),
+        ('publication_types', ('_get_publication_types', '_get_publication_types')),
 
         # 'book' only:
-        self.book_accession_id = None if pmt == 'article' else self._get_bookaccession_id()
-        self.book_title = None if pmt == 'article' else self._get_book_title()
-        self.book_publisher = None if pmt == 'article' else self._get_book_publisher()
-        self.book_language = None if pmt == 'article' else self._get_book_language()
-        self.book_editors = None if pmt == 'article' else self._get_book_editors()
-        self.book_abstracts = None if pmt == 'article' else self._get_book_abstracts()
-        self.book_sections = None if pmt == 'article' else self._get_book_sections()
-        self.book_copyright = None if pmt == 'article' else self._get_book_copyright()
-        self.book_medium = None if pmt == 'article' else self._get_book_medium()
-        self.book_synonyms = None if pmt == 'article' else self._get_book_synonyms()
-        self.book_publication_status = None if pmt == 'article' else self._get_book_publication_status()
-        self.book_history = None if pmt == 'article' else self._get_book_history()
-        self.book_contribution_date = None if pmt == 'article' else self._get_book_contribution_date()
-        self.book_date_revised = None if pmt == 'article' else self._get_book_contribution_date()
+        ('book_accession_id', (None, '_get_bookaccession_id')),
+        ('book_title', (None, '_get_book_title')),
+        ('book_publisher', (None, '_get_book_publisher')),
+        ('book_language', (None, '_get_book_language')),
+        ('book_editors', (None, '_get_book_editors')),
+        ('book_abstracts', (None, '_get_book_abstracts')),
+        ('book_sections', (None, '_get_book_sections')),
+        ('book_copyright', (None, '_get_book_copyright')),
+        ('book_medium', (None, '_get_book_medium')),
+        ('book_synonyms', (None, '_get_book_synonyms')),
+        ('book_publication_status', (None, '_get_book_publication_status')),
+        ('book_history', (None, '_get_book_history')),
+        ('book_contribution_date', (None, '_get_book_contribution_date')),
+        ('book_date_revised', (None, '_get_book_contribution_date')),
 
         # the shared oddballs, must be done last.
-        self.abstract = self._get_abstract() if pmt == 'article' else self._get_book_abstract()
-        self.journal = self.book_title if pmt == 'book' else self._get_journal()
-        self.year = self._get_book_year() if pmt == 'book' else self._get_year()
+        ('abstract', ('_get_abstract', '_get_book_abstract')),
+        ('journal', ('_get_journal', '_get_book_title')),
+        ('year', ('_get_year', '_get_book_year')),
+        ('history', ('_get_article_history', '_get_article_history')),
+    ])
+
+    def _compute(self, name):
+        extractor = self._ATTRIBUTES[name][0 if self.pubmed_type == 'article' else 1]
+        if extractor is None:
+            return None
+        return getattr(self, extractor)()
 
-        self.history = self._get_article_history()
+    def __getattr__(self, name):
+        # only called for attributes not (yet) in __dict__, i.e. when parsing lazily.
+        if name not in self._ATTRIBUTES or 'content' not in self.__dict__:
+            raise AttributeError(name)
+        value = self._compute(name)
+        setattr(self, name, value)
+        return value
 
     def to_dict(self):
-        outd = self.__dict__
-        outd.pop('content')
-        outd.pop('xml')
-        outd.pop('_root')
-        return self.__dict__
+        """ returns a new dict of the article's attributes (parsing any not yet parsed).
+        The article itself is left as it was.
+        """
+        outd = dict((name, getattr(self, name)) for name in self._ATTRIBUTES)
+        outd['pubmed_type'] = self.pubmed_type
+        return outd
+
+    def to_record(self, drop=()):
+        """ returns a PubMedRecord of this article's attributes.
+
+        :param drop: names of attributes not to keep (e.g. ('abstract', ))
+        :rtype: PubMedRecord
+        """
+        return PubMedRecord.from_article(self, drop=drop)
 
     def _cit_author_str(self, author_list_or_string):
         """ Helper function for constructing article citations.
@@ -191,24 +293,23 @@ class PubMedArticle(MetaPubObject):
         return article_cit_fmt.format(author=author_str, a=self, title=title, journal=journal, doi=doi_str)
 
     def _construct_datetime(self, d):
-        names = ['Year', 'Month', 'Day']
         # if any part is missing, python will default to setting it to 1 anyway.
         parts = {'year': 1, 'month': 1, 'day': 1}
-        for name in names:
-            if d.find(name) is not None:
-                item = d.find(name).text
-                try:
-                    parts[name.lower()] = int(item)
-                except ValueError:
-                    if name.lower() == 'year':
-                        # fixes spurious crap seen at least once: "2007 (details online)" (pmid 19659763)
-                        parts['year'] = int(item[:4])
-                    elif name.lower() == 'month':
-                        # Force to 3-letter month name (months can look like "December", "Dec", "1")
-                        parts['month'] = time.strptime(item[:3], '%b').tm_mon
-                except TypeError:
-                    # item is None
-                    pass
+        for tag, elem in first_children(d, _DATE_TAGS).items():
+            name = tag.lower()
+            item = elem.text
+            try:
+                parts[name] = int(item)
+            except ValueError:
+                if name == 'year':
+                    # fixes spurious crap seen at least once: "2007 (details online)" (pmid 19659763)
+                    parts['year'] = int(item[:4])
+                elif name == 'month':
+                    # Force to 3-letter month name (months can look like "December", "Dec", "1")
+                    parts['month'] = time.strptime(item[:3], '%b').tm_mon
+            except TypeError:
+                # item is None
+                pass
         try:
             return datetime(**parts)
         except ValueError:
@@ -216,46 +317,60 @@ class PubMedArticle(MetaPubObject):
             # where the "accepted" year was "20007". at any rate, forget it.
             return None
 
+    def _find(self, name):
+        '''Returns first element matched by the XPath named `name` (see _PATHS), or None.'''
+        found = self._xpaths[name](self.content)
+        return found[0] if found else None
+
+    def _findall(self, name):
+        '''Returns list of elements matched by the XPath named `name` (see _PATHS).'''
+        return self._xpaths[name](self.content)
+
+    def _text(self, name):
+        '''Returns text of first element matched by the XPath named `name`, or None.'''
+        found = self._xpaths[name](self.content)
+        return found[0].text if found else None
+
     def _get_bookaccession_id(self):
-        for item in self.content.findall('BookDocument/ArticleIdList/ArticleId'):
+        for item in self._findall('book_article_ids'):
             if item.get('IdType') == 'bookaccession':
                 return item.text
 
     def _get_book_title(self):
-        return self._get('BookDocument/Book/BookTitle')
+        return self._text('book_title')
 
     def _get_book_articletitle(self):
-        return self._get('BookDocument/ArticleTitle')
+        return self._text('book_article_title')
 
     def _get_book_authors(self):
-        authors = [_au_to_last_fm(au) for au in self.content.findall('BookDocument/AuthorList/Author')]
+        authors = [_au_to_last_fm(au) for au in self._findall('book_authors')]
         return authors
 
     def _get_book_author_list(self):
-        authors = [PubMedAuthor(au) for au in self.content.findall('BookDocument/AuthorList/Author')]
+        authors = [PubMedAuthor(au) for au in self._findall('book_authors')]
         return authors
 
     def _get_book_publisher(self):
-        return self._get('BookDocument/Book/Publisher/PublisherName')
+        return self._text('book_publisher')
 
     def _get_book_publisher_location(self):
-        return self._get('BookDocument/Book/Publisher/PublisherLocation')
+        return self._text('book_publisher_location')
 
     def _get_book_language(self):
-        return self._get('BookDocument/Language')
+        return self._text('book_language')
 
     def _get_book_editors(self):
-        return [_au_to_last_fm(au) for au in self.content.findall('BookDocument/Book/AuthorList/Author')]
+        return [_au_to_last_fm(au) for au in self._findall('book_editors')]
 
     def _get_book_abstracts(self):
         abd = OrderedDict()
-        for item in self.content.findall('BookDocument/Abstract/AbstractText'):
+        for item in self._findall('book_abstracts'):
             abd[item.get('Label')] = item.text
         return abd
 
     def _get_book_sections(self):
         sections = {}
-        for item in self.content.findall('BookDocument/Sections/Section'):
+        for item in self._findall('book_sections'):
             sec_title = item.find('SectionTitle')
             sections[sec_title.get('sec')] = sec_title.text
         return sections
@@ -265,36 +380,35 @@ class PubMedArticle(MetaPubObject):
         return '\n'.join(abstract_strs)
 
     def _get_book_copyright(self):
-        return self._get('BookDocument/Abstract/CopyrightInformation')
+        return self._text('book_copyright')
 
     def _get_book_medium(self):
-        return self._get('BookDocument/Book/Medium')
+        return self._text('book_medium')
 
     def _get_book_contribution_date(self):
-        contribution_date_element = self.content.find('BookDocument/ContributionDate')
+        contribution_date_element = self._find('book_contribution_date')
         if contribution_date_element is not None:
-            return self._construct_datetime(self.content.find('BookDocument/ContributionDate'))
+            return self._construct_datetime(contribution_date_element)
         return None
 
     def _get_book_date_revised(self):
-        return self._construct_datetime(self.content.find('BookDocument/DateRevised'))
+        return self._construct_datetime(self._find('book_date_revised'))
 
     def _get_book_synonyms(self):
-        syn_list = self.content.find('BookDocument/ItemList')
+        syn_list = self._find('book_item_list')
         if syn_list is not None and syn_list.get('ListType') == 'Synonyms':
-            return [item.text for item in self.content.findall('BookDocument/ItemList/Item')]
+            return [item.text for item in self._findall('book_items')]
         else:
             return []
 
     def _get_book_history(self):
         history = {}
-        items = self.content.findall('PubmedBookData/History/PubMedPubDate')
-        for item in items:
+        for item in self._findall('book_history'):
             history[item.get('PubStatus')] = self._construct_datetime(item)
         return history
 
     def _get_book_publication_status(self):
-        return self._get('PubmedBookData/PublicationStatus')
+        return self._text('book_publication_status')
 
     def _get_book_year(self):
         if self.book_contribution_date:
@@ -302,15 +416,15 @@ class PubMedArticle(MetaPubObject):
         return None
 
     def _get_pmid(self):
-        return self._get(self._root+'/PMID')
+        return self._text('pmid')
 
     def _get_url(self):
         return 'https://ncbi.nlm.nih.gov/pubmed/'+str(self.pmid)
 
     def _get_abstract(self):
-        abstracts = self.content.findall(self._root + '/Article/Abstract/AbstractText')
+        abstracts = self._findall('abstract')
         if abstracts == []:
-            return self._get(self._root+'/Article/Abstract/AbstractText')
+            return None
 
         if len(abstracts) == 1:
             return abstracts[0].text
@@ -323,11 +437,11 @@ class PubMedArticle(MetaPubObject):
 
     def _get_authors(self):
         # N.B. Citations may have 0 authors. e.g., pmid:7550356
-        authors = [_au_to_last_fm(au) for au in self.content.findall(self._root+'/Article/AuthorList/Author')]
+        authors = [_au_to_last_fm(au) for au in self._findall('authors')]
         return authors
 
     def _get_author_list(self):
-        authors = [PubMedAuthor(au) for au in self.content.findall(self._root+'/Article/AuthorList/Author')]
+        authors = [PubMedAuthor(au) for au in self._findall('authors')]
         return authors
 
     def _get_authors_str(self):
@@ -335,7 +449,6 @@ class PubMedArticle(MetaPubObject):
 
     def _get_author1_last_fm(self):
         """ return first author's name, in format Last INITS (space between surname and initials)"""
-        # return _au_to_last_fm(self.content.find(self._root+'/Article/AuthorList/Author'))
         if self.authors:
             return self.authors[0]
         else:
@@ -348,14 +461,14 @@ class PubMedArticle(MetaPubObject):
         return None
 
     def _get_journal(self):
-        j = self._get(self._root+'/Article/Journal/ISOAbbreviation')
+        j = self._text('journal_abbreviation')
         if j is None:
             # e.g., https://www.ncbi.nlm.nih.gov/pubmed?term=21242195
-            j = self._get(self._root+'/Article/Journal/Title')
+            j = self._text('journal_title')
         return j
 
     def _get_pages(self):
-        return self._get(self._root+'/Article/Pagination/MedlinePgn')
+        return self._text('pages')
 
     def _get_first_page(self):
         try:
@@ -379,77 +492,69 @@ class PubMedArticle(MetaPubObject):
             return lastnum
 
     def _get_title(self):
-        return self._get(self._root+'/Article/ArticleTitle')
+        return self._text('title')
 
     def _get_volume(self):
-        try:
-            return self.content.find(self._root+'/Article/Journal/JournalIssue/Volume').text
-        except AttributeError:
-            return None
+        return self._text('volume')
 
     def _get_issue(self):
-        try:
-            return self.content.find(self._root+'/Article/Journal/JournalIssue/Issue').text
-        except AttributeError:
-            return None
+        return self._text('issue')
 
     def _get_volume_issue(self):
-        ji = self.content.find(self._root+'/Article/Journal/JournalIssue')
-        try:
-            return '%s(%s)' % (ji.find('Volume').text, ji.find('Issue').text)
-
-        except AttributeError:
-            pass
-        try:
-            return ji.find('Volume').text
-        except AttributeError:
-            pass
-        # electronic pubs may not have volume or issue
-        # e.g., https://www.ncbi.nlm.nih.gov/pubmed?term=20860988
-        return None
+        ji = self._find('journal_issue')
+        if ji is None:
+            return None
+        found = first_children(ji, _VOLUME_ISSUE_TAGS)
+        if 'Volume' not in found:
+            # electronic pubs may not have volume or issue
+            # e.g., https://www.ncbi.nlm.nih.gov/pubmed?term=20860988
+            return None
+        if 'Issue' in found:
+            return '%s(%s)' % (found['Volume'].text, found['Issue'].text)
+        return found['Volume'].text
 
     def _get_article_history(self):
         history = {}
-        pubdates = self.content.find('PubmedData/History')
+        pubdates = self._find('history')
         if pubdates is not None:
-            for pubdate in pubdates.getchildren():
+            for pubdate in pubdates.iterchildren():
                 history[pubdate.get('PubStatus')] = self._construct_datetime(pubdate)
         return history
 
     def _get_year(self):
-        y = self._get(self._root+'/Article/Journal/JournalIssue/PubDate/Year')
+        y = self._text('year')
         if y is None:
             # case applicable for pmid:9887384 (at least)
             try:
-                y = self._get(self._root+'/Article/Journal/JournalIssue/PubDate/MedlineDate')[0:4]
+                y = self._text('medline_date')[0:4]
             except TypeError:
                 pass
         return y
 
     def _get_doi(self):
-        return self._get('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]')
+        return self._text('doi')
 
     def _get_pii(self):
-        return self._get('PubmedData/ArticleIdList/ArticleId[@IdType="pii"]')
+        return self._text('pii')
 
     def _get_pmc(self):
         try:
-            return self._get('PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]')[3:]
+            return self._text('pmc')[3:]
         except TypeError:
             return None
 
     def _get_issn(self):
-        return self._get(self._root+'/Article/Journal/ISSN')
+        return self._text('issn')
 
     def _get_mesh_headings(self):
         if self.pubmed_type == 'book':
             return None
 
-        meshtags = self.content.findall('MedlineCitation/MeshHeadingList/MeshHeading')
         outd = {}
-        for mesh in meshtags:
-            descript = mesh.find('DescriptorName')  # should always be present
-            qual = mesh.find('QualifierName')       # may not be present
+        for mesh in self._findall('mesh_headings'):
+            found = first_children(mesh, _MESH_TAGS)
+            descript = found.get('DescriptorName')  # should always be present
+            qual = found.get('QualifierName')      # may not be present
 
             dui = descript.get('UI')
             outd[dui] = {
@@ -465,10 +570,10 @@ class PubMedArticle(MetaPubObject):
             return None
 
         outd = {}
-        chemicals = self.content.findall('MedlineCitation/ChemicalList/Chemical')
-        for chem in chemicals:
-            substance = chem.find('NameOfSubstance')
-            regnum = chem.find('RegistryNumber').text  # very often this is '0'
+        for chem in self._findall('chemicals'):
+            found = first_children(chem, _CHEMICAL_TAGS)
+            substance = found.get('NameOfSubstance')
+            regnum = found.get('RegistryNumber').text  # very often this is '0'
             outd[substance.get('UI')] = {
                     'substance_name': substance.text,
                     'registry_number': regnum
@@ -477,15 +582,13 @@ class PubMedArticle(MetaPubObject):
 
     def _get_publication_types(self):
         outd = {}
-        pubtypes = self.content.findall('MedlineCitation/Article/PublicationTypeList/PublicationType')
-        for pt in pubtypes:
+        for pt in self._findall('publication_types'):
             outd[pt.get('UI')] = pt.text
         return outd
 
     def _get_grantlist(self):
         outl = []
-        grants = self.content.findall('MedlineCitation/GrantList')
-        for gr in grants:
+        for gr in self._findall('grants'):
             outl.append({'agency': gr.get('Agency', None), 'country': gr.get('Country', None)})
         return outl
 
@@ -503,18 +606,14 @@ class PubMedArticle(MetaPubObject):
 def _au_to_last_fm(au):
     if au is None:
         return
-    try:
-        return au.find('LastName').text + ' ' + au.find('Initials').text
-    except AttributeError:
-        pass
-    try:
-        return au.find('CollectiveName').text
-    except AttributeError:
-        pass
-    try:
-        return au.find('LastName').text
-    except AttributeError:
-        pass
+    found = first_children(au, _AU_NAME_TAGS)
+    last_name = found.get('LastName')
+    if last_name is not None and 'Initials' in found:
+        return last_name.text + ' ' + found['Initials'].text
+    if 'CollectiveName' in found:
+        return found['CollectiveName'].text
+    if last_name is not None:
+        return last_name.text
     raise MetaPubError("Author structure not recognized")
 
 
@@ -542,29 +641,42 @@ def determine_pubmed_xml_type(xmlstr):
         'book'
         'unknown'
 
+    (PubMedArticle itself takes the type from the parsed document; see _article_element.)
+
     :param xmlstr: xml in any data type (str, bytes, unicode...)
     :return typestring: (str)
     :rtype: str
     """
-    # The real purpose of this function is to pull the py2/3 compatibility code
-    # away from the PubMedArticle class. This sucks and I (@nthmost) hate it,
-    # but it solves all of the problems of trying to inspect an XML document
-    # that may have arrived as bytes (from requests) or as a native string, which
-    # when you use unicode_literals in 2.7 gives you even more problems.
-    #
-    # If you have a less ugly way to solve this, by all means, contribute.  :)
-    if six.PY2:
-        if b'<PubmedBookArticle>' in xmlstr:
-            return 'book'
-        elif b'<PubmedArticle>' in xmlstr:
-            return 'article'
-
-    elif six.PY3:
-        if type(xmlstr)==six.binary_type:
-            xmlstr = xmlstr.decode()
-        if '<PubmedBookArticle>' in xmlstr:
-            return 'book'
-        elif '<PubmedArticle>' in xmlstr:
-            return 'article'
-
+    # search bytes as bytes: no need to decode (and copy) the whole document.
+    if isinstance(xmlstr, six.binary_type):
+        book_tag, article_tag = b'<PubmedBookArticle>', b'<PubmedArticle>'
+    else:
+        book_tag, article_tag = '<PubmedBookArticle>', '<PubmedArticle>'
+
+    if book_tag in xmlstr:
+        return 'book'
+    elif article_tag in xmlstr:
+        return 'article'
     return 'unknown'
+
+
+def _article_element(dom):
+    """ Returns (pubmed_type, citation root, element) for a parsed PubMed document: the
+    PubmedBookArticle or PubmedArticle element (either the document itself or, in a
+    PubmedArticleSet, the first one -- book articles taking precedence), or the whole
+    document if it is neither (e.g. bare Medline XML).
+    """
+    if dom.tag == 'PubmedBookArticle':
+        return 'book', 'BookDocument', dom
+    if dom.tag == 'PubmedArticle':
+        return 'article', 'MedlineCitation', dom
+
+    book = dom.find('PubmedBookArticle')
+    if book is not None:
+        return 'book', 'BookDocument', book
+    article = dom.find('PubmedArticle')
+    if article is not None:
+        return 'article', 'MedlineCitation', article
+
+    # assume we're here because of predownloaded Medline XML.
+    return 'article', '.', dom
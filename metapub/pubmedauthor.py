@@ -2,9 +2,13 @@ from __future__ import absolute_import, unicode_literals
 
 """metapub.pubmedauthor -- PubMedAuthor class instantiated a ncbi Author XML Element"""
 
-from .base import MetaPubObject
+from .base import MetaPubObject, first_children
 from .exceptions import MetaPubError
 
+_NAME_FIELDS = (('LastName', 'last_name'), ('ForeName', 'fore_name'), ('Initials', 'initials'),
+                ('CollectiveName', 'collective_name'))
+_AUTHOR_TAGS = frozenset([tag for tag, name in _NAME_FIELDS] + ['AffiliationInfo'])
+
 
 class PubMedAuthor(MetaPubObject):
     """This PubMedAuthor class receives a xml element as required argument
@@ -42,30 +46,13 @@ class PubMedAuthor(MetaPubObject):
         if self.content is None:
             return
 
-        try:
-            self.last_name = self.content.find('LastName').text
-        except AttributeError:
-            pass
-
-        try:
-            self.fore_name = self.content.find('ForeName').text
-        except AttributeError:
-            pass
-
-        try:
-            self.initials = self.content.find('Initials').text
-        except AttributeError:
-            pass
-
-        try:
-            self.collective_name = self.content.find('CollectiveName').text
-        except AttributeError:
-            pass
-
-        try:
-            self.affiliations = [aff.text for aff in self.content.find('AffiliationInfo').findall('Affiliation')]
-        except AttributeError:
-            pass
+        found = first_children(self.content, _AUTHOR_TAGS)
+        for tag, name in _NAME_FIELDS:
+            if tag in found:
+                setattr(self, name, found[tag].text)
+
+        if 'AffiliationInfo' in found:
+            self.affiliations = [aff.text for aff in found['AffiliationInfo'].iterchildren('Affiliation')]
 
         if self.last_name is None and self.fore_name is None and self.initials is None and self.collective_name is None and self.affiliations == []:
             raise MetaPubError('Author structure not recognized')
@@ -1,12 +1,33 @@
 from __future__ import absolute_import, unicode_literals
 
+import logging
+
 from lxml import etree
 
-import requests
+from . import ratelimit
+from .eutils_common import get_cache_path
+from .cache_backends import open_cache
+from .config import PKGNAME, DEFAULT_EMAIL, DEFAULT_CACHE_DIR
+
+PMC_ID_CONVERSION_BASE_URI = 'https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/'
+
+# the ID conversion API accepts at most 200 IDs (all of the same type) per request.
+IDCONV_MAX_IDS = 200
+
+CACHE_FILENAME = 'pmc_idconv-cache.db'
+
+# cache path -> open cache, so that each cachedir gets its own.
+PMC_IDCONV_CACHES = {}
 
-from .config import PKGNAME, DEFAULT_EMAIL
+log = logging.getLogger('metapub.pubmedcentral')
 
-PMC_ID_CONVERSION_URI = 'https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/?tool='+PKGNAME+'&email='+DEFAULT_EMAIL+'&ids=%s'
+
+def _get_idconv_cache(cachedir=DEFAULT_CACHE_DIR):
+    _cache_path = get_cache_path(cachedir, CACHE_FILENAME)
+    cache = PMC_IDCONV_CACHES.get(_cache_path)
+    if cache is None:
+        cache = PMC_IDCONV_CACHES[_cache_path] = open_cache(_cache_path)
+    return cache
 
 __doc__="""An assortment of functions providing access to various web APIs.
 
@@ -25,13 +46,106 @@ __doc__="""An assortment of functions providing access to various web APIs.
         get_doi_for_otherid(string)
 
         get_pmcid_for_otherid(string)
+
+        batch_convert_ids(list of strings)
+
+    Results are stored in an SQLite cache (pmc_idconv-cache.db), since ID mappings
+    don't change once they exist.
 """
 
-def _pmc_id_conversion_api(input_id):
-    xml = requests.get(PMC_ID_CONVERSION_URI % input_id).content
-    root = etree.fromstring(xml)
-    record = root.find('record')
-    return record
+def _idtype(input_id):
+    """ returns the idconv "idtype" of input_id: one of pmcid, pmid, doi or mid. """
+    if input_id.upper().startswith('PMC'):
+        return 'pmcid'
+    if input_id.isdigit():
+        return 'pmid'
+    if input_id.startswith('10.'):
+        return 'doi'
+    return 'mid'
+
+
+def _cache_key(input_id):
+    # DOIs are case-insensitive.
+    idtype = _idtype(input_id)
+    if idtype == 'doi':
+        return 'doi:' + input_id.lower()
+    return idtype + ':' + input_id.upper()
+
+
+def _parse_idconv_record(record):
+    return {'pmid': record.get('pmid'),
+            'pmcid': record.get('pmcid'),
+            'doi': record.get('doi'),
+            'versions': [version.get('pmcid') for version in record.findall('versions/version')],
+            'errmsg': record.get('errmsg'),
+            }
+
+
+def batch_convert_ids(ids, cachedir=DEFAULT_CACHE_DIR, chunk_size=IDCONV_MAX_IDS):
+    """ Use the PMC ID conversion API to convert many IDs (any mix of PMIDs, PMCIDs,
+    DOIs and manuscript IDs) in as few requests as possible: IDs are grouped by type
+    and submitted up to 200 per request. Previously converted IDs are answered from
+    the cache.
+
+    Returns a dictionary keyed by each supplied ID (as supplied) whose values are
+    dictionaries with the following keys:
+
+        pmid        (str or None)
+        pmcid       (str or None)
+        doi         (str or None)
+        versions    (list) versioned PMCIDs, e.g. ['PMC2808187.1', 'PMC2808187.2']
+        errmsg      (str or None) reason given by the API if the ID couldn't be converted
+
+    :param ids: list of IDs (str)
+    :param cachedir: directory for the SQLite cache, or None to disable caching
+    :param chunk_size: (int) number of IDs per request (max 200)
+    :return: dict
+    """
+    cache = None if cachedir is None else _get_idconv_cache(cachedir)
+    chunk_size = min(chunk_size, IDCONV_MAX_IDS)
+
+    input_ids = []
+    seen = set()
+    for input_id in ids:
+        input_id = str(input_id).strip()
+        if input_id not in seen:
+            seen.add(input_id)
+            input_ids.append(input_id)
+
+    cached = cache.get_many([_cache_key(input_id) for input_id in input_ids]) if cache else {}
+
+    results = {}
+    wanted = {}
+    for input_id in input_ids:
+        results[input_id] = cached.get(_cache_key(input_id))
+        if results[input_id] is None:
+            wanted.setdefault(_idtype(input_id), []).append(input_id)
+
+    for idtype, type_ids in wanted.items():
+        for idx in range(0, len(type_ids), chunk_size):
+            chunk = type_ids[idx:idx + chunk_size]
+            by_key = dict((_cache_key(input_id), input_id) for input_id in chunk)
+            params = {'tool': PKGNAME, 'email': DEFAULT_EMAIL, 'idtype': idtype, 'ids': ','.join(chunk)}
+            root = etree.fromstring(ratelimit.get(PMC_ID_CONVERSION_BASE_URI, params=params).content)
+
+            to_cache = {}
+            for record in root.findall('record'):
+                input_id = by_key.get(_cache_key(record.get('requested-id', '')))
+                if input_id is None:
+                    log.debug('Unexpected record in idconv response: %r', record.attrib)
+                    continue
+                result = results[input_id] = _parse_idconv_record(record)
+                if record.get('status') != 'error':
+                    to_cache[_cache_key(input_id)] = result
+            if cache and to_cache:
+                cache.set_many(to_cache)
+
+    for input_id in results:
+        if results[input_id] is None:
+            results[input_id] = {'pmid': None, 'pmcid': None, 'doi': None, 'versions': [],
+                                 'errmsg': 'no record returned'}
+    return results
+
 
 def get_pmid_for_otherid(otherid):
     """ Use the PMC ID conversion API to attempt to convert either PMCID or DOI to a PMID.
@@ -41,8 +155,7 @@ def get_pmid_for_otherid(otherid):
     :return pmid: (str)
     :rtype: str
     """
-    record = _pmc_id_conversion_api(otherid)
-    return record.get('pmid')
+    return batch_convert_ids([otherid])[str(otherid).strip()]['pmid']
 
 def get_pmcid_for_otherid(otherid):
     """ Use the PMC ID conversion API to attempt to convert either PMID or DOI to a PMCID.
@@ -52,8 +165,7 @@ def get_pmcid_for_otherid(otherid):
     :return pmcid: (str)
     :rtype: str
     """
-    record = _pmc_id_conversion_api(otherid)
-    return record.get('pmcid')
+    return batch_convert_ids([otherid])[str(otherid).strip()]['pmcid']
 
 def get_doi_for_otherid(otherid):
     """ Use the PMC ID conversion API to attempt to convert either PMID or PMCID to a DOI.
@@ -67,8 +179,7 @@ def get_doi_for_otherid(otherid):
     :return doi: (str)
     :rtype: str
     """
-    record = _pmc_id_conversion_api(otherid)
-    return record.get('doi')
+    return batch_convert_ids([otherid])[str(otherid).strip()]['doi']
 
 
 # PMID: https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/?tool=my_tool&email=my_email@example.com&ids=23193287
@@ -3,18 +3,63 @@ from __future__ import absolute_import, print_function
 __doc__ = '''metapub.PubMedFetcher -- tools to deal with NCBI's E-utilities interface to PubMed'''
 __author__ = 'nthmost'
 
+import logging
+
 from lxml import etree
-import requests
 
-from .eutils_common import get_cache_path, get_eutils_client
+from .eutils_common import get_cache_path, get_eutils_client, is_cache_url, EUTILS_DEFAULT_CACHEDIR
 from .pubmedarticle import PubMedArticle
-from .pubmedcentral import get_pmid_for_otherid
+from .localstore import LocalPubMedStore
+from .parsepool import parse_records
+from .pubmedcentral import get_pmid_for_otherid, batch_convert_ids
 from .pubmed_clinicalqueries import *
 from .utils import kpick, lowercase_keys, remove_chars
 from .text_mining import re_pmid
 from .exceptions import MetaPubError, EutilsRequestError, InvalidPMID
 from .base import Borg
-from .config import DEFAULT_EMAIL
+from . import ratelimit
+from .config import DEFAULT_EMAIL, DEFAULT_CACHE_DIR
+
+def parse_esearch_result(xmlstr):
+    """ return list of IDs found in the IdList of an esearch XML response.
+
+    :param xmlstr:
+    :return: list of IDs (strings); empty list if none found.
+    """
+    dom = etree.fromstring(xmlstr)
+    return [item.text.strip() for item in dom.findall('IdList/Id')]
+
+
+def split_pubmed_article_set(xmlstr):
+    """ Split a PubmedArticleSet (e.g. a multi-PMID efetch response) into one
+    XML document per article, in document order.
+
+    Each yielded xml is a PubmedArticleSet containing a single PubmedArticle
+    or PubmedBookArticle, suitable for instantiating a PubMedArticle.
+
+    :param xmlstr: xml (str or bytes) with PubmedArticleSet as the root element
+    :return: generator of (pmid, xml) tuples
+    """
+    dom = etree.fromstring(xmlstr)
+    for elem in dom:
+        if elem.tag == 'PubmedArticle':
+            pmid_elem = elem.find('MedlineCitation/PMID')
+        elif elem.tag == 'PubmedBookArticle':
+            pmid_elem = elem.find('BookDocument/PMID')
+        else:
+            continue
+        pmid = None if pmid_elem is None else pmid_elem.text.strip()
+        yield pmid, b'<PubmedArticleSet>' + etree.tostring(elem) + b'</PubmedArticleSet>'
+
+
+def _parsed(xmls, processes=None):
+    """ yields PubMedArticles for article xmls, or PubMedRecords parsed by a ParsePool
+    if processes (int or ParsePool) is given.
+    """
+    if processes:
+        return parse_records(xmls, processes)
+    return (PubMedArticle(xml) for xml in xmls)
+
 
 def parse_related_pmids_result(xmlstr):
     outd = {}
@@ -32,16 +77,25 @@ class PubMedFetcher(Borg):
 
     An interaction layer for querying via specified method to return PubMedArticle objects.
 
-    Currently available methods: eutils
+    Currently available methods: eutils, local
 
     Basic Usage:
 
         fetch = PubMedFetcher()
 
-    To specify a service method (more coming soon):
+    To specify a service method:
 
         fetch = PubMedFetcher('eutils')
 
+    The 'local' method serves article_by_pmid, articles_by_pmids, article_by_doi,
+    article_by_pmcid and (batch_)pmids_for_citation from a LocalPubMedStore built
+    from MEDLINE baseline files (see metapub.localstore), without contacting NCBI:
+
+        fetch = PubMedFetcher('local', local_store='/data/pubmed-local.db')
+
+    Local fetchers share their state with each other but not with eutils fetchers,
+    so creating a PubMedFetcher() elsewhere (e.g. inside FindIt) leaves them local.
+
     To return an article by querying the service with a known PMID:
 
         paper = fetch.article_by_pmid('123456')
@@ -51,6 +105,30 @@ class PubMedFetcher(Borg):
         paper = fetch.article_by_doi('10.1038/ng.379')
         paper = fetch.article_by_pmcid('PMC3458974')
 
+    To load many articles at once, use articles_by_pmids, which requests PMIDs
+    from eutils in batches and yields PubMedArticle objects as they are parsed:
+
+        for paper in fetch.articles_by_pmids(list_of_pmids):
+            print(paper.pmid, paper.title)
+
+        print(fetch.last_missing_pmids)     # PMIDs that were invalid or not found
+
+    To parse them on several cores, pass a number of worker processes (or a
+    parsepool.ParsePool to reuse); PubMedRecords are then yielded instead:
+
+        for record in fetch.articles_by_pmids(list_of_pmids, processes=8):
+            ...
+
+    Lists of DOIs or PMCIDs work the same way (IDs are converted to PMIDs in batches):
+
+        for paper in fetch.articles_by_dois(list_of_dois):
+            ...
+
+    Queries with very large result sets can be streamed from the NCBI History server:
+
+        for pmid in fetch.iter_pmids_for_query('breast cancer', since='2015'):
+            ...
+
     Finally, you can search for PMIDs via citation details by using the pmids_for_citation
     method, for which you only need 3 out of 5 details as a list of one or more PMIDs:
 
@@ -59,38 +137,183 @@ class PubMedFetcher(Borg):
     '''
 
     _cache_filename = 'eutils-cache.db'
+    _local_store_filename = 'pubmed-local.db'
+    _log = logging.getLogger('metapub.PubMedFetcher')
+    _local_shared_state = {}
 
-    def __init__(self, method='eutils', api_key=None, email=DEFAULT_EMAIL, cachedir='default'):
-        Borg.__init__(self)
+    def __init__(self, method='eutils', api_key=None, email=DEFAULT_EMAIL, cachedir='default', local_store=None):
+        if method == 'local':
+            self.__dict__ = self._local_shared_state
+        else:
+            Borg.__init__(self)
         self.method = method
         self._cache_path = None
+        self._cachedir = DEFAULT_CACHE_DIR if cachedir == 'default' else cachedir
+        self.last_missing_pmids = []
+        self.last_history = None
 
         if method == 'eutils':
             self._cache_path = get_cache_path(cachedir, self._cache_filename)
             self.qs = get_eutils_client(self._cache_path, email=email, api_key=api_key)
             self.article_by_pmid = self._eutils_article_by_pmid
+            self.articles_by_pmids = self._eutils_articles_by_pmids
             self.article_by_pmcid = self._eutils_article_by_pmcid
             self.article_by_doi = self._eutils_article_by_doi
+            self.articles_by_pmcids = self._eutils_articles_by_pmcids
+            self.articles_by_dois = self._eutils_articles_by_dois
             self.batch_query_doi = self._eutils_pmids_for_dois
             self.pmids_for_query = self._eutils_pmids_for_query
+            self.history_for_query = self._eutils_history_for_query
+            self.pmids_from_history = self._eutils_pmids_from_history
+            self.articles_from_history = self._eutils_articles_from_history
+            self.pmids_for_citation = self._eutils_pmids_for_citation
+            self.batch_pmids_for_citation = self._eutils_batch_pmids_for_citation
+        elif method == 'local':
+            if local_store is None:
+                local_store = get_cache_path(cachedir or 'default', self._local_store_filename)
+                if is_cache_url(local_store):
+                    # the store is always an SQLite file; cache urls only choose where caches go.
+                    local_store = get_cache_path(EUTILS_DEFAULT_CACHEDIR, self._local_store_filename)
+            self.store = LocalPubMedStore(local_store)
+            self.article_by_pmid = self._local_article_by_pmid
+            self.articles_by_pmids = self._local_articles_by_pmids
+            self.article_by_pmcid = self._local_article_by_pmcid
+            self.article_by_doi = self._local_article_by_doi
+            self.pmids_for_citation = self._local_pmids_for_citation
+            self.batch_pmids_for_citation = self._local_batch_pmids_for_citation
         else:
-            raise NotImplementedError('coming soon: fetch from local pubmed via medgen-mysql or filesystem cache.')
+            raise NotImplementedError('Unknown PubMedFetcher method "%s" (use "eutils" or "local")' % method)
+
+    def _local_article_by_pmid(self, pmid):
+        pmid = str(pmid).strip()
+        if not pmid.isdigit():
+            raise MetaPubError('Invalid ID "%s"; please check the number and try again.' % pmid)
+        pma = self.store.get_article(pmid)
+        if pma is None:
+            raise InvalidPMID('Pubmed ID "%s" not found in local store %s' % (pmid, self.store.path))
+        return pma
+
+    def _local_articles_by_pmids(self, pmids, chunk_size=None, processes=None):
+        '''Yields PubMedArticle objects from the local store for the supplied pubmed
+        IDs; PMIDs that are malformed or not in the store are collected in
+        self.last_missing_pmids. (chunk_size is accepted for compatibility and ignored.)
+
+        With `processes` (int or parsepool.ParsePool), articles are parsed in worker
+        processes and yielded as PubMedRecords.
+        '''
+        return _parsed(self._local_xml_for_pmids(pmids), processes)
+
+    def _local_xml_for_pmids(self, pmids):
+        self.last_missing_pmids = []
+        seen = set()
+        for pmid in pmids:
+            pmid = str(pmid).strip()
+            if pmid in seen:
+                continue
+            seen.add(pmid)
+            xml = self.store.get_xml(pmid) if pmid.isdigit() else None
+            if xml is None:
+                self.last_missing_pmids.append(pmid)
+            else:
+                yield xml
+
+    def _local_article_by_pmcid(self, pmcid):
+        pmid = self.store.pmid_for_pmcid(pmcid)
+        if pmid is None:
+            raise MetaPubError('No PMID available for PubMedCentral id %s' % pmcid)
+        return self._local_article_by_pmid(pmid)
+
+    def _local_article_by_doi(self, doi):
+        pmid = self.store.pmid_for_doi(doi)
+        if pmid is None:
+            raise MetaPubError('No PMID available for doi %s' % doi)
+        return self._local_article_by_pmid(pmid)
+
+    def _local_pmids_for_citation(self, **kwargs):
+        '''returns list of pmids from the local store matching the given citation
+        (same keyword arguments as the eutils pmids_for_citation). Unlike ecitmatch,
+        matching is exact (apart from case and punctuation in journal names); the
+        author name is only used to choose between several matches.
+        '''
+        inp_dict = _citation_details(kwargs)
+        author = kpick(lowercase_keys(kwargs), options=['aulast', 'author1_last_fm', 'author', 'authors'],
+                       default='')
+        return self.store.pmids_for_citation(journal=inp_dict['journal_title'], year=inp_dict['year'],
+                                             volume=inp_dict['volume'], first_page=inp_dict['first_page'],
+                                             author=author)
+
+    def _local_batch_pmids_for_citation(self, citations, debug=False):
+        pmids = []
+        for citation in citations:
+            pmids.extend(self._local_pmids_for_citation(**citation))
+        return pmids
 
     def _eutils_article_by_pmid(self, pmid):
         pmid = str(pmid)
         try:
-            result = self.qs.efetch('pubmed', pmid)
+            result = self.qs.efetch({'db': 'pubmed', 'id': pmid})
         except EutilsRequestError:
             raise MetaPubError('Invalid ID "%s" (rejected by Eutils); please check the number and try again.' % pmid)
         if result is None:
             return None
-        # if result.find('ERROR') > -1:
-        #    raise MetaPubError('PMID %s returned ERROR; cannot construct PubMedArticle' % pmid)
-        pma = iter(result).next()
+        pma = PubMedArticle(result)
         if pma.pmid is None:
             raise InvalidPMID('Pubmed ID "%s" not found' % pmid)
         return pma
 
+    def _eutils_articles_by_pmids(self, pmids, chunk_size=200, processes=None):
+        '''Yields PubMedArticle objects for the supplied pubmed IDs, requesting them
+        from eutils in batches of `chunk_size` PMIDs per efetch (rather than one
+        request per PMID). Articles are yielded in the order eutils returns them.
+
+        PMIDs that are malformed, rejected by eutils, or absent from the efetch
+        result do not raise an exception; they are logged and collected in
+        self.last_missing_pmids (reset on each call), so check that list once
+        the generator is exhausted.
+
+        With `processes` (a number of worker processes, or a parsepool.ParsePool),
+        articles are parsed in worker processes and yielded as PubMedRecords.
+
+        :param: pmids (list of strings or ints)
+        :param: chunk_size (int) default 200
+        :param: processes (int or ParsePool) default None (parse in this process)
+        :return: generator of PubMedArticle objects (PubMedRecords with processes)
+        '''
+        return _parsed(self._eutils_xml_for_pmids(pmids, chunk_size), processes)
+
+    def _eutils_xml_for_pmids(self, pmids, chunk_size):
+        self.last_missing_pmids = []
+
+        wanted = []
+        seen = set()
+        for pmid in pmids:
+            pmid = str(pmid).strip()
+            if not pmid.isdigit():
+                self._log.debug('Skipping invalid PMID "%s"', pmid)
+                self.last_missing_pmids.append(pmid)
+            elif pmid not in seen:
+                seen.add(pmid)
+                wanted.append(pmid)
+
+        for idx in range(0, len(wanted), chunk_size):
+            chunk = wanted[idx:idx + chunk_size]
+            try:
+                result = self.qs.efetch({'db': 'pubmed', 'id': ','.join(chunk)})
+            except EutilsRequestError as error:
+                self._log.info('efetch of %i PMIDs rejected by Eutils: %r', len(chunk), error)
+                self.last_missing_pmids.extend(chunk)
+                continue
+
+            found = set()
+            for pmid, xml in split_pubmed_article_set(result):
+                found.add(pmid)
+                yield xml
+
+            missing = [pmid for pmid in chunk if pmid not in found]
+            if missing:
+                self._log.debug('%i PMIDs not found: %s', len(missing), ', '.join(missing))
+                self.last_missing_pmids.extend(missing)
+
     def _eutils_article_by_pmcid(self, pmcid):
         # if user submitted a bare number, prepend "PMC" to make sure it is submitted correctly
         # the conversion API at pubmedcentral.
@@ -110,6 +333,59 @@ class PubMedFetcher(Borg):
         return self._eutils_article_by_pmid(pmid)
 
 
+    def _eutils_articles_by_pmcids(self, pmcids, chunk_size=200, processes=None):
+        '''Yields PubMedArticle objects for a list of PubMed Central IDs, converting
+        them to PMIDs in batches via the PMC ID conversion API (see
+        pubmedcentral.batch_convert_ids) and then fetching them as articles_by_pmids
+        does. Bare numbers are taken to be PMCIDs (i.e. "PMC" is prepended).
+
+        PMCIDs with no PMID, and PMIDs not found, end up in self.last_missing_pmids
+        (as PMCIDs and PMIDs respectively) once the generator is exhausted.
+
+        :param: pmcids (list of strings or ints)
+        :param: chunk_size (int) default 200
+        :param: processes (int or ParsePool) see articles_by_pmids
+        :return: generator of PubMedArticle objects
+        '''
+        normalized = []
+        for pmcid in pmcids:
+            pmcid = str(pmcid).strip()
+            if pmcid.isdigit():
+                pmcid = 'PMC' + pmcid
+            normalized.append(pmcid)
+        return self._articles_for_otherids(normalized, chunk_size, processes)
+
+    def _eutils_articles_by_dois(self, dois, chunk_size=200, processes=None):
+        '''Yields PubMedArticle objects for a list of DOIs, converting them to PMIDs
+        in batches via the PMC ID conversion API (see pubmedcentral.batch_convert_ids)
+        and then fetching them as articles_by_pmids does.
+
+        DOIs with no PMID, and PMIDs not found, end up in self.last_missing_pmids
+        (as DOIs and PMIDs respectively) once the generator is exhausted.
+
+        Note: the ID conversion API only knows DOIs of articles in PubMed Central.
+
+        :param: dois (list of strings)
+        :param: chunk_size (int) default 200
+        :param: processes (int or ParsePool) see articles_by_pmids
+        :return: generator of PubMedArticle objects
+        '''
+        return self._articles_for_otherids([str(doi).strip() for doi in dois], chunk_size, processes)
+
+    def _articles_for_otherids(self, otherids, chunk_size, processes=None):
+        conversions = batch_convert_ids(otherids, cachedir=self._cachedir)
+        pmids = []
+        unconverted = []
+        for otherid in otherids:
+            pmid = conversions[otherid]['pmid']
+            if pmid is None:
+                unconverted.append(otherid)
+            else:
+                pmids.append(pmid)
+        for pma in self._eutils_articles_by_pmids(pmids, chunk_size=chunk_size, processes=processes):
+            yield pma
+        self.last_missing_pmids = unconverted + self.last_missing_pmids
+
     def _eutils_pmids_for_dois(self, dois,  retstart=0, retmax=500, debug=False):
         '''batch search for article pmids given a list of dois
 
@@ -134,8 +410,8 @@ class PubMedFetcher(Borg):
         if debug:
             print(query)
 
-        result = self.qs.esearch('pubmed', query)
-        return result.ids
+        result = self.qs.esearch({'db': 'pubmed', 'term': query, 'retstart': retstart, 'retmax': retmax})
+        return parse_esearch_result(result)
 
 
     def _eutils_pmids_for_query(self, query='', since=None, until=None, retstart=0, retmax=250,
@@ -165,115 +441,107 @@ class PubMedFetcher(Borg):
         :param: pmc_only (bool) default False  # constructs query to only search Pubmed Central.
         '''
 
-        # lowercase all the things.
-        kwargs = lowercase_keys(kwargs)
-
-        q = {}
-
-        query = query.strip()
-        # if we find brackets in the query string, assume they are query keyword tags.
-        # otherwise, submit the query string with an "ALL" keyword tag.
-        # if query.find('[') == -1 and not kwargs.get('clinical_query', False):
-        # if this query is surrounded in quotation marks, consider it an "exact match"
-        # search against "ALL" fields. Otherwise, leave it untouched.
-        if query and query[0] in ['"', "'"]:
-            q['ALL'] = query.replace('"', '').replace("'", '')
-
-        # Search within date range (since / until)
-        #
-        # working examples. search by creation date only works within defined ranges (not "< X" or "> Y")
-        # ("2015/3/1"[Date - Create] : "2015/3/3"[Date - Create])
-        # ("2015/2/14"[CRDT] : "2015/3/14"[CRDT])
-        created_date_template = '"%s"[CRDT]'
-        date_range_template = " (%s : %s)"
-        if since:
-            start = created_date_template % since
-            if until:
-                end = created_date_template % until
-            else:
-                end = '"3000"[CRDT]'
-
-            query += date_range_template % (start, end)
-
-        # unique ID referents.
-        q['PMID'] = kpick(kwargs, options=['pmid', 'uid', 'pubmed_id'])
-        q['AID'] = kpick(kwargs, options=['aid', 'doi'])
-        q['book'] = kwargs.get('book', None)
-        q['JID'] = kpick(kwargs, options=['jid', 'nlm uid', 'nlm unique id'])
-        q['ISBN'] = kwargs.get('ISBN', None)
-        q['RN'] = kpick(kwargs, options=['rn', 'rcn', 'ecn'])
-        q['GR'] = kpick(kwargs, options=['gr', 'grant number'])
-
-        # Pubmed Date features:
-        q['DA'] = kpick(kwargs, options=['da', 'date created'])
-        q['LR'] = kpick(kwargs, options=['lr', 'date revised', 'date last revised'])
-        q['EDAT'] = kpick(kwargs, options=['edat', 'entrez date'])
-
-        # Journal name:
-        q['TA'] = kpick(kwargs, options=['ta', 'journal', 'jtitle', 'journal_title'])
-
-        # Article-level characteristics (title, authors, etc):
-        q['TIAB'] = kpick(kwargs, options=['tiab', 'abstract', 'title/abstract'])
-        q['TI'] = kpick(kwargs, options=['ti', 'title', 'atitle', 'article_title'])
-        q['TT'] = kpick(kwargs, options=['tt', 'transliterated title'])
-
-        q['AU'] = kpick(kwargs, options=['au', 'author'])
-        q['1AU'] = kpick(kwargs, options=['1au', 'aulast', 'author1_lastfm', 'author1_last_fm'])
-        q['FAU'] = kpick(kwargs, options=['fau', 'first_author', 'author1'])
-        q['LASTAU'] = kpick(kwargs, options=['lastau', 'last author'])
-        q['CN'] = kpick(kwargs, options=['cn', 'corporate author'])
-        q['FIR'] = kpick(kwargs, options=['fir', 'full investigator name'])
-        q['IR'] = kpick(kwargs, options=['ir', 'investigator'])
-        q['PG'] = kpick(kwargs, options=['pg', 'pages', 'spage', 'first_page'])
-
-        # Volume / Issue characteristics
-        q['IP'] = kpick(kwargs, options=['ip', 'issue'])
-        q['VTI'] = kpick(kwargs, options=['vta', 'volume title'])
-        q['VI'] = kpick(kwargs, options=['vi', 'volume', 'vol'])
-
-        # Content characteristics
-        q['LA'] = kpick(kwargs, options=['la', 'language'])
-        q['TW'] = kpick(kwargs, options=['tw', 'text'])
-        q['PS'] = kpick(kwargs, options=['ps', 'personal name as subject'])
-        q['PA'] = kpick(kwargs, options=['pa', 'pharmacological action'])
-        q['SB'] = kpick(kwargs, options=['sb', 'subset'])
-        q['NM'] = kpick(kwargs, options=['nm', 'supplementary concept'])
-
-        # MeSH characteristics
-        q['MHDA'] = kpick(kwargs, options=['mhda', 'mesh date'])
-        q['MH'] = kpick(kwargs, options=['mh', 'mesh', 'mesh terms'])
-        q['MAJR'] = kpick(kwargs, options=['majr', 'mesh major topic', 'mesh major'])
-        q['SH'] = kpick(kwargs, options=['sh', 'mesh subheadings'])
-
-        # Publication characteristics
-        q['DCOM'] = kpick(kwargs, options=['dcom', 'completion date'])
-        q['DP'] = kpick(kwargs, options=['dp', 'date of publication', 'year',
-                                         'pdat'])  # most aligned w/ PubMedArticle.year and CrossRef 'year'
-        q['LID'] = kpick(kwargs, options=['lid', 'location id', 'location identifier'])
-        q['PUBN'] = kpick(kwargs, options=['pubn', 'publisher'])
-        q['PT'] = kpick(kwargs, options=['pt', 'pubmed_type', 'publication type'])
-        q['PL'] = kpick(kwargs, options=['pl', 'place of publication'])
-
-        # Miscellaneous, alphabetized by Medline feature tag.
-        q['AD'] = kpick(kwargs, options=['ad', 'affiliation'])
-        q['OT'] = kpick(kwargs, options=['ot', 'other term'])
-        q['NM'] = kpick(kwargs, options=['nm', 'substance name'])
-        q['SI'] = kpick(kwargs, options=['si', 'secondary source id'])
-
-        for feature in q.keys():
-            if q[feature] != None:
-                query += ' "%s"[%s]' % (q[feature], feature)
-
-        # option to query pubmed central only:
-        # pubmed pmc[sb]
-        if pmc_only:
-            query += ' "pubmed pmc"[sb]'
+        query = build_pubmed_query(query, since=since, until=until, pmc_only=pmc_only, **kwargs)
+
+        if kwargs.get('debug', False):
+            print(query)
+
+        result = self.qs.esearch({'db': 'pubmed', 'term': query, 'retstart': retstart, 'retmax': retmax})
+        return parse_esearch_result(result)
+
+    def _eutils_history_for_query(self, query='', since=None, until=None, pmc_only=False, **kwargs):
+        '''runs the given query (see pmids_for_query for parameters) through esearch
+        once, leaving the result set on the NCBI History server rather than
+        downloading PMIDs. Returns a dictionary describing the stored result set:
+
+            count       (int) number of PMIDs matching the query
+            webenv      (str) the WebEnv of the result set
+            query_key   (str) the query_key of the result set
+            query       (str) the query string as submitted to esearch
+
+        The dictionary is also kept in self.last_history.  Pass it to pmids_from_history
+        or articles_from_history to page through the result set. (History server result
+        sets expire after a few hours, so these requests are never cached.)
+
+        :return: history (dict)
+        '''
+        query = build_pubmed_query(query, since=since, until=until, pmc_only=pmc_only, **kwargs)
 
         if kwargs.get('debug', False):
             print(query)
 
-        result = self.qs.esearch('pubmed',  query)
-        return result.ids
+        result = self.qs.esearch_history({'db': 'pubmed', 'term': query, 'retmax': 0})
+        dom = etree.fromstring(result)
+        self.last_history = {'count': int(dom.findtext('Count', default='0')),
+                             'webenv': dom.findtext('WebEnv'),
+                             'query_key': dom.findtext('QueryKey'),
+                             'query': query,
+                             }
+        return self.last_history
+
+    def _eutils_pmids_from_history(self, history, batch_size=10000):
+        '''Yields the PMIDs of a History server result set (see history_for_query),
+        requesting `batch_size` PMIDs at a time, so that result sets of any size can
+        be streamed in bounded memory.
+
+        :param: history (dict) as returned by history_for_query
+        :param: batch_size (int) default 10000
+        :return: generator of pmids (strings)
+        '''
+        for retstart in range(0, history['count'], batch_size):
+            result = self.qs.efetch_history({'db': 'pubmed', 'rettype': 'uilist',
+                                             'WebEnv': history['webenv'],
+                                             'query_key': history['query_key'],
+                                             'retstart': retstart, 'retmax': batch_size})
+            for item in etree.fromstring(result).iter('Id'):
+                yield item.text.strip()
+
+    def _eutils_articles_from_history(self, history, batch_size=200, processes=None):
+        '''Yields PubMedArticle objects for a History server result set (see
+        history_for_query), requesting `batch_size` articles per efetch.
+
+        :param: history (dict) as returned by history_for_query
+        :param: batch_size (int) default 200
+        :param: processes (int or ParsePool) see articles_by_pmids
+        :return: generator of PubMedArticle objects
+        '''
+        return _parsed(self._eutils_xml_from_history(history, batch_size), processes)
+
+    def _eutils_xml_from_history(self, history, batch_size):
+        for retstart in range(0, history['count'], batch_size):
+            result = self.qs.efetch_history({'db': 'pubmed',
+                                             'WebEnv': history['webenv'],
+                                             'query_key': history['query_key'],
+                                             'retstart': retstart, 'retmax': batch_size})
+            for pmid, xml in split_pubmed_article_set(result):
+                yield xml
+
+    def iter_pmids_for_query(self, query='', batch_size=10000, **kwargs):
+        '''Like pmids_for_query, but without a cap on the number of results:
+        runs the query once via history_for_query and yields every matching PMID,
+        `batch_size` at a time.
+
+        :param: query (string) default ''
+        :param: batch_size (int) default 10000
+        :return: generator of pmids (strings)
+        '''
+        history = self.history_for_query(query, **kwargs)
+        return self.pmids_from_history(history, batch_size=batch_size)
+
+    def iter_articles_for_query(self, query='', batch_size=200, processes=None, **kwargs):
+        '''Runs the query once via history_for_query and yields a PubMedArticle
+        for every matching PMID, fetching `batch_size` articles per efetch.
+
+            for paper in fetch.iter_articles_for_query(mesh='Cystic Fibrosis'):
+                ...
+
+        :param: query (string) default ''
+        :param: batch_size (int) default 200
+        :param: processes (int or ParsePool) see articles_by_pmids
+        :return: generator of PubMedArticle objects
+        '''
+        history = self.history_for_query(query, **kwargs)
+        return self.articles_from_history(history, batch_size=batch_size, processes=processes)
 
     def pmids_for_clinical_query(self, query, category, optimization='broad',
                                  since=None, until=None, retstart=0, retmax=250, pmc_only=False, **kwargs):
@@ -339,7 +607,7 @@ class PubMedFetcher(Borg):
         return self.pmids_for_query(query, retstart=retstart, retmax=retmax, since=since, until=until, **kwargs)
 
 
-    def pmids_for_citation(self,**kwargs):
+    def _eutils_pmids_for_citation(self, **kwargs):
         '''returns list of pmids for given citation. requires at least 3/5 of these keyword arguments:
             jtitle or journal (journal title)
             year or date
@@ -357,36 +625,13 @@ class PubMedFetcher(Borg):
 
         base_uri = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/ecitmatch.cgi?'
         params = {'db': 'pubmed', 'retmode': 'xml', 'bdata': ''}
-        kwargs = lowercase_keys(kwargs)
-
-        # accept 'journal-title' key from CrossRef
-        journal_title = remove_chars(
-            kpick(kwargs, options=['jtitle', 'journal', 'journal_title', 'journal-title'], default=''), urldecode=True)
-        author_name = _reduce_author_string(kpick(kwargs,
-                                                  options=['aulast', 'author1_last_fm', 'author', 'authors'],
-                                                  default=''))
-        # accept 'first-page' key from CrossRef 'references' list items
-        first_page = kpick(kwargs, options=['spage', 'first_page', 'first-page'], default='')
-        year = kpick(kwargs, options=['year', 'date', 'pdat'], default='')
-        volume = kpick(kwargs, options=['volume'], default='')
-
-        inp_dict = {'journal_title': journal_title,
-                    'year': str(year),
-                    'volume': str(volume),
-                    'first_page': str(first_page),
-                    'author_name': author_name,
-                    }
+        inp_dict = _citation_details(kwargs)
 
-        if kwargs.get('debug', False):
+        if lowercase_keys(kwargs).get('debug', False):
             print('Submitted to pmids_for_citation: %r' % inp_dict)
 
-        # clean up any "n/a" values.  eutils doesn't understand them.
-        for k in inp_dict:
-            if inp_dict[k].lower() == 'n/a':
-                inp_dict[k] = ''
-
         params['bdata'] = '{journal_title}|{year}|{volume}|{first_page}|{author_name}|'.format(**inp_dict)
-        content = requests.post(base_uri, params=params).text
+        content = self._ecitmatch('POST', base_uri, params).text
         pmids = []
         for item in content.split('\n'):
             if item.strip():
@@ -394,7 +639,7 @@ class PubMedFetcher(Borg):
                 pmids.append(pmid.strip())
         return pmids
 
-    def batch_pmids_for_citation(self, citations, debug=False):
+    def _eutils_batch_pmids_for_citation(self, citations, debug=False):
         '''returns list of pmids for batch of citations. requires at least 3/5 of these keyword arguments:
             jtitle or journal (journal title)
             year or date
@@ -451,8 +696,10 @@ class PubMedFetcher(Borg):
             while len(params['bdata']) < 1900 and len(joined) > 0:
                 params['bdata']+= joined[-1]+'\r'
                 joined.pop()
-            req = requests.get(base_uri, params=params)
-            if req.status_code == 200:
+            req = self._ecitmatch('GET', base_uri, params)
+            if req.status_code != 200:
+                self._log.warning('ecitmatch failed (%i) for a batch of citations', req.status_code)
+            else:
                 content = req.text
                 if debug:
                     print(content)
@@ -464,6 +711,14 @@ class PubMedFetcher(Borg):
                 break
         return pmids
 
+    def _ecitmatch(self, method, base_uri, params):
+        # ecitmatch isn't covered by the eutils client, so apply NCBI's rate limit
+        # and retries (and api_key) here.
+        api_key = getattr(self.qs, 'api_key', None)
+        if api_key:
+            params = dict(params, api_key=api_key)
+        return ratelimit.request(method, base_uri, params=params, api_key=api_key)
+
     def related_pmids(self, pmid):
         '''For supplied pmid, return related ids of related pubmed articles,
         organized into a dictionary keyed by type of relation.  The keys include:
@@ -483,6 +738,153 @@ class PubMedFetcher(Borg):
         return outd
 
 
+def build_pubmed_query(query='', since=None, until=None, pmc_only=False, **kwargs):
+    '''returns a Pubmed Advanced Query string built from the given freeform query
+    string plus keyword arguments. (See PubMedFetcher.pmids_for_query for details.)
+
+    :param: query (string) default ''
+    :param: since (string) default None  # Y/m/d format expected. Y alone or Y/m allowed.
+    :param: until (string) default None  # Y/m/d format expected. Y alone or Y/m allowed.
+    :param: pmc_only (bool) default False  # constructs query to only search Pubmed Central.
+    :return: query (string)
+    '''
+    # lowercase all the things.
+    kwargs = lowercase_keys(kwargs)
+
+    q = {}
+
+    query = query.strip()
+    # if we find brackets in the query string, assume they are query keyword tags.
+    # otherwise, submit the query string with an "ALL" keyword tag.
+    # if query.find('[') == -1 and not kwargs.get('clinical_query', False):
+    # if this query is surrounded in quotation marks, consider it an "exact match"
+    # search against "ALL" fields. Otherwise, leave it untouched.
+    if query and query[0] in ['"', "'"]:
+        q['ALL'] = query.replace('"', '').replace("'", '')
+
+    # Search within date range (since / until)
+    #
+    # working examples. search by creation date only works within defined ranges (not "< X" or "> Y")
+    # ("2015/3/1"[Date - Create] : "2015/3/3"[Date - Create])
+    # ("2015/2/14"[CRDT] : "2015/3/14"[CRDT])
+    created_date_template = '"%s"[CRDT]'
+    date_range_template = " (%s : %s)"
+    if since:
+        start = created_date_template % since
+        if until:
+            end = created_date_template % until
+        else:
+            end = '"3000"[CRDT]'
+
+        query += date_range_template % (start, end)
+
+    # unique ID referents.
+    q['PMID'] = kpick(kwargs, options=['pmid', 'uid', 'pubmed_id'])
+    q['AID'] = kpick(kwargs, options=['aid', 'doi'])
+    q['book'] = kwargs.get('book', None)
+    q['JID'] = kpick(kwargs, options=['jid', 'nlm uid', 'nlm unique id'])
+    q['ISBN'] = kwargs.get('ISBN', None)
+    q['RN'] = kpick(kwargs, options=['rn', 'rcn', 'ecn'])
+    q['GR'] = kpick(kwargs, options=['gr', 'grant number'])
+
+    # Pubmed Date features:
+    q['DA'] = kpick(kwargs, options=['da', 'date created'])
+    q['LR'] = kpick(kwargs, options=['lr', 'date revised', 'date last revised'])
+    q['EDAT'] = kpick(kwargs, options=['edat', 'entrez date'])
+
+    # Journal name:
+    q['TA'] = kpick(kwargs, options=['ta', 'journal', 'jtitle', 'journal_title'])
+
+    # Article-level characteristics (title, authors, etc):
+    q['TIAB'] = kpick(kwargs, options=['tiab', 'abstract', 'title/abstract'])
+    q['TI'] = kpick(kwargs, options=['ti', 'title', 'atitle', 'article_title'])
+    q['TT'] = kpick(kwargs, options=['tt', 'transliterated title'])
+
+    q['AU'] = kpick(kwargs, options=['au', 'author'])
+    q['1AU'] = kpick(kwargs, options=['1au', 'aulast', 'author1_lastfm', 'author1_last_fm'])
+    q['FAU'] = kpick(kwargs, options=['fau', 'first_author', 'author1'])
+    q['LASTAU'] = kpick(kwargs, options=['lastau', 'last author'])
+    q['CN'] = kpick(kwargs, options=['cn', 'corporate author'])
+    q['FIR'] = kpick(kwargs, options=['fir', 'full investigator name'])
+    q['IR'] = kpick(kwargs, options=['ir', 'investigator'])
+    q['PG'] = kpick(kwargs, options=['pg', 'pages', 'spage', 'first_page'])
+
+    # Volume / Issue characteristics
+    q['IP'] = kpick(kwargs, options=['ip', 'issue'])
+    q['VTI'] = kpick(kwargs, options=['vta', 'volume title'])
+    q['VI'] = kpick(kwargs, options=['vi', 'volume', 'vol'])
+
+    # Content characteristics
+    q['LA'] = kpick(kwargs, options=['la', 'language'])
+    q['TW'] = kpick(kwargs, options=['tw', 'text'])
+    q['PS'] = kpick(kwargs, options=['ps', 'personal name as subject'])
+    q['PA'] = kpick(kwargs, options=['pa', 'pharmacological action'])
+    q['SB'] = kpick(kwargs, options=['sb', 'subset'])
+    q['NM'] = kpick(kwargs, options=['nm', 'supplementary concept'])
+
+    # MeSH characteristics
+    q['MHDA'] = kpick(kwargs, options=['mhda', 'mesh date'])
+    q['MH'] = kpick(kwargs, options=['mh', 'mesh', 'mesh terms'])
+    q['MAJR'] = kpick(kwargs, options=['majr', 'mesh major topic', 'mesh major'])
+    q['SH'] = kpick(kwargs, options=['sh', 'mesh subheadings'])
+
+    # Publication characteristics
+    q['DCOM'] = kpick(kwargs, options=['dcom', 'completion date'])
+    q['DP'] = kpick(kwargs, options=['dp', 'date of publication', 'year',
+                                     'pdat'])  # most aligned w/ PubMedArticle.year and CrossRef 'year'
+    q['LID'] = kpick(kwargs, options=['lid', 'location id', 'location identifier'])
+    q['PUBN'] = kpick(kwargs, options=['pubn', 'publisher'])
+    q['PT'] = kpick(kwargs, options=['pt', 'pubmed_type', 'publication type'])
+    q['PL'] = kpick(kwargs, options=['pl', 'place of publication'])
+
+    # Miscellaneous, alphabetized by Medline feature tag.
+    q['AD'] = kpick(kwargs, options=['ad', 'affiliation'])
+    q['OT'] = kpick(kwargs, options=['ot', 'other term'])
+    q['NM'] = kpick(kwargs, options=['nm', 'substance name'])
+    q['SI'] = kpick(kwargs, options=['si', 'secondary source id'])
+
+    for feature in q.keys():
+        if q[feature] != None:
+            query += ' "%s"[%s]' % (q[feature], feature)
+
+    # option to query pubmed central only:
+    # pubmed pmc[sb]
+    if pmc_only:
+        query += ' "pubmed pmc"[sb]'
+    return query
+
+
+def _citation_details(kwargs):
+    """ returns dict of citation details (journal_title, year, volume, first_page, author_name)
+    picked out of pmids_for_citation keyword arguments, with "n/a" values blanked out.
+    """
+    kwargs = lowercase_keys(kwargs)
+
+    # accept 'journal-title' key from CrossRef
+    journal_title = remove_chars(
+        kpick(kwargs, options=['jtitle', 'journal', 'journal_title', 'journal-title'], default=''), urldecode=True)
+    author_name = _reduce_author_string(kpick(kwargs,
+                                              options=['aulast', 'author1_last_fm', 'author', 'authors'],
+                                              default=''))
+    # accept 'first-page' key from CrossRef 'references' list items
+    first_page = kpick(kwargs, options=['spage', 'first_page', 'first-page'], default='')
+    year = kpick(kwargs, options=['year', 'date', 'pdat'], default='')
+    volume = kpick(kwargs, options=['volume'], default='')
+
+    inp_dict = {'journal_title': journal_title,
+                'year': str(year),
+                'volume': str(volume),
+                'first_page': str(first_page),
+                'author_name': author_name,
+                }
+
+    # clean up any "n/a" values.  eutils doesn't understand them.
+    for k in inp_dict:
+        if inp_dict[k].lower() == 'n/a':
+            inp_dict[k] = ''
+    return inp_dict
+
+
 def _reduce_author_string(author_string):
     # try splitting by commas
     authors = author_string.split(',')
@@ -0,0 +1,257 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.pubmedrecord -- compact records of parsed PubMed articles
+
+A PubMedArticle keeps its XML, its lxml tree, PubMedAuthor objects holding live
+elements and a __dict__ of ~50 attributes: tens of KB per article. A PubMedRecord
+holds the same values in __slots__, with lists and dicts turned into tuples and
+the strings repeated across articles (journal, ISSN, MeSH and chemical names,
+publication types, grant agencies...) shared, so millions of them fit in memory:
+
+    record = pma.to_record()          # or PubMedRecord.from_article(pma)
+    del pma                           # XML and tree can now be freed
+
+    record.journal, record.doi, record.mesh[0].descriptor_name
+
+to_dict() returns the values in the same form as PubMedArticle.to_dict() (lists
+and dicts), except that author_list holds dicts rather than PubMedAuthor objects;
+PubMedRecord.from_dict() makes a record from such a dict, so that
+
+    PubMedRecord.from_dict(record.to_dict()) == record
+
+Records are picklable (compactly), so they can be passed between processes.
+'''
+
+import six
+
+from collections import namedtuple
+
+AuthorRecord = namedtuple('AuthorRecord', ['last_name', 'fore_name', 'initials', 'collective_name',
+                                           'affiliations'])
+MeshRecord = namedtuple('MeshRecord', ['ui', 'descriptor_name', 'major_topic', 'qualifier_name', 'qualifier_ui'])
+ChemicalRecord = namedtuple('ChemicalRecord', ['ui', 'substance_name', 'registry_number'])
+
+# attributes of PubMedArticle held by a record (authors_str, author1_last_fm,
+# author1_lastfm and url are computed from others, as PubMedArticle does).
+RECORD_FIELDS = ('pubmed_type', 'pmid', 'authors', 'author_list', 'title',
+                 'pages', 'first_page', 'last_page', 'volume', 'issue', 'volume_issue',
+                 'doi', 'pii', 'pmc', 'issn', 'mesh', 'chemicals', 'grants', 'publication_types',
+                 'book_accession_id', 'book_title', 'book_publisher', 'book_language', 'book_editors',
+                 'book_abstracts', 'book_sections', 'book_copyright', 'book_medium', 'book_synonyms',
+                 'book_publication_status', 'book_history', 'book_contribution_date', 'book_date_revised',
+                 'abstract', 'journal', 'year', 'history')
+
+DERIVED_FIELDS = ('url', 'authors_str', 'author1_last_fm', 'author1_lastfm')
+
+_INTERNED = {}
+
+
+def intern_string(value):
+    """ returns the one shared copy of string value (None stays None). Works for the
+    unicode strings of py2 as well, unlike sys.intern.
+    """
+    if value is None:
+        return None
+    return _INTERNED.setdefault(value, value)
+
+
+def _tuple_of(items):
+    return None if items is None else tuple(items)
+
+
+# field: (to record form, from record form). Fields not listed are stored as they are.
+def _pack_author_list(authors):
+    if authors is None:
+        return None
+    packed = []
+    for au in authors:
+        get = au.get if isinstance(au, dict) else lambda name: getattr(au, name, None)
+        packed.append(AuthorRecord(get('last_name'), get('fore_name'), get('initials'),
+                                   intern_string(get('collective_name')),
+                                   tuple(get('affiliations') or ())))
+    return tuple(packed)
+
+
+def _unpack_author_list(authors):
+    if authors is None:
+        return None
+    return [dict(au._asdict(), affiliations=list(au.affiliations)) for au in authors]
+
+
+def _pack_mesh(mesh):
+    if mesh is None:
+        return None
+    return tuple(MeshRecord(intern_string(ui), intern_string(item['descriptor_name']), item['major_topic'],
+                            intern_string(item['qualifier_name']), intern_string(item['qualifier_ui']))
+                 for ui, item in mesh.items())
+
+
+def _unpack_mesh(mesh):
+    if mesh is None:
+        return None
+    return dict((item.ui, {'descriptor_name': item.descriptor_name, 'major_topic': item.major_topic,
+                           'qualifier_name': item.qualifier_name, 'qualifier_ui': item.qualifier_ui})
+                for item in mesh)
+
+
+def _pack_chemicals(chemicals):
+    if chemicals is None:
+        return None
+    return tuple(ChemicalRecord(intern_string(ui), intern_string(item['substance_name']),
+                                intern_string(item['registry_number']))
+                 for ui, item in chemicals.items())
+
+
+def _unpack_chemicals(chemicals):
+    if chemicals is None:
+        return None
+    return dict((item.ui, {'substance_name': item.substance_name, 'registry_number': item.registry_number})
+                for item in chemicals)
+
+
+def _pack_pairs(mapping):
+    """ dict -> tuple of (key, value) pairs, strings interned. """
+    if mapping is None:
+        return None
+    return tuple((intern_string(key), intern_string(value) if isinstance(value, six.string_types) else value)
+                 for key, value in mapping.items())
+
+
+def _unpack_pairs(pairs):
+    return None if pairs is None else dict(pairs)
+
+
+def _pack_grants(grants):
+    if grants is None:
+        return None
+    return tuple((intern_string(grant['agency']), intern_string(grant['country'])) for grant in grants)
+
+
+def _unpack_grants(grants):
+    if grants is None:
+        return None
+    return [{'agency': agency, 'country': country} for agency, country in grants]
+
+
+def _unpack_list(items):
+    return None if items is None else list(items)
+
+
+_CONVERTERS = {
+    'pubmed_type': (intern_string, None),
+    'authors': (_tuple_of, _unpack_list),
+    'author_list': (_pack_author_list, _unpack_author_list),
+    'journal': (intern_string, None),
+    'issn': (intern_string, None),
+    'year': (intern_string, None),
+    'mesh': (_pack_mesh, _unpack_mesh),
+    'chemicals': (_pack_chemicals, _unpack_chemicals),
+    'publication_types': (_pack_pairs, _unpack_pairs),
+    'grants': (_pack_grants, _unpack_grants),
+    'history': (_pack_pairs, _unpack_pairs),
+    'book_editors': (_tuple_of, _unpack_list),
+    'book_history': (_pack_pairs, _unpack_pairs),
+    'book_language': (intern_string, None),
+    'book_medium': (intern_string, None),
+    'book_publication_status': (intern_string, None),
+}
+
+
+class PubMedRecord(object):
+    """ The parsed attributes of a PubMedArticle, without its XML (see module docstring).
+
+    Usually made with PubMedArticle.to_record() or PubMedRecord.from_article(pma).
+    Attribute names are those of PubMedArticle; list and dict attributes are tuples
+    here (mesh and chemicals of MeshRecord and ChemicalRecord tuples, author_list of
+    AuthorRecord tuples, publication_types and history of (key, value) pairs).
+
+    :param values: values of RECORD_FIELDS (in record form), in that order
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, *values):
+        for name, value in six.moves.zip_longest(RECORD_FIELDS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_article(cls, pma, drop=()):
+        """ returns a PubMedRecord of pma's attributes (parsing any not yet parsed).
+
+        :param pma: PubMedArticle
+        :param drop: names of fields not to keep (set to None), e.g. ('abstract', )
+        """
+        return cls(*[None if name in drop else _pack(name, getattr(pma, name)) for name in RECORD_FIELDS])
+
+    @classmethod
+    def from_dict(cls, outd):
+        """ returns a PubMedRecord from a dict as returned by to_dict() (or by
+        PubMedArticle.to_dict()). Missing keys are taken as None.
+        """
+        return cls(*[_pack(name, outd.get(name)) for name in RECORD_FIELDS])
+
+    def to_dict(self):
+        """ returns dict of all attributes (derived ones included), as PubMedArticle.to_dict(). """
+        outd = {}
+        for name in RECORD_FIELDS:
+            value = getattr(self, name)
+            unpack = _CONVERTERS.get(name, (None, None))[1]
+            outd[name] = value if unpack is None else unpack(value)
+        for name in DERIVED_FIELDS:
+            outd[name] = getattr(self, name)
+        return outd
+
+    @property
+    def url(self):
+        return 'https://ncbi.nlm.nih.gov/pubmed/' + str(self.pmid)
+
+    @property
+    def authors_str(self):
+        return '; '.join(self.authors or ())
+
+    @property
+    def author1_last_fm(self):
+        return self.authors[0] if self.authors else None
+
+    @property
+    def author1_lastfm(self):
+        return None if self.author1_last_fm is None else self.author1_last_fm.replace(' ', '')
+
+    def __reduce__(self):
+        return (_unpickle_record, tuple(getattr(self, name) for name in RECORD_FIELDS))
+
+    def __eq__(self, other):
+        if not isinstance(other, PubMedRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in RECORD_FIELDS)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'PubMedRecord(pmid=%r, journal=%r, year=%r)' % (self.pmid, self.journal, self.year)
+
+    def __str__(self):
+        if self.pubmed_type == 'article':
+            return '%s (%s. %s, %s:%s)' % (
+                 self.title, self.authors_str, self.journal, self.volume_issue, self.pages)
+        else:
+            return '%s (%s. %s, %s)' % (self.title, self.authors_str, self.book_title, self.year)
+
+
+def _pack(name, value):
+    pack = _CONVERTERS.get(name, (None, None))[0]
+    return value if pack is None else pack(value)
+
+
+def _unpickle_record(*values):
+    # re-share the interned top-level strings (journal, year...) when records are
+    # unpickled, e.g. after being passed from another process.
+    values = list(values)
+    for idx, name in enumerate(RECORD_FIELDS):
+        if _CONVERTERS.get(name, (None, ))[0] is intern_string:
+            values[idx] = intern_string(values[idx])
+    return PubMedRecord(*values)
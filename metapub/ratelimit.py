@@ -0,0 +1,315 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.ratelimit -- process-wide rate limiting and retry/backoff for remote services
+
+Every request metapub makes to NCBI (eutils, ecitmatch, the PMC ID conversion API)
+goes through `request()`, which
+
+    * takes a token from the bucket for the request's host, sleeping if necessary;
+    * retries connection errors and 429/5xx replies with jittered exponential
+      backoff (honouring any Retry-After header).
+
+Hosts are grouped under a policy (all NCBI hosts share the "ncbi" policy, as NCBI
+counts requests per IP address or api_key across its services). Each policy has
+one bucket, used by requests with and without an api_key alike: it runs at the
+unkeyed rate until a request with an api_key is made, and at the keyed rate from
+then on, so a process mixing keyed and unkeyed clients never exceeds the keyed
+rate in total. Policies can be tuned or added with configure_host():
+
+    from metapub import ratelimit
+    ratelimit.configure_host('ncbi', retries=8, backoff_cap=120)
+    ratelimit.configure_host('api.crossref.org', rate=20)
+
+Buckets are thread-safe. Where possible their state lives in shared memory, so
+worker processes forked after a bucket is created (e.g. multiprocessing.Pool on
+Linux) draw from the same bucket as their parent and together stay under the limit.
+The NCBI bucket is created when this module is imported.
+'''
+
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+
+try:
+    from email.utils import parsedate_tz, mktime_tz
+except ImportError:
+    parsedate_tz = mktime_tz = None
+
+try:
+    _clock = time.monotonic
+except AttributeError:
+    # python 2
+    _clock = time.time
+
+from six.moves.urllib.parse import urlparse
+
+from . import sessions
+
+_log = logging.getLogger('metapub.ratelimit')
+
+# NCBI allows 3 requests per second per IP address, or 10 per second with an api_key.
+NCBI_REQUESTS_PER_SECOND = 3
+NCBI_REQUESTS_PER_SECOND_WITH_KEY = 10
+
+NCBI_HOSTS = ('eutils.ncbi.nlm.nih.gov', 'www.ncbi.nlm.nih.gov', 'ncbi.nlm.nih.gov')
+
+# HTTP status codes that indicate a transient failure worth retrying.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket(object):
+    """ Thread-safe (and, when shared=True, fork-safe) token bucket.
+
+    Tokens accrue at `rate` per second up to `capacity`. Each request takes a token;
+    when none is available, the caller is told how long to wait for one. Tokens are
+    *reserved* up front, so callers waiting concurrently (threads, coroutines or
+    forked processes) are spaced out by 1/rate seconds rather than all waking at
+    the same moment.
+
+    Synchronous usage:
+
+        bucket.wait()
+
+    Asyncio usage (never blocks the event loop):
+
+        await asyncio.sleep(bucket.reserve())
+
+    :param rate: (float) tokens per second
+    :param capacity: (int) maximum burst size (default: 1, i.e. no bursts)
+    :param shared: (bool) keep state in shared memory, so that the bucket is shared
+                   with processes forked after its creation (default: False)
+    """
+
+    def __init__(self, rate, capacity=1, shared=False):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._state = None
+        if shared:
+            self._state, self._lock = _shared_state()
+        if self._state is None:
+            self._state = [0.0, 0.0]
+            self._lock = threading.Lock()
+        self.shared = not isinstance(self._state, list)
+        self._pid = os.getpid()
+        # [0]: tokens available as of [1]: clock reading
+        self._state[0] = self.capacity
+        self._state[1] = _clock()
+
+    def reserve(self, tokens=1):
+        """ takes `tokens` from the bucket and returns the number of seconds the
+        caller must wait before using them (0.0 if they are available right now).
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+        with self._lock:
+            now = _clock()
+            available = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+            available -= tokens
+            self._state[0] = available
+            self._state[1] = now
+        if available >= 0:
+            return 0.0
+        return -available / self.rate
+
+    def _after_fork(self):
+        # a threading.Lock copied by fork may be held by a thread that no longer exists.
+        # (shared buckets keep their lock: it lives in shared memory and is released
+        # by whichever process holds it.)
+        if not self.shared:
+            self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def wait(self, tokens=1):
+        """ blocks until `tokens` are available; returns the number of seconds slept. """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+def _shared_state():
+    """ returns (state, lock) in shared memory, or (None, None) where the platform
+    doesn't support it (e.g. no /dev/shm in a sandbox).
+    """
+    try:
+        import multiprocessing
+        return multiprocessing.RawArray('d', 2), multiprocessing.Lock()
+    except (ImportError, OSError) as error:
+        _log.debug('Shared memory unavailable; using a per-process bucket (%r)', error)
+        return None, None
+
+
+class HostPolicy(object):
+    """ Rate limit and retry settings for a host (or group of hosts).
+
+    :param rate: (float) requests per second without an api_key (None: unlimited)
+    :param rate_with_key: (float) requests per second with an api_key (default: rate)
+    :param retries: (int) number of times to retry a failed request (default: 5)
+    :param backoff_base: (float) seconds; the n-th retry waits a random time up to
+                         backoff_base * 2**n, capped at backoff_cap (default: 0.5)
+    :param backoff_cap: (float) seconds; maximum wait between retries (default: 60)
+    """
+
+    def __init__(self, rate=None, rate_with_key=None, retries=5, backoff_base=0.5, backoff_cap=60):
+        self.rate = rate
+        self.rate_with_key = rate if rate_with_key is None else rate_with_key
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._bucket = None
+
+    def bucket(self, api_key=None):
+        """ returns this policy's TokenBucket, or None if requests with (or without)
+        an api_key aren't rate limited.
+
+        Keyed and unkeyed requests share the bucket. The first request with an
+        api_key raises its rate to rate_with_key (in this process, and in processes
+        forked after that).
+        """
+        rate = self.rate_with_key if api_key else self.rate
+        if not rate:
+            return None
+        with _REGISTRY_LOCK:
+            if self._bucket is None:
+                self._bucket = TokenBucket(rate, shared=True)
+            elif rate > self._bucket.rate:
+                self._bucket.rate = float(rate)
+            return self._bucket
+
+    def backoff(self, attempt, response=None):
+        """ returns seconds to wait before retry number `attempt` (counting from 0):
+        the server's Retry-After if it sent one, otherwise "full jitter" exponential
+        backoff.
+        """
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_cap)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+
+_REGISTRY_LOCK = threading.Lock()
+_POLICIES = {'ncbi': HostPolicy(rate=NCBI_REQUESTS_PER_SECOND, rate_with_key=NCBI_REQUESTS_PER_SECOND_WITH_KEY)}
+_HOST_ALIASES = dict((host, 'ncbi') for host in NCBI_HOSTS)
+_DEFAULT_POLICY = HostPolicy()
+
+
+def _reinit_registry_lock():
+    global _REGISTRY_LOCK
+    _REGISTRY_LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_registry_lock)
+
+
+def configure_host(host, **kwargs):
+    """ sets rate limit / retry settings (see HostPolicy) for `host`, which may be a
+    hostname or the name of a host group (e.g. 'ncbi'). Settings not supplied keep
+    their current values.
+
+    Changing a rate replaces the host's bucket, so do so before forking worker processes.
+
+    :return: HostPolicy
+    """
+    name = _HOST_ALIASES.get(host, host)
+    with _REGISTRY_LOCK:
+        policy = _POLICIES.get(name)
+        if policy is None:
+            policy = _POLICIES[name] = HostPolicy()
+        if 'rate' in kwargs and 'rate_with_key' not in kwargs:
+            kwargs['rate_with_key'] = kwargs['rate']
+        for key, value in kwargs.items():
+            if not hasattr(policy, key) or key.startswith('_'):
+                raise TypeError('Unknown HostPolicy setting: %s' % key)
+            setattr(policy, key, value)
+        if 'rate' in kwargs or 'rate_with_key' in kwargs:
+            policy._bucket = None
+    return policy
+
+
+def get_policy(url_or_host):
+    """ returns the HostPolicy for the host of the given url (or hostname). """
+    host = urlparse(url_or_host).hostname if '://' in url_or_host else url_or_host
+    host = (host or '').lower()
+    return _POLICIES.get(_HOST_ALIASES.get(host, host), _DEFAULT_POLICY)
+
+
+def get_ncbi_bucket(api_key=None):
+    """ returns the process-wide TokenBucket for NCBI requests, keyed or not.
+
+    :param api_key: (optional) NCBI api key; raises the allowed rate to 10/s for
+                    all NCBI requests from now on.
+    :return: TokenBucket
+    """
+    return _POLICIES['ncbi'].bucket(api_key)
+
+
+def request(method, url, api_key=None, **kwargs):
+    """ makes an HTTP request, rate limited and retried according to the policy for
+    url's host. Keyword arguments are passed through to requests.
+
+    Connection errors and replies with a status in RETRY_STATUS_CODES are retried
+    up to policy.retries times; after that, the last response is returned (or the
+    last connection error raised), as a plain requests call would.
+
+    Requests are made through the pooled session for url's host (metapub.sessions).
+
+    :param method: (str) 'GET', 'POST', etc
+    :param url: (str)
+    :param api_key: (optional) api key included in the request, if any; selects
+                    the rate limit for keyed requests.
+    :return: requests.Response
+    """
+    policy = get_policy(url)
+    bucket = policy.bucket(api_key)
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.wait()
+        try:
+            response = sessions.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if attempt >= policy.retries:
+                raise
+            delay = policy.backoff(attempt)
+            _log.info('%s %s failed (%r); retrying in %.1fs', method, url, error, delay)
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= policy.retries:
+                return response
+            delay = policy.backoff(attempt, response)
+            _log.info('%s %s returned %i; retrying in %.1fs', method, url, response.status_code, delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, api_key=None, **kwargs):
+    return request('GET', url, api_key=api_key, **kwargs)
+
+
+def post(url, data=None, api_key=None, **kwargs):
+    return request('POST', url, data=data, api_key=api_key, **kwargs)
+
+
+def _retry_after(response):
+    """ returns seconds requested by a response's Retry-After header, or None. """
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    if parsedate_tz is not None:
+        parsed = parsedate_tz(value)
+        if parsed:
+            return max(0.0, mktime_tz(parsed) - time.time())
+    return None
+
+
+# create the NCBI bucket now, so that processes forked later share it.
+get_ncbi_bucket()
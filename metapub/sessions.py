@@ -0,0 +1,278 @@
+from __future__ import absolute_import, unicode_literals
+
+__doc__ = '''metapub.sessions -- pooled, keep-alive HTTP sessions shared across metapub
+
+All metapub HTTP traffic goes through a requests.Session kept per host, so that
+repeated requests to the same host (NCBI, CrossRef, doi.org, publisher sites)
+reuse open TCP/TLS connections instead of handshaking every time:
+
+    from metapub import sessions
+    response = sessions.get('https://www.ncbi.nlm.nih.gov/...')
+
+Pool sizes and the default timeout can be set globally or per host, before or
+after sessions are created:
+
+    sessions.configure(pool_maxsize=20, timeout=(5, 60))
+    sessions.configure('eutils.ncbi.nlm.nih.gov', timeout=(5, 300))
+
+and connection reuse can be inspected with sessions.stats().
+
+The number of requests in flight to a host at once can also be capped (useful when
+many threads hit publisher sites that block clients opening too many connections):
+
+    sessions.configure('www.tandfonline.com', max_concurrent=1)
+
+or, to cap only the requests made by some threads (e.g. the workers of a FindItPool)
+without changing the settings for everyone else, with a HostLimiter:
+
+    limiter = sessions.HostLimiter(max_per_host=2, host_limits={'www.tandfonline.com': 1})
+    sessions.use_limiter(limiter)       # in each thread that should be limited
+
+Sessions are per process: a process forked from one that already has sessions
+starts its own (sockets can't be shared safely across processes).
+'''
+
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from six.moves.urllib.parse import urlparse
+
+_log = logging.getLogger('metapub.sessions')
+
+# (connect timeout, read timeout) in seconds, applied to requests that don't specify one.
+DEFAULT_TIMEOUT = (10, 120)
+
+# number of hosts to keep pools for, per session (redirects can lead to other hosts).
+DEFAULT_POOL_CONNECTIONS = 10
+
+# number of keep-alive connections kept open per host.
+DEFAULT_POOL_MAXSIZE = 10
+
+# maximum number of requests in flight at once per host (None: no limit).
+DEFAULT_MAX_CONCURRENT = None
+
+_DEFAULTS = {'pool_connections': DEFAULT_POOL_CONNECTIONS,
+             'pool_maxsize': DEFAULT_POOL_MAXSIZE,
+             'timeout': DEFAULT_TIMEOUT,
+             'max_concurrent': DEFAULT_MAX_CONCURRENT,
+             }
+
+
+class PooledSession(requests.Session):
+    """ requests.Session with a default timeout, an optional cap on concurrent requests
+    and a counter of requests sent. """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 timeout=DEFAULT_TIMEOUT, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        super(PooledSession, self).__init__()
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        for prefix in ('https://', 'http://'):
+            self.mount(prefix, HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = getattr(_thread_state, 'limiter', None)
+        thread_slots = None if limiter is None else limiter.slots(url)
+        if self._slots is None and thread_slots is None:
+            return super(PooledSession, self).request(method, url, **kwargs)
+        # (with stream=True, slots are released once headers are in, not after the body.)
+        # slots are always taken in the same order (session's, then thread's), so
+        # threads waiting on both can't deadlock.
+        held = [slots for slots in (self._slots, thread_slots) if slots is not None]
+        acquired = []
+        try:
+            for slots in held:
+                slots.acquire()
+                acquired.append(slots)
+            return super(PooledSession, self).request(method, url, **kwargs)
+        finally:
+            for slots in reversed(acquired):
+                slots.release()
+
+    def send(self, request, **kwargs):
+        # counted here rather than in request() so that redirects count too.
+        with self._count_lock:
+            self.request_count += 1
+        return super(PooledSession, self).send(request, **kwargs)
+
+    def connection_count(self):
+        """ returns the number of connections opened by this session's live pools. """
+        count = 0
+        for adapter in self.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    count += pool.num_connections
+        return count
+
+
+class HostLimiter(object):
+    """ Per-host caps on the number of requests in flight, applying only to the threads
+    that have called use_limiter() with it (the session settings are left alone).
+
+    :param max_per_host: (int or None) maximum requests in flight to any one host
+    :param host_limits: (dict) {hostname: max requests in flight}, overriding max_per_host
+    """
+
+    def __init__(self, max_per_host=None, host_limits=None):
+        self.max_per_host = max_per_host
+        self.host_limits = dict((_hostname(host), limit) for host, limit in (host_limits or {}).items())
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def limit(self, url_or_host):
+        """ returns the cap for the host of url_or_host (None: no limit). """
+        return self.host_limits.get(_hostname(url_or_host), self.max_per_host)
+
+    def slots(self, url_or_host):
+        """ returns the BoundedSemaphore shared by requests to url_or_host's host, or None. """
+        host = _hostname(url_or_host)
+        with self._lock:
+            slots = self._slots.get(host)
+            if slots is None:
+                limit = self.host_limits.get(host, self.max_per_host)
+                if not limit:
+                    return None
+                slots = self._slots[host] = threading.BoundedSemaphore(limit)
+            return slots
+
+
+_thread_state = threading.local()
+
+
+def use_limiter(limiter):
+    """ makes requests from the calling thread also wait for slots of limiter (a
+    HostLimiter), on top of any max_concurrent setting. None stops doing so. """
+    _thread_state.limiter = limiter
+
+
+_SESSIONS = {}
+_HOST_SETTINGS = {}
+_LOCK = threading.Lock()
+_PID = os.getpid()
+
+
+def _reinit_lock():
+    global _LOCK
+    _LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_lock)
+
+
+def _hostname(url_or_host):
+    host = urlparse(url_or_host).hostname if '://' in url_or_host else url_or_host
+    return (host or '').lower()
+
+
+def configure(host=None, **kwargs):
+    """ sets pool_connections, pool_maxsize, timeout and/or max_concurrent, either as the defaults for
+    all hosts (host=None) or for one host. Sessions already created for the affected
+    host(s) are closed and replaced on next use.
+
+    :param host: (optional) hostname or url
+    :param pool_connections: (int) number of hosts to keep pools for, per session
+    :param pool_maxsize: (int) number of keep-alive connections per host
+    :param timeout: (float or (connect, read) tuple) default request timeout
+    :param max_concurrent: (int or None) maximum number of requests in flight at once
+    """
+    for key in kwargs:
+        if key not in _DEFAULTS:
+            raise TypeError('Unknown session setting: %s' % key)
+
+    with _LOCK:
+        if host is None:
+            _DEFAULTS.update(kwargs)
+            stale = list(_SESSIONS.keys())
+        else:
+            host = _hostname(host)
+            _HOST_SETTINGS.setdefault(host, {}).update(kwargs)
+            stale = [host] if host in _SESSIONS else []
+        for name in stale:
+            _SESSIONS.pop(name).close()
+
+
+def settings(host=None):
+    """ returns the settings (see configure) in effect for host, or the defaults. """
+    with _LOCK:
+        if host is None:
+            return dict(_DEFAULTS)
+        return dict(_DEFAULTS, **_HOST_SETTINGS.get(_hostname(host), {}))
+
+
+def get_session(url_or_host):
+    """ returns the shared PooledSession for the host of the given url (or hostname). """
+    global _PID
+    host = _hostname(url_or_host)
+    with _LOCK:
+        if _PID != os.getpid():
+            # forked: the parent's connections aren't ours to use.
+            _SESSIONS.clear()
+            _PID = os.getpid()
+        session = _SESSIONS.get(host)
+        if session is None:
+            settings = dict(_DEFAULTS, **_HOST_SETTINGS.get(host, {}))
+            session = _SESSIONS[host] = PooledSession(**settings)
+            _log.debug('New session for %s (%r)', host, settings)
+        return session
+
+
+def request(method, url, **kwargs):
+    """ makes an HTTP request through the shared session for url's host.
+    Arguments are as for requests.request.
+
+    :return: requests.Response
+    """
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url, params=None, **kwargs):
+    kwargs.setdefault('allow_redirects', True)
+    return request('GET', url, params=params, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+def stats():
+    """ returns connection reuse counters for each host with a session in this process:
+
+        {hostname: {'requests': (int) requests made,
+                    'connections': (int) connections opened (by live pools),
+                    'reused': (int) requests that didn't need a new connection},
+         ...}
+    """
+    with _LOCK:
+        sessions = list(_SESSIONS.items())
+    outd = {}
+    for host, session in sessions:
+        requests_made = session.request_count
+        connections = session.connection_count()
+        outd[host] = {'requests': requests_made,
+                      'connections': connections,
+                      'reused': max(0, requests_made - connections),
+                      }
+    return outd
+
+
+def close_all():
+    """ closes all sessions (and their connections) in this process. """
+    with _LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
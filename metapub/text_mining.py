@@ -2,7 +2,7 @@ from __future__ import absolute_import, unicode_literals
 
 import re
 
-import requests
+from . import sessions
 
 try:
     from urlparse import urlparse
@@ -102,7 +102,7 @@ def scrape_doi_from_article_page(url):
     :param url: (str)
     :return: doi or None
     """
-    response = requests.get(url)
+    response = sessions.get(url)
     if response.ok:
         dois = findall_dois_in_text(response.text)
         if dois:
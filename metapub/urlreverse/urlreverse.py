@@ -8,12 +8,13 @@ import six
 from ..pubmedcentral import get_pmid_for_otherid
 from ..pubmedfetcher import PubMedFetcher
 from ..crossref import CrossRef
-from ..eutils_common import SQLiteCache, get_cache_path
+from ..eutils_common import get_cache_path
 from ..dx_doi import DxDOI
 from ..convert import doi2pmid, pmid2doi, interpret_pmids_for_citation_results
 from ..exceptions import MetaPubError, DxDOIError, BadDOI
 from ..utils import hostname_of, remove_chars, asciify
-from ..cache_utils import datetime_to_timestamp
+from ..cache_utils import sellby_timestamp
+from ..cache_backends import open_cache
 from ..text_mining import find_doi_in_string
 from ..config import DEFAULT_CACHE_DIR
 
@@ -24,6 +25,9 @@ from .methods import re_pmcid, try_pmid_methods, try_doi_methods, try_vip_method
 URLREVERSE_CACHE = None
 CACHE_FILENAME = 'urlreverse-cache.db'
 
+# seconds after which cached results are looked up afresh (None: never).
+CACHE_TTL = None
+
 
 def get_article_info_from_url(url):
     """ Using regular expressions, attempt to determine the "format" of the submitted URL, and if 
@@ -74,7 +78,7 @@ def _get_urlreverse_cache(cachedir=DEFAULT_CACHE_DIR):
     global URLREVERSE_CACHE
     if not URLREVERSE_CACHE:
         _cache_path = get_cache_path(cachedir, CACHE_FILENAME)
-        URLREVERSE_CACHE = SQLiteCache(_cache_path)
+        URLREVERSE_CACHE = open_cache(_cache_path)
     return URLREVERSE_CACHE
 
 
@@ -161,7 +165,7 @@ class UrlReverse(object):
             self._log.setLevel(logging.INFO)
 
         if self._cache:
-            self._load_from_cache()
+            self._load_from_cache(expiry_date=self.expiry_date)
         else:
             self._urlreverse()
 
@@ -236,7 +240,7 @@ class UrlReverse(object):
 
         A time.time() timestamp will be added to the value dictionary when stored.
 
-        There is no return from this function. Exceptions from the SQLiteCache 
+        There is no return from this function. Exceptions from the cache 
         object may be raised.
         """
         cache_value = self.to_dict()
@@ -271,8 +275,9 @@ class UrlReverse(object):
 
         Cache results are stored with a time.time() timestamp.
 
-        When expiry_date is supplied, results from the cache past their
-        sell-by date will be expunged from the cache and return will be None.
+        Results older than expiry_date (when supplied) or than CACHE_TTL seconds
+        (if set) are past their sell-by date: they are expunged from the cache and
+        return will be None.
 
         expiry_date can be either a python datetime or a timestamp. 
 
@@ -282,27 +287,26 @@ class UrlReverse(object):
         :rtype: dict or None
         """
 
-        if hasattr(expiry_date, 'strftime'):
-            # convert to timestamp
-            sellby = datetime_to_timestamp(expiry_date)
-        else:
-            # make sure sellby is a number, not None
-            sellby = expiry_date if expiry_date else 0
+        sellby = sellby_timestamp(expiry_date, CACHE_TTL)
 
         if self._cache:
             cache_key = self._make_cache_key(cache_key)
             try:
                 res = self._cache[cache_key]
-                timestamp = res['timestamp']
-                if timestamp < sellby:
-                    self._log.debug('Cache: expunging result for %s (%i)', cache_key, timestamp)
-                else:
-                    self._log.debug('Cache: returning result for %s (%i)', cache_key, timestamp)
-                return res
-
             except KeyError:
                 self._log.debug('Cache: no result for key %s', cache_key)
                 return None
+
+            timestamp = res['timestamp']
+            if timestamp < sellby:
+                self._log.debug('Cache: expunging result for %s (%i)', cache_key, timestamp)
+                try:
+                    del self._cache[cache_key]
+                except KeyError:
+                    pass
+                return None
+            self._log.debug('Cache: returning result for %s (%i)', cache_key, timestamp)
+            return res
         else:
             self._log.debug('Cache disabled (self._cache is None)')
             return None
@@ -0,0 +1,28 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys, logging
+
+from metapub.cache_backends import compact_caches
+from metapub.config import DEFAULT_CACHE_DIR
+
+# Shrinks the metapub cache files in a directory: drops entries older than max_age
+# days and, oldest first, entries beyond max_mb megabytes per file, then VACUUMs
+# each file. Safe to run (e.g. from cron) while other processes use the caches.
+#
+# usage: compact_caches.py [max_age_days [max_mb [cachedir]]]
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    max_age = int(float(sys.argv[1]) * 86400) if len(sys.argv) > 1 else None
+    max_bytes = int(float(sys.argv[2]) * 1024 ** 2) if len(sys.argv) > 2 else None
+    cachedir = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_CACHE_DIR
+
+    results = compact_caches(cachedir, max_age=max_age, max_bytes=max_bytes)
+    for filename, counts in sorted(results.items()):
+        print('%s: %i expired, %i evicted' % (filename, counts['expired'], counts['evicted']))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,3 +10,7 @@ FINDIT_COVERAGE_CSV = '/tmp/findit_coverage.csv'
 
 PMID_OUTPUT_FILENAME = '/tmp/pmid_coverage_list.txt'
 
+
+LOCAL_PUBMED_STORE = '/tmp/pubmed-local.db'
+
+PUBMED_UPDATEFILES_DIR = '/tmp/pubmed-updatefiles'
@@ -12,27 +12,31 @@ fetch = PubMedFetcher()
 
 outfile = open(FINDIT_COVERAGE_CSV, 'w')
 
+# number of concurrent FindIt lookups (requests to any one publisher are capped by FindItPool).
+WORKERS = 8
+
 # template for CSV output
-CSV_OUTPUT_TEMPLATE = '{source.pma.journal},{source.pma.year},{source.pma.pmid},{url},{source.reason}\n'
+CSV_OUTPUT_TEMPLATE = '{result.journal},{result.year},{result.pmid},{url},{result.reason}\n'
 
-# For each pubmed ID in pregenerated list, create a FindIt source object.
-# 
-# For each source object, write results to the CSV with heuristics:
+# For each pubmed ID in pregenerated list, run a FindIt lookup (concurrently; see FindIt.batch).
+#
+# For each FindItResult, write results to the CSV with heuristics:
 #
-#   If source.reason.startswith('NOFORMAT'), assign url=source.backup_url
+#   If result.reason.startswith('NOFORMAT'), assign url=the_doi_2step(result.doi)
 #
+# (Rows are written in order of completion, not in the order of the PMID list.)
 
-def write_findit_result_to_csv(source):
-    url = source.url
-    if source.reason and source.reason.startswith(('NOFORMAT', 'TODO')):
-        if source.doi:
+def write_findit_result_to_csv(result):
+    url = result.url
+    if result.reason and result.reason.startswith(('NOFORMAT', 'TODO')):
+        if result.doi:
             try:
-                url = the_doi_2step(source.doi)
+                url = the_doi_2step(result.doi)
             except Exception as err:
-                url = 'http://dx.doi.org/%s' % source.doi
+                url = 'http://dx.doi.org/%s' % result.doi
         else:
             url = '(no doi)'
-    outfile.write(CSV_OUTPUT_TEMPLATE.format(source=source, url=url))
+    outfile.write(CSV_OUTPUT_TEMPLATE.format(result=result, url=url))
     outfile.flush()
 
 def main(start_pmid=0):
@@ -43,10 +47,10 @@ def main(start_pmid=0):
     else:
         idx = 0
 
-    for pmid in pmids[idx:].split('\n'):
-        source = FindIt(pmid, verify=False)
-        print('[{source.pma.journal}]\t{source.pmid}: {source.url} ({source.reason})'.format(source=source))
-        write_findit_result_to_csv(source)
+    pmids = [pmid for pmid in pmids[idx:].split('\n') if pmid.strip()]
+    for result in FindIt.batch(pmids, workers=WORKERS, fetcher=fetch, verify=False):
+        print('[{result.journal}]\t{result.pmid}: {result.url} ({result.reason})'.format(result=result))
+        write_findit_result_to_csv(result)
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,28 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys, logging
+
+from metapub.cache_backends import recompress_caches
+from metapub.config import DEFAULT_CACHE_DIR
+
+# Re-encodes every value in the metapub cache files in a directory with the given
+# codec (default: zstd if the zstandard package is installed, else zlib), then
+# VACUUMs each file. Can be interrupted and run again; caches stay usable meanwhile.
+#
+# usage: recompress_caches.py [zstd|zlib|none [cachedir]]
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    codec = sys.argv[1] if len(sys.argv) > 1 else None
+    cachedir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CACHE_DIR
+
+    results = recompress_caches(cachedir, codec=codec)
+    for filename, counts in sorted(results.items()):
+        print('%s: %i entries recompressed, %i -> %i bytes' % (filename, counts['recompressed'],
+                                                                counts['before'], counts['after']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys, logging
+
+from metapub.localstore import LocalPubMedStore
+
+from config import LOCAL_PUBMED_STORE, PUBMED_UPDATEFILES_DIR
+
+# Brings a local PubMed store (see metapub.localstore) up to date with NCBI's daily
+# update files. Safe to run repeatedly (e.g. from cron): files already applied are
+# skipped, and a run that was interrupted picks up where it left off.
+#
+# usage: sync_local_pubmed.py [store_path [updatefiles_dir]]
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    store_path = sys.argv[1] if len(sys.argv) > 1 else LOCAL_PUBMED_STORE
+    update_dir = sys.argv[2] if len(sys.argv) > 2 else PUBMED_UPDATEFILES_DIR
+
+    store = LocalPubMedStore(store_path)
+    applied = store.sync(update_dir, download=True)
+    print('Applied %i update files to %s (%i articles in store)' % (len(applied), store_path, len(store)))
+    for name in applied:
+        print('\t%s' % name)
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -24,4 +24,12 @@ setup(
         'six',
         'tox',
         ],
+    extras_require = {
+        'async': ['aiohttp'],
+        'lmdb': ['lmdb'],
+        'redis': ['redis'],
+        'zstd': ['zstandard'],
+        'arrow': ['pyarrow'],
+        'numpy': ['numpy'],
+        },
     )
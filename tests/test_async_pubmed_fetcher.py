@@ -0,0 +1,93 @@
+import unittest, shutil, tempfile
+
+import six
+
+from metapub import PubMedFetcher
+
+if six.PY3:
+    import asyncio
+    from metapub import AsyncPubMedFetcher
+
+
+SAMPLE_ARTICLE_SET = 'tests/data/sample_pubmed_article_set.xml'
+
+
+def _done(value):
+    future = asyncio.Future()
+    future.set_result(value)
+    return future
+
+
+class FakeResponse(object):
+    """ stands in for an aiohttp response (as used with `async with`). """
+
+    def __init__(self, content, status=200, reason='OK'):
+        self.content = content
+        self.status = status
+        self.reason = reason
+        self.headers = {}
+
+    def __aenter__(self):
+        return _done(self)
+
+    def __aexit__(self, exc_type, exc, tb):
+        return _done(None)
+
+    def read(self):
+        return _done(self.content)
+
+
+class FakeSession(object):
+    """ stands in for an aiohttp.ClientSession; returns the sample article set for any request. """
+
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, data=None):
+        self.posts.append((url, data))
+        return FakeResponse(open(SAMPLE_ARTICLE_SET, 'rb').read())
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(six.PY2, 'AsyncPubMedFetcher requires python 3')
+class TestAsyncPubMedFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_articles_by_pmids(self):
+        session = FakeSession()
+        fetch = AsyncPubMedFetcher(cachedir=self.cachedir, session=session)
+        articles = run(fetch.articles_by_pmids(['4', 5, '6', 'bogus', '4'], chunk_size=2))
+
+        self.assertEqual(len(session.posts), 2)
+        self.assertEqual(sorted(data['id'] for url, data in session.posts), ['4,5', '6'])
+        self.assertEqual([pma.pmid for pma in articles], ['4', '5', '4', '5'])
+        self.assertEqual(fetch.last_missing_pmids, ['bogus', '6'])
+
+        # both requests are now cached.
+        run(fetch.articles_by_pmids(['4', '5', '6'], chunk_size=2))
+        self.assertEqual(len(session.posts), 2)
+
+    def test_shares_cache_with_pubmedfetcher(self):
+        # populate the cache file through the synchronous fetcher's client...
+        sync_qs = PubMedFetcher(cachedir=self.cachedir).qs
+        url, full_args, cache_key = sync_qs.prepare_query('/efetch.fcgi', {'db': 'pubmed', 'id': '4'})
+        sync_qs.cache_put(cache_key, open(SAMPLE_ARTICLE_SET, 'rb').read())
+
+        # ...and read it without any network access through the async one.
+        session = FakeSession()
+        fetch = AsyncPubMedFetcher(cachedir=self.cachedir, session=session)
+        pma = run(fetch.article_by_pmid(4))
+        self.assertEqual(pma.pmid, '4')
+        self.assertEqual(session.posts, [])
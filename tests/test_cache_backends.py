@@ -0,0 +1,194 @@
+import unittest, os, shutil, sqlite3, tempfile, threading
+
+from metapub import cache_backends
+from metapub.cache_backends import (open_cache, cache_url_for, MemoryLRUCache, TieredCache, register_backend,
+                                    configure_memory_tier, cache_stats, compact_caches)
+from metapub.cache_utils import MetaPubCache
+from metapub.eutils_common import get_cache_path, get_eutils_client
+from metapub.exceptions import MetaPubError
+from metapub import PubMedFetcher
+
+
+class TestCacheBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_cache_path_with_url(self):
+        self.assertEqual(get_cache_path('memory://?max=10', 'findit-cache.db'), 'memory://?max=10&name=findit-cache')
+        self.assertEqual(get_cache_path('lmdb:///data/cache', 'eutils-cache.db'), 'lmdb:///data/cache?name=eutils-cache')
+        self.assertEqual(cache_url_for('redis://host:6379/1?name=x', 'y'), 'redis://host:6379/1?name=y')
+
+    def test_plain_path_is_sqlite(self):
+        cache = open_cache(os.path.join(self.tmpdir, 'plain.db'))
+        self.assertIsInstance(cache, MetaPubCache)
+        # plain paths leave the journal mode alone; WAL is for sqlite:// urls.
+        mode = cache._con.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode.lower(), 'delete')
+        cache.close()
+
+    def test_sqlite_url_wal(self):
+        wal_cache = open_cache(get_cache_path('sqlite://' + self.tmpdir, 'wal-cache.db'))
+        self.assertEqual(wal_cache._con.execute('PRAGMA journal_mode').fetchone()[0].lower(), 'wal')
+        plain_cache = open_cache(get_cache_path('sqlite://%s?wal=0' % self.tmpdir, 'nowal-cache.db'))
+        self.assertEqual(plain_cache._con.execute('PRAGMA journal_mode').fetchone()[0].lower(), 'delete')
+
+    def test_sqlite_url(self):
+        cache = open_cache(get_cache_path('sqlite://' + self.tmpdir, 'test-cache.db'))
+        self.assertIsInstance(cache, MetaPubCache)
+        cache['a'] = {'b': 1}
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'test-cache.db')))
+        self.assertEqual(open_cache(os.path.join(self.tmpdir, 'test-cache.db'))['a'], {'b': 1})
+
+    def test_memory_lru(self):
+        cache = MemoryLRUCache(3)
+        cache.set_many([(1, 'a'), (2, 'b'), (3, 'c')])
+        cache[1]                # 1 is now most recently used
+        cache[4] = 'd'
+        self.assertEqual(cache.get_many([1, 2, 3, 4]), {1: 'a', 3: 'c', 4: 'd'})
+        self.assertRaises(KeyError, cache.__getitem__, 2)
+        self.assertEqual(cache.delete_many([1, 2]), 1)
+        self.assertEqual(len(cache), 2)
+
+        value = {'url': 'x'}
+        cache[5] = value
+        value['url'] = 'changed'
+        self.assertEqual(cache[5], {'url': 'x'})
+
+    def test_memory_lru_max_bytes(self):
+        cache = MemoryLRUCache(100, max_bytes=10)
+        cache['a'] = b'12345'
+        cache['b'] = b'12345'
+        self.assertEqual(cache.size, 10)
+        cache['c'] = b'1'
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['bytes'], 6)
+
+    def test_memory_tier(self):
+        path = os.path.join(self.tmpdir, 'tiered-cache.db')
+        open_cache(path)['a'] = {'url': 'x'}
+
+        cache = open_cache('sqlite://%s?name=tiered-cache&lru=2' % self.tmpdir)
+        self.assertIsInstance(cache, TieredCache)
+        self.assertEqual(cache['a'], {'url': 'x'})
+        self.assertEqual(cache['a'], {'url': 'x'})
+        self.assertRaises(KeyError, cache.__getitem__, 'b')
+        cache['c'] = 'c'
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {'a': {'url': 'x'}, 'c': 'c'})
+        self.assertEqual(open_cache(path)['c'], 'c')
+
+        stats = cache_stats()['tiered-cache']
+        self.assertEqual(stats['persistent'], {'hits': 1, 'misses': 2})
+        self.assertEqual(stats['memory']['hits'], 3)
+        self.assertEqual(stats['memory']['misses'], 3)
+        self.assertEqual(stats['memory']['entries'], 2)
+
+        del cache['a']
+        self.assertEqual(open_cache(path).get_many(['a', 'c']), {'c': 'c'})
+
+    def test_memory_tier_threaded_counts(self):
+        cache = TieredCache(MemoryLRUCache(), MemoryLRUCache(max_entries=1))
+        cache['a'] = 'a'
+
+        def read():
+            for i in range(500):
+                self.assertRaises(KeyError, cache.__getitem__, 'missing')
+                self.assertEqual(cache.get_many(['a', 'missing']), {'a': 'a'})
+                self.assertIn('a', cache.memory)
+
+        threads = [threading.Thread(target=read) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()['persistent']['misses'], 8 * 500 * 2)
+
+    def test_memory_tier_rolled_back(self):
+        cache = open_cache('sqlite://%s?name=rollback-cache&lru=10' % self.tmpdir)
+        try:
+            with cache.transaction():
+                cache['a'] = 1
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertNotIn('a', cache)
+
+    def test_configure_memory_tier(self):
+        configure_memory_tier(max_entries=5)
+        try:
+            cache = open_cache(os.path.join(self.tmpdir, 'configured-cache.db'))
+        finally:
+            configure_memory_tier()
+        self.assertIsInstance(cache, TieredCache)
+        self.assertEqual(cache.memory.max_entries, 5)
+        self.assertIsInstance(open_cache(os.path.join(self.tmpdir, 'configured-cache.db')), MetaPubCache)
+
+    def test_memory_url_shares_cache_per_name(self):
+        first = open_cache('memory://?max=5&name=shared-test')
+        self.assertIs(first, open_cache('memory://?max=5&name=shared-test'))
+        self.assertIsNot(first, open_cache('memory://?max=5&name=other-test'))
+        self.assertEqual(first.max_entries, 5)
+
+    def test_compact_caches(self):
+        open_cache(get_cache_path('sqlite://' + self.tmpdir, 'a-cache.db'))['x'] = 1
+        from metapub.localstore import LocalPubMedStore
+        LocalPubMedStore(os.path.join(self.tmpdir, 'pubmed-local.db')).close()
+        # a cache file in the default (rollback journal) mode, as eutils' SQLiteCache makes them.
+        plain_path = os.path.join(self.tmpdir, 'plain-cache.db')
+        MetaPubCache(plain_path).close()
+        results = compact_caches(self.tmpdir, max_entries=0)
+        self.assertEqual(results, {'a-cache.db': {'expired': 0, 'evicted': 1},
+                                   'plain-cache.db': {'expired': 0, 'evicted': 0}})
+        # journal modes are left as they were.
+        journal_mode = lambda path: sqlite3.connect(path).execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(journal_mode(plain_path), 'delete')
+        self.assertEqual(journal_mode(os.path.join(self.tmpdir, 'a-cache.db')), 'wal')
+
+    def test_unknown_scheme(self):
+        self.assertRaises(MetaPubError, open_cache, 'bogus://somewhere?name=x')
+
+    def test_register_backend(self):
+        opened = []
+        def opener(path, name, params):
+            opened.append((path, name, params.get('flavor')))
+            return MemoryLRUCache(10)
+        register_backend('custom', opener)
+        try:
+            open_cache(get_cache_path('custom://' + self.tmpdir + '?flavor=plain', 'x-cache.db'))
+        finally:
+            del cache_backends._BACKENDS['custom']
+        self.assertEqual(opened, [(self.tmpdir, 'x-cache', 'plain')])
+
+    def test_eutils_client_with_url(self):
+        qs = get_eutils_client(get_cache_path('memory://', 'eutils-cache.db'))
+        self.assertIsInstance(qs._cache, MemoryLRUCache)
+        qs.cache_put('key', b'<xml/>')
+        self.assertEqual(qs.cache_get('key'), b'<xml/>')
+
+    def test_fetcher_accepts_url(self):
+        fetch = PubMedFetcher(cachedir='memory://?max=10')
+        self.assertIsInstance(fetch.qs._cache, MemoryLRUCache)
+
+    @unittest.skipIf(cache_backends.lmdb is None, 'lmdb not installed')
+    def test_lmdb(self):
+        cache = open_cache(get_cache_path('lmdb://' + self.tmpdir, 'test-cache.db'))
+        cache.set_many({1: 'a', 2: {'b': 2}})
+        with cache.transaction():
+            cache[3] = 'c'
+            del cache[1]
+        self.assertEqual(cache.get_many([1, 2, 3]), {2: {'b': 2}, 3: 'c'})
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir, 'test-cache.lmdb')))
+
+    def test_missing_optional_backend(self):
+        if cache_backends.redis is None:
+            self.assertRaises(MetaPubError, open_cache, 'redis://localhost:6379/0?name=x')
+        if cache_backends.lmdb is None:
+            self.assertRaises(MetaPubError, open_cache, 'lmdb://' + self.tmpdir + '?name=x')
+
+
+if __name__ == '__main__':
+    unittest.main()
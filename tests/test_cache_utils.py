@@ -0,0 +1,132 @@
+import unittest, os, shutil, tempfile
+
+from eutils.sqlitecache import SQLiteCache, key_to, val_to
+
+from metapub import cache_utils
+from metapub.exceptions import MetaPubError
+from metapub.cache_utils import (MetaPubCache, encode_value, decode_value, pack_value, unpack_value,
+                                 CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD)
+
+
+class TestMetaPubCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test-cache.db')
+        self.cache = MetaPubCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_set_many(self):
+        self.cache.set_many({1: {'url': 'a'}, 2: {'url': 'b'}})
+        self.cache.set_many([('x', [1, 2])])
+        self.assertEqual(self.cache.get_many([1, 2, 3, 'x']), {1: {'url': 'a'}, 2: {'url': 'b'}, 'x': [1, 2]})
+        self.assertEqual(self.cache.get_many([]), {})
+        self.assertEqual(self.cache[2], {'url': 'b'})
+
+    def test_get_many_chunks(self):
+        self.cache.set_many((i, i * 2) for i in range(1200))
+        found = self.cache.get_many(range(1300))
+        self.assertEqual(len(found), 1200)
+        self.assertEqual(found[1199], 2398)
+
+    def test_delete_many(self):
+        self.cache.set_many({1: 'a', 2: 'b', 3: 'c'})
+        self.cache.delete_many([1, 3, 4])
+        self.assertEqual(self.cache.get_many([1, 2, 3]), {2: 'b'})
+
+    def test_transaction(self):
+        with self.cache.transaction():
+            self.cache[1] = 'a'
+            with self.cache.transaction():
+                self.cache[2] = 'b'
+        self.assertEqual(self.cache.get_many([1, 2]), {1: 'a', 2: 'b'})
+
+        try:
+            with self.cache.transaction():
+                self.cache[3] = 'c'
+                raise ValueError('oops')
+        except ValueError:
+            pass
+        self.assertFalse(3 in self.cache)
+
+    def _age(self, keys, seconds):
+        self.cache._con.executemany('UPDATE cache SET created = created - ? WHERE key = ?',
+                                    [(seconds, key_to(key)) for key in keys])
+
+    def test_compact(self):
+        self.cache.set_many((i, 'x' * 100) for i in range(10))
+        self._age(range(5), 3600)
+        self.assertEqual(self.cache.compact(max_age=60), {'expired': 5, 'evicted': 0})
+        self.assertEqual(sorted(self.cache.get_many(range(10))), [5, 6, 7, 8, 9])
+
+        self._age([5, 6], 10)
+        self.assertEqual(self.cache.compact(max_entries=3)['evicted'], 2)
+        self.assertEqual(sorted(self.cache.get_many(range(10))), [7, 8, 9])
+
+        size = len(encode_value('x' * 100)[1])
+        self._age([7], 10)
+        self.assertEqual(self.cache.compact(max_bytes=2 * size)['evicted'], 1)
+        self.assertEqual(sorted(self.cache.get_many(range(10))), [8, 9])
+
+    def test_max_age(self):
+        cache = MetaPubCache(self.path, max_age=60)
+        cache.set_many({1: 'a', 2: 'b'})
+        self._age([1], 3600)
+        self.assertRaises(KeyError, cache.__getitem__, 1)
+        self.assertFalse(1 in cache)
+        self.assertEqual(cache.get_many([1, 2]), {2: 'b'})
+
+    def test_evicts_during_writes(self):
+        cache = MetaPubCache(self.path, max_entries=5)
+        cache.EVICT_CHECK_INTERVAL = 10
+        for i in range(9):
+            cache[i] = i
+        self.assertEqual(len(cache.get_many(range(20))), 9)
+        cache[9] = 9
+        self.assertEqual(len(cache.get_many(range(20))), 5)
+
+    def test_compatible_with_sqlitecache(self):
+        self.cache['key'] = 'value'
+        self.assertEqual(SQLiteCache(self.path)['key'], 'value')
+
+    def test_reads_sqlitecache_entries(self):
+        old = SQLiteCache(self.path, compress_values=False)
+        old['plain'] = '<xml>' * 100
+        SQLiteCache(self.path)['zlib'] = '<xml>' * 100
+        self.assertEqual(self.cache.get_many(['plain', 'zlib']), {'plain': '<xml>' * 100, 'zlib': '<xml>' * 100})
+
+    def test_encode_value(self):
+        self.assertEqual(encode_value('short')[0], CODEC_NONE)
+        codec, data = encode_value('<xml>' * 1000, CODEC_ZLIB)
+        self.assertEqual(codec, CODEC_ZLIB)
+        self.assertTrue(len(data) < 200)
+        self.assertEqual(decode_value(codec, data), '<xml>' * 1000)
+        self.assertEqual(encode_value('<xml>' * 1000, CODEC_NONE)[0], CODEC_NONE)
+
+    def test_pack_value(self):
+        for value in ('short', b'<xml>' * 1000, {'a': [1, 2]}):
+            self.assertEqual(unpack_value(pack_value(value)), value)
+        # values written without a codec byte (zlib streams) still read.
+        self.assertEqual(unpack_value(val_to({'a': 1}, True)), {'a': 1})
+
+    @unittest.skipIf(cache_utils.zstandard is None, 'zstandard not installed')
+    def test_zstd(self):
+        codec, data = encode_value('<xml>' * 1000, CODEC_ZSTD)
+        self.assertEqual(codec, CODEC_ZSTD)
+        self.assertEqual(decode_value(codec, data), '<xml>' * 1000)
+
+    def test_recompress(self):
+        cache = MetaPubCache(self.path, compress_values=False)
+        cache.set_many(('key%i' % i, '<xml>%i</xml>' % i * 100) for i in range(50))
+        counts = cache.recompress('zlib', batch_size=7)
+        self.assertEqual(counts['recompressed'], 50)
+        self.assertTrue(counts['after'] < counts['before'])
+        codecs = set(row[0] for row in cache._con.execute('SELECT value_compressed FROM cache'))
+        self.assertEqual(codecs, set([CODEC_ZLIB]))
+        self.assertEqual(cache['key7'], '<xml>7</xml>' * 100)
+        self.assertEqual(cache.recompress('zlib')['recompressed'], 0)
+
+    def test_unknown_codec(self):
+        self.assertRaises(MetaPubError, cache_utils.configure_compression, 'lzma')
@@ -0,0 +1,83 @@
+import unittest, os, shutil, tempfile
+
+from metapub import PubMedArticle
+from metapub import columnar
+from metapub.columnar import iter_batches, export, COLUMNS
+from metapub.medline import iter_medline_file
+from metapub.exceptions import MetaPubError
+
+SAMPLE_UPDATE_FILE = 'tests/data/sample_medline_update.xml'
+SAMPLE_BOOK_ARTICLE = 'tests/data/sample_pubmed_book_article.xml'
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.articles = list(iter_medline_file(SAMPLE_UPDATE_FILE))
+        self.articles.append(PubMedArticle(open(SAMPLE_BOOK_ARTICLE, 'rb').read()))
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_columns(self):
+        batch = next(iter_batches(self.articles))
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch.column('pmid'), [int(pma.pmid) for pma in self.articles])
+        self.assertEqual(batch.column('journal'), [pma.journal for pma in self.articles])
+        self.assertEqual(batch.column('authors'), [pma.authors for pma in self.articles])
+        self.assertEqual(batch.column('mesh_ui'), [list((pma.mesh or {}).keys()) for pma in self.articles])
+        self.assertEqual(batch.column('year')[0], 1975)
+        self.assertEqual(batch.column('pubmed_type'), [pma.pubmed_type for pma in self.articles])
+        # dictionary encoding: one entry per distinct value.
+        codes, dictionary = batch.columns['pubmed_type']
+        self.assertEqual(dictionary, ['article', 'book'])
+        self.assertEqual(codes, [0, 0, 1, 1])
+
+    def test_batches_share_dictionaries(self):
+        batches = list(iter_batches(self.articles, batch_size=3, columns=['pmid', 'pubmed_type', 'mesh']))
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        self.assertEqual(list(batches[1].columns), ['pmid', 'pubmed_type', 'mesh'])
+        self.assertEqual(batches[1].columns['pubmed_type'], ([1], ['article', 'book']))
+        self.assertRaises(MetaPubError, next, iter_batches(self.articles, columns=['bogus']))
+
+    def test_records_and_articles_match(self):
+        records = [pma.to_record() for pma in self.articles]
+        from_articles = next(iter_batches(self.articles))
+        from_records = next(iter_batches(records))
+        for name in COLUMNS:
+            self.assertEqual(from_records.column(name), from_articles.column(name), name)
+
+    def test_export_format(self):
+        self.assertRaises(MetaPubError, export, self.articles, os.path.join(self.tmpdir, 'articles.csv'))
+
+    @unittest.skipIf(columnar.numpy is None, 'numpy not installed')
+    def test_numpy(self):
+        arrays = columnar.to_numpy(self.articles)
+        self.assertEqual(arrays['pmid'].dtype.name, 'int64')
+        self.assertEqual(arrays['year'].dtype.name, 'int16')
+        self.assertEqual(len(arrays['authors.offsets']), 5)
+        path = os.path.join(self.tmpdir, 'articles.npz')
+        self.assertEqual(export(self.articles, path), 4)
+
+    @unittest.skipIf(columnar.pyarrow is None, 'pyarrow not installed')
+    def test_arrow(self):
+        table = columnar.to_arrow_table(self.articles, batch_size=2)
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.column('journal').to_pylist(), [pma.journal for pma in self.articles])
+        path = os.path.join(self.tmpdir, 'articles.parquet')
+        self.assertEqual(export(self.articles, path, batch_size=2), 4)
+        self.assertEqual(columnar.pyarrow.parquet.read_table(path).num_rows, 4)
+        path = os.path.join(self.tmpdir, 'articles.arrows')
+        self.assertEqual(export(self.articles, path, batch_size=2), 4)
+        self.assertEqual(columnar.pyarrow.ipc.open_stream(path).read_all().num_rows, 4)
+
+    def test_missing_dependency(self):
+        if columnar.pyarrow is None:
+            self.assertRaises(MetaPubError, columnar.to_arrow_table, self.articles)
+        if columnar.numpy is None:
+            self.assertRaises(MetaPubError, columnar.to_numpy, self.articles)
+
+
+if __name__ == '__main__':
+    unittest.main()
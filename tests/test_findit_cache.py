@@ -0,0 +1,93 @@
+import unittest, tempfile, shutil, time
+
+from metapub import FindIt
+from metapub.findit import findit as findit_module
+
+
+class FakePMA(object):
+    pmid = '26111251'
+    doi = '10.1000/test'
+    journal = 'J Test'
+    year = '2015'
+
+
+class CountingFetcher(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def article_by_pmid(self, pmid):
+        self.calls += 1
+        return FakePMA()
+
+
+class TestFindItCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = findit_module._get_findit_cache(self.tmpdir)
+        self.cache[26111251] = {'url': 'http://example.com/article.pdf', 'reason': None, 'verify': True,
+                                'doi': '10.1000/test', 'doi_score': 10.0, 'journal': 'J Test', 'year': '2015',
+                                'timestamp': time.time()}
+
+    def tearDown(self):
+        findit_module.FINDIT_CACHES.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache_hit_skips_fetch(self):
+        fetcher = CountingFetcher()
+        src = FindIt('26111251', fetcher=fetcher, cachedir=self.tmpdir)
+        self.assertEqual(src.url, 'http://example.com/article.pdf')
+        self.assertEqual(src.doi, '10.1000/test')
+        self.assertEqual(fetcher.calls, 0)
+        # the article is fetched when it's needed.
+        self.assertEqual(src.pma.journal, 'J Test')
+        self.assertEqual(fetcher.calls, 1)
+        self.assertEqual(src.reason, '')
+
+    def test_expired_result_is_deleted(self):
+        self.cache[1] = {'url': 'http://example.com/1.pdf', 'reason': None, 'verify': True,
+                         'timestamp': time.time() - 3600}
+        src = FindIt.__new__(FindIt)
+        src._cache = self.cache
+        src._log = findit_module.logging.getLogger('metapub.FindIt')
+        self.assertEqual(src._query_cache(1)['url'], 'http://example.com/1.pdf')
+        self.assertEqual(src._query_cache(1, expiry_date=time.time() - 60), None)
+        self.assertRaises(KeyError, self.cache.__getitem__, 1)
+
+    def test_cache_ttl(self):
+        findit_module.CACHE_TTL = 60
+        try:
+            self.cache[1] = {'url': 'http://example.com/1.pdf', 'reason': None, 'verify': True,
+                             'timestamp': time.time() - 3600}
+            self.assertEqual(FindIt.lookup_cached(1, cachedir=self.tmpdir), None)
+            self.assertFalse(findit_module.usable_cache_result(self.cache[1]))
+            self.assertTrue(findit_module.usable_cache_result(self.cache[26111251]))
+        finally:
+            findit_module.CACHE_TTL = None
+
+    def test_lookup_cached(self):
+        result = FindIt.lookup_cached(26111251, cachedir=self.tmpdir)
+        self.assertEqual(result['url'], 'http://example.com/article.pdf')
+        self.assertEqual(FindIt.lookup_cached('1', cachedir=self.tmpdir), None)
+        self.cache[1] = {'url': 'http://example.com/1.pdf', 'reason': None, 'verify': False,
+                         'timestamp': time.time()}
+        self.assertEqual(FindIt.lookup_cached('1', cachedir=self.tmpdir)['url'], 'http://example.com/1.pdf')
+        self.assertEqual(FindIt.lookup_cached('1', verify=True, cachedir=self.tmpdir), None)
+        self.assertEqual(FindIt.lookup_cached(' 1\n', cachedir=self.tmpdir)['url'], 'http://example.com/1.pdf')
+        self.assertEqual(FindIt.lookup_cached('bogus', cachedir=self.tmpdir), None)
+        self.assertEqual(FindIt.lookup_cached('', cachedir=self.tmpdir), None)
+
+    def test_cache_per_cachedir(self):
+        other_dir = tempfile.mkdtemp()
+        try:
+            other = findit_module._get_findit_cache(other_dir)
+            self.assertIsNot(other, self.cache)
+            self.assertIs(findit_module._get_findit_cache(self.tmpdir), self.cache)
+            other[1] = {'url': 'http://example.com/other.pdf', 'reason': None, 'verify': True,
+                        'timestamp': time.time()}
+            self.assertEqual(FindIt.lookup_cached(1, cachedir=other_dir)['url'], 'http://example.com/other.pdf')
+            self.assertEqual(FindIt.lookup_cached(1, cachedir=self.tmpdir), None)
+            self.assertEqual(FindIt.lookup_cached(26111251, cachedir=other_dir), None)
+        finally:
+            shutil.rmtree(other_dir)
@@ -0,0 +1,89 @@
+import unittest
+
+from metapub.findit import logic
+from metapub.findit.logic import resolve_strategy, resolve_strategies, find_article_from_pma, Strategy
+from metapub.findit.dances import the_jci_jig, the_pii_polka, the_biomed_calypso
+from metapub.findit.journals import jci_journals, todo_journals
+from metapub.exceptions import NoPDFLink
+
+
+class FakePMA(object):
+    pmc = None
+    pmid = '1'
+    doi = None
+    pii = None
+
+    def __init__(self, journal):
+        self.journal = journal
+
+
+class TestResolveStrategy(unittest.TestCase):
+
+    def test_publisher(self):
+        strategy = resolve_strategy('J Clin Invest')
+        self.assertEqual(strategy.name, 'jci')
+        self.assertIs(strategy.dance, the_jci_jig)
+
+    def test_no_substring_matches(self):
+        # jci_journals used to be a plain string, so 'J Clin' matched it.
+        self.assertEqual(jci_journals, ('J Clin Invest', ))
+        self.assertEqual(resolve_strategy('J Clin'), None)
+        self.assertEqual(resolve_strategy('Not A Journal'), None)
+
+    def test_bmc(self):
+        self.assertIs(resolve_strategy('BMC Genomics').dance, the_biomed_calypso)
+        self.assertEqual(resolve_strategy('BMC Some New Journal').name, 'bmc')
+
+    def test_precedence(self):
+        # listed under both pii and sciencedirect: identifier lists come first.
+        self.assertIs(resolve_strategy('Arch Med Res').dance, the_pii_polka)
+        self.assertEqual([s.name for s in resolve_strategies('Arch Med Res')], ['pii', 'sciencedirect'])
+
+    def test_overlapping_publishers(self):
+        # journals in several publisher lists were sent to each in turn, the last to
+        # succeed winning: so the later list is tried first, the earlier as fallback.
+        expected = {
+            'Bioorg Med Chem Lett': ['sciencedirect', 'wiley'],
+            'J Formos Med Assoc': ['sciencedirect', 'wiley'],
+            'Ann Hepatol': ['sciencedirect', 'springer'],
+            'J Infect Chemother': ['sciencedirect', 'springer'],
+            'J Invest Dermatol': ['sciencedirect', 'nature'],
+        }
+        for jrnl, names in expected.items():
+            self.assertEqual([s.name for s in resolve_strategies(jrnl)], names, jrnl)
+            self.assertEqual(resolve_strategy(jrnl).name, names[0], jrnl)
+
+    def test_falls_through_to_next_dance(self):
+        calls = []
+
+        def no_link(pma, verify=True):
+            calls.append('pii')
+            raise NoPDFLink('MISSING: pii')
+
+        def no_url(pma, verify=True):
+            calls.append('wiley')
+
+        def found(pma, verify=True):
+            calls.append('springer')
+            return 'http://example.com/1.pdf'
+
+        index = logic._STRATEGY_INDEX
+        logic._STRATEGY_INDEX = {'Fake J': (Strategy('pii', no_link, True), Strategy('wiley', no_url, False),
+                                            Strategy('springer', found, False))}
+        try:
+            url, reason = find_article_from_pma(FakePMA('Fake J'), verify=False)
+        finally:
+            logic._STRATEGY_INDEX = index
+        self.assertEqual(url, 'http://example.com/1.pdf')
+        self.assertEqual(reason, 'MISSING: pii')
+        self.assertEqual(calls, ['pii', 'wiley', 'springer'])
+
+    def test_todo_and_cantdo(self):
+        self.assertEqual(resolve_strategy('Pharmacol Rep').name, 'todo')
+        url, reason = find_article_from_pma(FakePMA('Pharmacol Rep'), verify=False)
+        self.assertEqual(url, None)
+        self.assertEqual(reason, 'TODO: format example: %s' % todo_journals['Pharmacol Rep']['example'])
+
+    def test_noformat(self):
+        url, reason = find_article_from_pma(FakePMA('Not A Journal'), verify=False)
+        self.assertEqual(reason, 'NOFORMAT: No URL format for journal "Not A Journal"')
@@ -0,0 +1,150 @@
+import unittest, threading, time, tempfile, shutil
+
+from metapub import FindIt, FindItPool
+from metapub import sessions
+from metapub.findit import pool
+from metapub.findit import findit as findit_module
+from metapub.exceptions import InvalidPMID
+
+
+class FakeFindIt(object):
+    """ stands in for FindIt; records the most lookups seen running at once. """
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def __init__(self, pmid, fetcher=None, **kwargs):
+        cls = FakeFindIt
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        time.sleep(0.02)
+        with cls.lock:
+            cls.running -= 1
+        if pmid == 'bad':
+            raise InvalidPMID('bad pmid')
+        self.pmid = pmid
+        self.doi = '10.1000/%s' % pmid
+        self.doi_score = 10.0
+        self.url = 'http://example.com/%s.pdf' % pmid
+        self.reason = None
+        self._pma = None
+        self._cache_result = {'journal': 'J Test', 'year': '2015'}
+
+
+class TestFindItPool(unittest.TestCase):
+
+    def setUp(self):
+        self._findit = pool.FindIt
+        pool.FindIt = FakeFindIt
+        FakeFindIt.max_running = 0
+
+    def tearDown(self):
+        pool.FindIt = self._findit
+
+    def test_imap(self):
+        pmids = [str(i) for i in range(20)] + ['bad']
+        results = list(FindItPool(workers=4, cachedir=None, fetcher=object()).imap(iter(pmids)))
+        self.assertEqual(sorted(r.pmid for r in results), sorted(pmids))
+        self.assertTrue(1 < FakeFindIt.max_running <= 4)
+        by_pmid = dict((r.pmid, r) for r in results)
+        self.assertEqual(by_pmid['3'].url, 'http://example.com/3.pdf')
+        self.assertEqual(by_pmid['3'].journal, 'J Test')
+        self.assertTrue(by_pmid['bad'].reason.startswith('ERROR:'))
+        self.assertEqual(by_pmid['bad'].url, None)
+
+    def test_map_keeps_order(self):
+        pmids = ['5', '1', '3']
+        results = FindItPool(workers=2, cachedir=None, fetcher=object()).map(pmids)
+        self.assertEqual([r.pmid for r in results], pmids)
+
+    def test_batch(self):
+        results = list(FindIt.batch(['1', '2'], workers=2, cachedir=None, fetcher=object()))
+        self.assertEqual(sorted(r.pmid for r in results), ['1', '2'])
+
+    def test_host_limits(self):
+        findit_pool = FindItPool(workers=2, max_per_host=3, host_limits={'publisher.example.com': 1},
+                                 cachedir=None, fetcher=object())
+        limiter = findit_pool.limiter
+        self.assertEqual(limiter.limit('http://other.example.com/a.pdf'), 3)
+        self.assertEqual(limiter.limit('publisher.example.com'), 1)
+        self.assertEqual(limiter.limit('www.tandfonline.com'), 1)
+        self.assertIs(limiter.slots('http://publisher.example.com/a'), limiter.slots('publisher.example.com'))
+        # the pool's limits apply to its workers only, not to every session in the process.
+        self.assertEqual(sessions.settings()['max_concurrent'], None)
+        self.assertEqual(sessions.settings('www.tandfonline.com')['max_concurrent'], None)
+
+    def test_cached_results_skip_workers(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = findit_module._get_findit_cache(tmpdir)
+            cache.set_many({1: {'url': 'http://example.com/cached.pdf', 'reason': None, 'verify': True,
+                                'journal': 'J Cached', 'timestamp': time.time()},
+                            2: {'url': None, 'reason': 'NOFORMAT: retry me', 'verify': True,
+                                'timestamp': time.time()}})
+            FakeFindIt.max_running = 0
+            results = FindItPool(workers=2, cachedir=tmpdir, fetcher=object()).map(['1', '2'])
+            self.assertEqual(results[0].url, 'http://example.com/cached.pdf')
+            self.assertEqual(results[0].journal, 'J Cached')
+            # NOFORMAT results are retried, so '2' went to a worker.
+            self.assertEqual(results[1].url, 'http://example.com/2.pdf')
+            self.assertEqual(FakeFindIt.max_running, 1)
+        finally:
+            findit_module.FINDIT_CACHES.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_feed_error_raised(self):
+        def pmids():
+            yield '1'
+            yield '2'
+            raise ValueError('unreadable input')
+
+        results = []
+        with self.assertRaises(ValueError):
+            for result in FindItPool(workers=2, cachedir=None, fetcher=object()).imap(pmids()):
+                results.append(result.pmid)
+        self.assertEqual(sorted(results), ['1', '2'])
+
+    def test_pmids_normalized(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            findit_module._get_findit_cache(tmpdir)[123] = {'url': 'http://example.com/cached.pdf', 'reason': None,
+                                                            'verify': True, 'timestamp': time.time()}
+            FakeFindIt.max_running = 0
+            results = FindItPool(workers=2, cachedir=tmpdir, fetcher=object()).map(['0123', 5, ' 7 '])
+            self.assertEqual([r.pmid for r in results], ['0123', '5', '7'])
+            self.assertEqual(results[0].url, 'http://example.com/cached.pdf')
+            self.assertEqual(results[2].url, 'http://example.com/7.pdf')
+        finally:
+            findit_module.FINDIT_CACHES.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_cached_results_bounded(self):
+        read = []
+
+        def pmids():
+            for i in range(1000):
+                read.append(i)
+                yield str(i)
+
+        class AllCachedPool(pool.FindItPool):
+            def _cached_results(self, pmids):
+                return dict((pmid, pool.FindItResult(pmid, None, None, None, '', None, None)) for pmid in pmids)
+
+        saved_prefetch_size = pool.PREFETCH_SIZE
+        pool.PREFETCH_SIZE = 5
+        threads_before = threading.active_count()
+        try:
+            results = AllCachedPool(workers=1, cachedir=None, fetcher=object()).imap(pmids())
+            next(results)
+            time.sleep(0.2)
+            # the feeder stops when the results queue (workers * 2 + PREFETCH_SIZE) is full.
+            self.assertLess(len(read), 20)
+            results.close()
+            for _ in range(50):
+                if threading.active_count() <= threads_before:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(threading.active_count(), threads_before)
+        finally:
+            pool.PREFETCH_SIZE = saved_prefetch_size
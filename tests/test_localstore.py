@@ -0,0 +1,108 @@
+import unittest, os, shutil, tempfile
+
+from metapub import PubMedFetcher, PubMedArticle
+from metapub.localstore import LocalPubMedStore, normalize_journal, normalize_pmcid
+from metapub.exceptions import MetaPubError, InvalidPMID
+
+SAMPLE_UPDATE_FILE = 'tests/data/sample_medline_update.xml'
+
+
+class TestLocalStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'pubmed-local.db')
+        self.store = LocalPubMedStore(self.path)
+        self.assertEqual(self.store.load_files([SAMPLE_UPDATE_FILE]), 3)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_normalize(self):
+        self.assertEqual(normalize_journal('Biochem. Biophys. Res. Commun.'), 'biochem biophys res commun')
+        self.assertEqual(normalize_pmcid('3458974'), 'PMC3458974')
+        self.assertEqual(normalize_pmcid('pmc3458974'), 'PMC3458974')
+
+    def test_lookups(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertTrue('5' in self.store)
+        self.assertFalse('7' in self.store)
+        pma = self.store.get_article('5')
+        self.assertTrue(isinstance(pma, PubMedArticle))
+        self.assertEqual(pma.doi, '10.1016/0006-291x(75)90507-0')
+        self.assertEqual(self.store.get_article('20301579').pubmed_type, 'book')
+        self.assertEqual(self.store.pmid_for_doi('10.1016/0006-291X(75)90507-0'), '5')
+        self.assertEqual(self.store.pmid_for_pmcid('PMC1'), None)
+
+    def test_citation(self):
+        pmids = self.store.pmids_for_citation(journal='Biochem Biophys Res Commun', year=1975,
+                                              volume=66, first_page=1338, author='Wiesmann UN')
+        self.assertEqual(sorted(pmids), ['4', '5'])
+        self.assertEqual(self.store.pmids_for_citation(journal='Biochem Biophys Res Commun', volume=67), [])
+        self.assertEqual(self.store.pmids_for_citation(author='Wiesmann'), [])
+
+    def test_citation_journal_aliases(self):
+        # the ISO abbreviation, MEDLINE abbreviation and full title all find the articles.
+        for journal in ('Biochem. Biophys. Res. Commun.', 'Biochem Biophys Res Commun',
+                        'Biochemical and biophysical research communications'):
+            pmids = self.store.pmids_for_citation(journal=journal, year=1975, volume=66, first_page=1338)
+            self.assertEqual(sorted(pmids), ['4', '5'], journal)
+        self.assertEqual(self.store.pmids_for_citation(journal='Biochemical research', year=1975), [])
+
+    def test_reload_replaces(self):
+        self.store.load_file(SAMPLE_UPDATE_FILE)
+        self.assertEqual(len(self.store), 3)
+
+    def test_applied_files(self):
+        self.assertEqual(self.store.applied_files(), ['sample_medline_update.xml'])
+        self.assertTrue(self.store.is_applied('/elsewhere/sample_medline_update.xml'))
+        self.assertEqual(self.store.load_files([SAMPLE_UPDATE_FILE]), 0)
+
+    def test_sync(self):
+        update_dir = os.path.join(self.tmpdir, 'updatefiles')
+        os.mkdir(update_dir)
+        with open(os.path.join(update_dir, 'pubmed99n0002.xml'), 'wb') as fh:
+            fh.write(b'<PubmedArticleSet><DeleteCitation><PMID Version="1">4</PMID></DeleteCitation>'
+                     b'</PubmedArticleSet>')
+        shutil.copy(SAMPLE_UPDATE_FILE, os.path.join(update_dir, 'pubmed99n0001.xml'))
+        with open(os.path.join(update_dir, 'README.txt'), 'w') as fh:
+            fh.write('not an update file')
+
+        self.assertEqual(self.store.sync(update_dir), ['pubmed99n0001.xml', 'pubmed99n0002.xml'])
+        self.assertFalse('4' in self.store)
+        self.assertTrue('5' in self.store)
+        # already applied: nothing to do, and PMID 4 stays deleted.
+        self.assertEqual(self.store.sync(update_dir), [])
+        self.assertFalse('4' in self.store)
+        self.assertEqual(self.store.applied_files()[-2:], ['pubmed99n0001.xml', 'pubmed99n0002.xml'])
+
+    def test_fetcher(self):
+        fetch = PubMedFetcher('local', local_store=self.path)
+        try:
+            self.assertEqual(fetch.article_by_pmid(4).pmid, '4')
+            self.assertRaises(InvalidPMID, fetch.article_by_pmid, '7')
+            self.assertEqual(fetch.article_by_doi('10.1016/0006-291x(75)90507-0').pmid, '5')
+            self.assertRaises(MetaPubError, fetch.article_by_pmcid, 'PMC1')
+            self.assertEqual([pma.pmid for pma in fetch.articles_by_pmids(['5', '7', '4'])], ['5', '4'])
+            self.assertEqual(fetch.last_missing_pmids, ['7'])
+            self.assertEqual(sorted(fetch.pmids_for_citation(journal='Biochem. Biophys. Res. Commun.',
+                                                             year='1975', volume='66', spage='1338',
+                                                             aulast='Wiesmann')), ['4', '5'])
+            self.assertFalse(hasattr(fetch, 'pmids_for_query'))
+        finally:
+            fetch.store.close()
+
+    def test_fetcher_stays_local(self):
+        fetch = PubMedFetcher('local', local_store=self.path)
+        try:
+            # e.g. FindIt makes a PubMedFetcher() of its own.
+            eutils_fetch = PubMedFetcher()
+            self.assertEqual(fetch.method, 'local')
+            self.assertEqual(fetch.article_by_pmid, fetch._local_article_by_pmid)
+            self.assertEqual(fetch.article_by_pmid(4).pmid, '4')
+            self.assertEqual(eutils_fetch.method, 'eutils')
+            self.assertEqual(eutils_fetch.article_by_pmid, eutils_fetch._eutils_article_by_pmid)
+            self.assertTrue(hasattr(eutils_fetch, 'pmids_for_query'))
+        finally:
+            fetch.store.close()
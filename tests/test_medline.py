@@ -0,0 +1,74 @@
+import unittest, gzip, os, shutil, tempfile
+
+from metapub import PubMedArticle
+from metapub.medline import (iter_medline_file, iter_medline_files, iter_medline_elements,
+                             map_medline_files, deleted_pmids_from_element, MedlineRecord)
+from metapub.exceptions import MetaPubError
+
+SAMPLE_UPDATE_FILE = 'tests/data/sample_medline_update.xml'
+
+
+def pmid_and_journal(pma):
+    return (pma.pmid, pma.journal)
+
+
+class TestMedline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.gzpath = os.path.join(self.tmpdir, 'pubmed_sample.xml.gz')
+        with gzip.open(self.gzpath, 'wb') as fh:
+            fh.write(open(SAMPLE_UPDATE_FILE, 'rb').read())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_articles(self):
+        articles = list(iter_medline_file(self.gzpath))
+        self.assertEqual([pma.pmid for pma in articles], ['4', '5', '20301579'])
+        self.assertTrue(all(isinstance(pma, PubMedArticle) for pma in articles))
+        self.assertEqual(articles[1].doi, '10.1016/0006-291x(75)90507-0')
+        self.assertEqual(articles[2].pubmed_type, 'book')
+
+    def test_records_match_articles(self):
+        records = list(iter_medline_file(SAMPLE_UPDATE_FILE, records=True))
+        articles = list(iter_medline_file(SAMPLE_UPDATE_FILE))
+        for rec, pma in zip(records, articles):
+            self.assertTrue(isinstance(rec, MedlineRecord))
+            for field in ('pmid', 'pubmed_type', 'doi', 'pmc', 'pii', 'journal', 'volume', 'issue',
+                          'first_page', 'title'):
+                self.assertEqual(getattr(rec, field), getattr(pma, field), field)
+            self.assertEqual(rec.year, str(pma.year))
+
+    def test_delete_citations(self):
+        deleted = []
+        for tag, elem in iter_medline_elements(self.gzpath):
+            if tag == 'DeleteCitation':
+                deleted.extend(deleted_pmids_from_element(elem))
+        self.assertEqual(deleted, ['7', '8'])
+
+    def test_multiprocessing(self):
+        paths = [self.gzpath, SAMPLE_UPDATE_FILE]
+        records = list(iter_medline_files(paths, records=True, processes=2))
+        self.assertEqual([rec.pmid for rec in records], ['4', '5', '20301579'] * 2)
+        self.assertRaises(MetaPubError, list, iter_medline_files(paths, processes=2))
+
+        results = list(map_medline_files(pmid_and_journal, paths, processes=2))
+        self.assertEqual(results[:2], [('4', 'Biochem. Biophys. Res. Commun.'),
+                                       ('5', 'Biochem. Biophys. Res. Commun.')])
+        self.assertEqual(len(results), 6)
+
+    def test_multiprocessing_bounded(self):
+        # files are handed out as results are consumed, not all at once.
+        read = []
+
+        def paths():
+            for i in range(20):
+                read.append(i)
+                yield SAMPLE_UPDATE_FILE
+
+        results = map_medline_files(pmid_and_journal, paths(), processes=2)
+        self.assertEqual(next(results), ('4', 'Biochem. Biophys. Res. Commun.'))
+        self.assertLessEqual(len(read), 5)
+        self.assertEqual(len(list(results)), 20 * 3 - 1)
+        self.assertEqual(len(read), 20)
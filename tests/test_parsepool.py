@@ -0,0 +1,76 @@
+import unittest
+
+from metapub import PubMedArticle, PubMedFetcher, PubMedRecord
+from metapub.parsepool import ParsePool, parse_records
+from metapub.medline import iter_medline_file
+from metapub.pubmedfetcher import split_pubmed_article_set
+from metapub.exceptions import BaseXMLError
+
+from tests.test_pubmed_fetcher import FakeEutilsClient
+
+SAMPLE_UPDATE_FILE = 'tests/data/sample_medline_update.xml'
+SAMPLE_ARTICLE_SET = 'tests/data/sample_pubmed_article_set.xml'
+
+
+def sample_xmls():
+    return [xml for pmid, xml in split_pubmed_article_set(open(SAMPLE_ARTICLE_SET, 'rb').read())]
+
+
+class TestParsePool(unittest.TestCase):
+
+    def test_imap(self):
+        xmls = sample_xmls() * 5
+        expected = [PubMedArticle(xml).to_record() for xml in xmls]
+        with ParsePool(processes=2, chunksize=3) as pool:
+            records = list(pool.imap(xmls))
+        self.assertEqual(records, expected)
+        self.assertEqual([rec.pmid for rec in records], ['4', '5'] * 5)
+
+        with ParsePool(processes=1, drop=('abstract', )) as pool:
+            records = list(pool.imap(xmls))
+        self.assertEqual([rec.pmid for rec in records], ['4', '5'] * 5)
+        self.assertIsNone(records[0].abstract)
+
+    def test_bounded(self):
+        read = []
+
+        def xmls():
+            for idx in range(50):
+                read.append(idx)
+                yield sample_xmls()[idx % 2]
+
+        pool = ParsePool(processes=2, chunksize=2, max_pending=3)
+        try:
+            records = pool.imap(xmls())
+            next(records)
+            # 3 chunks in flight plus the one that was waiting for room.
+            self.assertLessEqual(len(read), 2 * 4)
+            self.assertEqual(len(list(records)), 49)
+        finally:
+            pool.close()
+
+    def test_parse_error(self):
+        for processes in (1, 2):
+            self.assertRaises(BaseXMLError, list, parse_records([sample_xmls()[0], b'not xml'], processes=processes))
+
+    def test_medline_file(self):
+        expected = [pma.to_record() for pma in iter_medline_file(SAMPLE_UPDATE_FILE)]
+        records = list(iter_medline_file(SAMPLE_UPDATE_FILE, processes=2))
+        self.assertEqual(records, expected)
+
+    def test_articles_by_pmids(self):
+        fetch = PubMedFetcher()
+        real_qs = fetch.qs
+        fetch.qs = FakeEutilsClient()
+        try:
+            with ParsePool(processes=2) as pool:
+                records = list(fetch.articles_by_pmids(['4', '5', 'bogus', '6'], chunk_size=2, processes=pool))
+        finally:
+            fetch.qs = real_qs
+        self.assertTrue(all(isinstance(rec, PubMedRecord) for rec in records))
+        self.assertEqual([rec.pmid for rec in records], ['4', '5', '4', '5'])
+        self.assertEqual(fetch.last_missing_pmids, ['bogus', '6'])
+
+
+if __name__ == '__main__':
+    unittest.main()
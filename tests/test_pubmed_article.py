@@ -1,6 +1,7 @@
 import unittest
 from metapub.exceptions import *
-from metapub import PubMedArticle, PubMedFetcher
+from metapub import PubMedArticle, PubMedAuthor, PubMedFetcher
+from metapub.pubmedarticle import determine_pubmed_xml_type
 
 import random
 
@@ -328,3 +329,104 @@ class TestPubMedArticle(unittest.TestCase):
     def test_to_dict(self):
         article = PubMedArticle(xml_str1)
         self.assertTrue(isinstance(article.to_dict(), dict))
+
+    def test_to_dict_leaves_article_intact(self):
+        article = PubMedArticle(xml_str1)
+        outd = article.to_dict()
+        self.assertNotIn('content', outd)
+        self.assertNotIn('xml', outd)
+        self.assertEqual(outd['pubmed_type'], 'article')
+        outd['title'] = 'changed'
+        # the article can still be used (and converted again).
+        self.assertNotEqual(article.title, 'changed')
+        self.assertEqual(article.to_dict()['pmid'], article.pmid)
+        self.assertIsNotNone(article.content)
+
+    def test_lazy_matches_eager(self):
+        def comparable(value):
+            # PubMedAuthor objects don't compare equal; compare their string forms.
+            if isinstance(value, list):
+                return [str(item) if isinstance(item, PubMedAuthor) else item for item in value]
+            return value
+
+        xmls = [xml_str1, xml_str2,
+                open('tests/data/sample_pubmed_article_set.xml', 'rb').read(),
+                open('tests/data/sample_pubmed_book_article.xml', 'rb').read()]
+        for xml in xmls:
+            eager = PubMedArticle(xml)
+            lazy = PubMedArticle(xml, lazy=True)
+            for name in PubMedArticle._ATTRIBUTES:
+                self.assertEqual(comparable(getattr(lazy, name)), comparable(getattr(eager, name)), name)
+            lazy_dict = PubMedArticle(xml, lazy=True).to_dict()
+            eager_dict = eager.to_dict()
+            self.assertEqual(sorted(lazy_dict.keys()), sorted(eager_dict.keys()))
+            for key in eager_dict:
+                self.assertEqual(comparable(lazy_dict[key]), comparable(eager_dict[key]), key)
+
+    def test_lazy_parses_on_demand(self):
+        article = PubMedArticle(xml_str1, lazy=True)
+        self.assertNotIn('authors', article.__dict__)
+        self.assertEqual(article.author1_last_fm, 'Wiesmann UN')
+        self.assertIn('authors', article.__dict__)
+        self.assertNotIn('mesh', article.__dict__)
+        self.assertRaises(AttributeError, getattr, article, 'no_such_attribute')
+
+    def test_book_article(self):
+        article = PubMedArticle(open('tests/data/sample_pubmed_book_article.xml', 'rb').read())
+        self.assertEqual(article.pubmed_type, 'book')
+        self.assertEqual(article.pmid, '20301579')
+        self.assertEqual(article.book_accession_id, 'NBK1405')
+        self.assertEqual(article.journal, article.book_title)
+        self.assertEqual(article.year, 2002)
+        self.assertEqual(article.book_editors, ['Pagon RA', 'Adam MP'])
+        self.assertIsNone(article.volume)
+
+    def test_retain_xml(self):
+        xml = open('tests/data/sample_pubmed_book_article.xml', 'rb').read()
+        self.assertEqual(PubMedArticle(xml).xml, xml)
+        article = PubMedArticle(xml, retain_xml=False)
+        self.assertIsNone(article.xml)
+        self.assertEqual(article.to_record(), PubMedArticle(xml).to_record())
+        lazy = PubMedArticle(xml_str1, lazy=True, retain_xml=False)
+        self.assertIsNone(lazy.xml)
+        self.assertEqual(lazy.pmid, '4')
+
+    def test_parsed_fields(self):
+        # one fixture per kind of root element the precompiled XPaths are built for.
+        book_xml = open('tests/data/sample_pubmed_book_article.xml', 'rb').read()
+        expected = [
+            (xml_str1, {'pmid': '4', 'journal': 'Biochem. Biophys. Res. Commun.', 'year': '1975',
+                        'volume': '66', 'issue': '4', 'pages': '1338-43', 'first_page': '1338',
+                        'issn': '0006-291X', 'pii': '0006-291X(75)90506-9', 'doi': None,
+                        'authors': ['Wiesmann UN', 'DiDonato S', 'Herschkowitz NN'], 'pubmed_type': 'article'}),
+            (xml_str2, {'pmid': '23697015', 'journal': 'J Egypt Soc Parasitol', 'year': '2013',
+                        'volume': '43', 'issue': '1', 'pages': '41-56', 'issn': '1110-0583',
+                        'title': 'The Rift Valley fever: could re-emerge in Egypt again?',
+                        'authors': ['El-Bahnasawy M', 'Megahed LA', 'Abdalla Saleh HA', 'Morsy TA'],
+                        'pubmed_type': 'article'}),
+            (book_xml, {'pmid': '20301579', 'journal': 'GeneReviews', 'year': 2002, 'volume': None,
+                        'book_accession_id': 'NBK1405', 'book_editors': ['Pagon RA', 'Adam MP'],
+                        'book_publisher': 'University of Washington, Seattle',
+                        'authors': [u'Tranebj\u00e6rg L', 'Samson RA'], 'pubmed_type': 'book'}),
+        ]
+        for xml, fields in expected:
+            for lazy in (False, True):
+                # parsed twice, so that a second instance is checked too.
+                for article in (PubMedArticle(xml, lazy=lazy), PubMedArticle(xml, lazy=lazy)):
+                    article_dict = article.to_dict()
+                    for name, value in fields.items():
+                        self.assertEqual(article_dict[name], value, (fields['pmid'], lazy, name))
+
+    def test_pubmed_type(self):
+        book_xml = open('tests/data/sample_pubmed_book_article.xml', 'rb').read()
+        self.assertEqual(determine_pubmed_xml_type(book_xml), 'book')
+        self.assertEqual(determine_pubmed_xml_type(book_xml.decode('utf-8')), 'book')
+        self.assertEqual(determine_pubmed_xml_type(xml_str1), 'article')
+        self.assertEqual(determine_pubmed_xml_type(xml_str1.encode('utf-8')), 'article')
+        self.assertEqual(determine_pubmed_xml_type(b'<MedlineCitation/>'), 'unknown')
+
+        # the type comes from the parsed document, so a bare PubmedArticle works too.
+        bare = xml_str1[xml_str1.index('<PubmedArticle>'):xml_str1.index('</PubmedArticleSet>')]
+        article = PubMedArticle(bare)
+        self.assertEqual(article.pubmed_type, 'article')
+        self.assertEqual(article.to_record(), PubMedArticle(xml_str1).to_record())
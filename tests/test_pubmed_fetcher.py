@@ -1,7 +1,7 @@
 import unittest, os
 
 from metapub import PubMedFetcher 
-from metapub.pubmedfetcher import parse_related_pmids_result
+from metapub.pubmedfetcher import parse_related_pmids_result, split_pubmed_article_set
 from metapub.pubmedcentral import *
 
 
@@ -18,6 +18,36 @@ except OSError:
     pass
 
 
+class FakeEutilsClient(object):
+    """ stands in for the eutils QueryService; returns the sample article set for any efetch. """
+
+    def __init__(self):
+        self.efetch_calls = []
+        self.esearch_calls = []
+
+    def efetch(self, args):
+        self.efetch_calls.append(args)
+        return open('tests/data/sample_pubmed_article_set.xml', 'rb').read()
+
+    def esearch(self, args):
+        self.esearch_calls.append(args)
+        return b'<eSearchResult><Count>2</Count><IdList><Id>4</Id><Id>5</Id></IdList></eSearchResult>'
+
+    def esearch_history(self, args):
+        self.esearch_calls.append(args)
+        return (b'<eSearchResult><Count>5</Count><RetMax>0</RetMax><RetStart>0</RetStart>'
+                b'<QueryKey>1</QueryKey><WebEnv>NCID_1_TEST</WebEnv><IdList/></eSearchResult>')
+
+    def efetch_history(self, args):
+        self.efetch_calls.append(args)
+        if args.get('rettype') == 'uilist':
+            start = args['retstart']
+            ids = range(start, min(start + args['retmax'], 5))
+            return ('<eSearchResult><IdList>%s</IdList></eSearchResult>' %
+                    ''.join(['<Id>%i</Id>' % (100 + i) for i in ids])).encode()
+        return open('tests/data/sample_pubmed_article_set.xml', 'rb').read()
+
+
 class TestPubmedFetcher(unittest.TestCase):
 
     def setUp(self):
@@ -37,6 +67,86 @@ class TestPubmedFetcher(unittest.TestCase):
         article = fetch.article_by_pmid(pmid)
         assert str(article.pmid) == pmid
 
+    def test_split_pubmed_article_set(self):
+        xmlstr = open('tests/data/sample_pubmed_article_set.xml', 'rb').read()
+        items = list(split_pubmed_article_set(xmlstr))
+        assert [pmid for pmid, xml in items] == ['4', '5']
+        for pmid, xml in items:
+            assert xml.count(b'<PubmedArticle>') == 1
+
+    def test_articles_by_pmids(self):
+        fetch = PubMedFetcher()
+        real_qs = fetch.qs
+        fetch.qs = FakeEutilsClient()
+        try:
+            articles = list(fetch.articles_by_pmids(['4', 5, '6', 'bogus', '4'], chunk_size=2))
+            efetch_calls = fetch.qs.efetch_calls
+        finally:
+            fetch.qs = real_qs
+
+        # duplicates and malformed PMIDs are not requested; '6' goes in a second chunk.
+        assert [call['id'] for call in efetch_calls] == ['4,5', '6']
+        assert [article.pmid for article in articles] == ['4', '5', '4', '5']
+        assert fetch.last_missing_pmids == ['bogus', '6']
+
+    def test_articles_by_dois(self):
+        from metapub import pubmedfetcher
+
+        def fake_batch_convert_ids(ids, cachedir=None):
+            pmids = {'10.1016/0006-291x(75)90506-9': '4', '10.1016/0006-291x(75)90507-0': '5'}
+            return dict((doi, {'pmid': pmids.get(doi)}) for doi in ids)
+
+        fetch = PubMedFetcher()
+        real_qs = fetch.qs
+        real_batch_convert_ids = pubmedfetcher.batch_convert_ids
+        fetch.qs = FakeEutilsClient()
+        pubmedfetcher.batch_convert_ids = fake_batch_convert_ids
+        try:
+            articles = list(fetch.articles_by_dois(['10.1016/0006-291x(75)90506-9', '10.9999/unknown',
+                                                    '10.1016/0006-291x(75)90507-0']))
+            efetch_calls = fetch.qs.efetch_calls
+        finally:
+            fetch.qs = real_qs
+            pubmedfetcher.batch_convert_ids = real_batch_convert_ids
+
+        assert [call['id'] for call in efetch_calls] == ['4,5']
+        assert [article.pmid for article in articles] == ['4', '5']
+        assert fetch.last_missing_pmids == ['10.9999/unknown']
+
+    def test_pmids_for_query_paging(self):
+        fetch = PubMedFetcher()
+        real_qs = fetch.qs
+        fetch.qs = FakeEutilsClient()
+        try:
+            pmids = fetch.pmids_for_query('some query', retstart=500, retmax=100)
+            esearch_calls = fetch.qs.esearch_calls
+        finally:
+            fetch.qs = real_qs
+        assert pmids == ['4', '5']
+        assert esearch_calls[0]['retstart'] == 500
+        assert esearch_calls[0]['retmax'] == 100
+
+    def test_history_paging(self):
+        fetch = PubMedFetcher()
+        real_qs = fetch.qs
+        fetch.qs = FakeEutilsClient()
+        try:
+            pmids = list(fetch.iter_pmids_for_query('some query', batch_size=2))
+            assert fetch.last_history['webenv'] == 'NCID_1_TEST'
+            assert fetch.last_history['count'] == 5
+            assert [call['retstart'] for call in fetch.qs.efetch_calls] == [0, 2, 4]
+
+            fetch.qs.efetch_calls = []
+            articles = list(fetch.articles_from_history(fetch.last_history, batch_size=3))
+            efetch_calls = fetch.qs.efetch_calls
+        finally:
+            fetch.qs = real_qs
+
+        assert pmids == ['100', '101', '102', '103', '104']
+        assert [call['retstart'] for call in efetch_calls] == [0, 3]
+        assert all(call['query_key'] == '1' for call in efetch_calls)
+        assert [article.pmid for article in articles] == ['4', '5', '4', '5']
+
     def test_related_pmids(self):
         """ * pubmed    (all related links)
             * citedin   (papers that cited this paper)
@@ -0,0 +1,62 @@
+import unittest, pickle
+
+from metapub import PubMedArticle, PubMedRecord
+from metapub.medline import iter_medline_file
+from metapub.pubmedrecord import RECORD_FIELDS, DERIVED_FIELDS
+
+SAMPLE_UPDATE_FILE = 'tests/data/sample_medline_update.xml'
+SAMPLE_BOOK_ARTICLE = 'tests/data/sample_pubmed_book_article.xml'
+
+
+class TestPubMedRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.articles = list(iter_medline_file(SAMPLE_UPDATE_FILE))
+        self.articles.append(PubMedArticle(open(SAMPLE_BOOK_ARTICLE, 'rb').read()))
+
+    def test_fields_match_article(self):
+        self.assertEqual(set(RECORD_FIELDS + DERIVED_FIELDS),
+                         set(PubMedArticle._ATTRIBUTES) | set(['pubmed_type']))
+
+    def test_values_match_article(self):
+        for pma in self.articles:
+            record = pma.to_record()
+            outd = record.to_dict()
+            for name in RECORD_FIELDS + DERIVED_FIELDS:
+                if name == 'author_list':
+                    self.assertEqual([au['last_name'] for au in outd[name]],
+                                     [au.last_name for au in pma.author_list])
+                else:
+                    self.assertEqual(outd[name], getattr(pma, name), name)
+            self.assertEqual(str(record), str(pma))
+
+    def test_compact(self):
+        record = self.articles[1].to_record()
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertIsInstance(record.authors, tuple)
+        self.assertIsInstance(record.mesh, tuple)
+        self.assertEqual(record.author1_last_fm, self.articles[1].author1_last_fm)
+
+    def test_strings_shared(self):
+        first = PubMedArticle(self.articles[0].xml).to_record()
+        second = PubMedArticle(self.articles[0].xml).to_record()
+        self.assertIs(first.journal, second.journal)
+        if first.mesh:
+            self.assertIs(first.mesh[0].descriptor_name, second.mesh[0].descriptor_name)
+
+    def test_round_trips(self):
+        for pma in self.articles:
+            record = pma.to_record()
+            self.assertEqual(PubMedRecord.from_dict(record.to_dict()), record)
+            self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+            self.assertEqual(pickle.loads(pickle.dumps(record, 0)), record)
+
+    def test_drop(self):
+        record = self.articles[1].to_record(drop=('abstract', 'mesh'))
+        self.assertEqual(record.abstract, None)
+        self.assertEqual(record.mesh, None)
+        self.assertEqual(record.doi, self.articles[1].doi)
+
+
+if __name__ == '__main__':
+    unittest.main()
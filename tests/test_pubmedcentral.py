@@ -0,0 +1,67 @@
+import unittest, shutil, tempfile
+
+from metapub import pubmedcentral
+from metapub.pubmedcentral import batch_convert_ids
+
+
+class FakeResponse(object):
+
+    def __init__(self, content):
+        self.content = content
+
+
+class TestBatchConvertIds(unittest.TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.calls = []
+        self._get = pubmedcentral.ratelimit.get
+        pubmedcentral.ratelimit.get = self.fake_get
+        pubmedcentral.PMC_IDCONV_CACHES.clear()
+
+    def tearDown(self):
+        pubmedcentral.ratelimit.get = self._get
+        pubmedcentral.PMC_IDCONV_CACHES.clear()
+        shutil.rmtree(self.cachedir)
+
+    def fake_get(self, url, params=None, **kwargs):
+        self.calls.append(params)
+        return FakeResponse(open('tests/data/idconv_response.xml', 'rb').read())
+
+    def test_batch_convert_ids(self):
+        ids = ['PMC3531190', 'PMC2808187', 'PMC0000000', '12345']
+        result = batch_convert_ids(ids, cachedir=self.cachedir, chunk_size=2)
+
+        # PMCIDs and PMIDs go in separate requests, at most chunk_size IDs each.
+        self.assertEqual(sorted((call['idtype'], call['ids']) for call in self.calls),
+                         [('pmcid', 'PMC0000000'), ('pmcid', 'PMC3531190,PMC2808187'), ('pmid', '12345')])
+
+        self.assertEqual(sorted(result.keys()), sorted(ids))
+        self.assertEqual(result['PMC3531190']['pmid'], '23193287')
+        self.assertEqual(result['PMC3531190']['doi'], '10.1093/nar/gks1195')
+        self.assertEqual(result['PMC2808187']['versions'], ['PMC2808187.1', 'PMC2808187.2'])
+        self.assertIsNone(result['PMC0000000']['pmid'])
+        self.assertEqual(result['PMC0000000']['errmsg'], 'invalid article id')
+        self.assertIsNone(result['12345']['pmid'])
+
+    def test_cache(self):
+        batch_convert_ids(['PMC3531190', 'PMC0000000'], cachedir=self.cachedir)
+        self.assertEqual(len(self.calls), 1)
+
+        # successful conversions are cached; errors are not.
+        result = batch_convert_ids(['pmc3531190', 'PMC0000000'], cachedir=self.cachedir)
+        self.assertEqual(self.calls[-1]['ids'], 'PMC0000000')
+        self.assertEqual(result['pmc3531190']['pmid'], '23193287')
+
+    def test_cache_per_cachedir(self):
+        batch_convert_ids(['PMC3531190'], cachedir=self.cachedir)
+        other_cachedir = tempfile.mkdtemp()
+        try:
+            # a different cachedir has its own cache, so the id is requested again.
+            batch_convert_ids(['PMC3531190'], cachedir=other_cachedir)
+            self.assertEqual(len(self.calls), 2)
+            self.assertEqual(len(pubmedcentral.PMC_IDCONV_CACHES), 2)
+            batch_convert_ids(['PMC3531190'], cachedir=other_cachedir)
+            self.assertEqual(len(self.calls), 2)
+        finally:
+            shutil.rmtree(other_cachedir)
@@ -0,0 +1,80 @@
+import unittest
+
+from metapub import ratelimit
+from metapub.ratelimit import TokenBucket, HostPolicy, configure_host, get_policy, get_ncbi_bucket
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reserve_spaces_out_requests(self):
+        bucket = TokenBucket(10)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_shared_bucket(self):
+        bucket = TokenBucket(10, shared=True)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_ncbi_bucket_rates(self):
+        policy = HostPolicy(rate=3, rate_with_key=10)
+        self.assertEqual(policy.bucket().rate, 3)
+        self.assertEqual(policy.bucket(api_key='abc').rate, 10)
+        # keyed and unkeyed requests share one bucket, so mixing them stays under 10/s.
+        self.assertIs(policy.bucket(), policy.bucket(api_key='abc'))
+        self.assertEqual(policy.bucket().rate, 10)
+        self.assertIs(get_ncbi_bucket(), get_ncbi_bucket(api_key='abc'))
+        self.assertIs(get_policy('https://eutils.ncbi.nlm.nih.gov/entrez/eutils/ecitmatch.cgi'),
+                      get_policy('https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/'))
+
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.replies = []
+        self._request = ratelimit.sessions.request
+        ratelimit.sessions.request = self.fake_request
+        configure_host('retry.example.com', rate=1000, retries=2, backoff_base=0.001)
+
+    def tearDown(self):
+        ratelimit.sessions.request = self._request
+
+    def fake_request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def test_retries_transient_failures(self):
+        self.replies = [ratelimit.requests.ConnectionError('reset'), FakeResponse(503), FakeResponse(200)]
+        response = ratelimit.get('https://retry.example.com/x')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_gives_up_after_retries(self):
+        self.replies = [FakeResponse(429), FakeResponse(429), FakeResponse(429), FakeResponse(200)]
+        response = ratelimit.get('https://retry.example.com/x')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_does_not_retry_client_errors(self):
+        self.replies = [FakeResponse(404)]
+        self.assertEqual(ratelimit.get('https://retry.example.com/x').status_code, 404)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_backoff(self):
+        policy = HostPolicy(backoff_base=1, backoff_cap=10)
+        for attempt in range(6):
+            self.assertTrue(0 <= policy.backoff(attempt) <= min(10, 2 ** attempt))
+        self.assertEqual(policy.backoff(0, FakeResponse(429, {'Retry-After': '3'})), 3)
+        self.assertEqual(policy.backoff(0, FakeResponse(429, {'Retry-After': '300'})), 10)
@@ -0,0 +1,80 @@
+import unittest, threading
+
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from metapub import sessions
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'%PDF-1.4'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%i/article.pdf' % self.server.server_address[1]
+
+    def tearDown(self):
+        sessions.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_one_session_per_host(self):
+        self.assertIs(sessions.get_session(self.url), sessions.get_session('127.0.0.1'))
+        self.assertIsNot(sessions.get_session(self.url), sessions.get_session('example.com'))
+
+    def test_connection_reuse(self):
+        for i in range(3):
+            self.assertEqual(sessions.get(self.url).content, b'%PDF-1.4')
+        stats = sessions.stats()['127.0.0.1']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], 2)
+
+    def test_configure(self):
+        session = sessions.get_session(self.url)
+        self.assertEqual(session.timeout, sessions.DEFAULT_TIMEOUT)
+        sessions.configure('127.0.0.1', timeout=5)
+        try:
+            # configuring a host replaces its session.
+            self.assertIsNot(sessions.get_session(self.url), session)
+            self.assertEqual(sessions.get_session(self.url).timeout, 5)
+        finally:
+            sessions.configure('127.0.0.1', timeout=sessions.DEFAULT_TIMEOUT)
+        self.assertRaises(TypeError, sessions.configure, bogus=1)
+
+    def test_limiter(self):
+        limiter = sessions.HostLimiter(max_per_host=1)
+        results = []
+
+        def fetch():
+            sessions.use_limiter(limiter)
+            results.append(sessions.get(self.url).content)
+
+        slots = limiter.slots(self.url)
+        slots.acquire()
+        thread = threading.Thread(target=fetch)
+        thread.start()
+        thread.join(0.2)
+        # the thread waits for the host's only slot; other threads aren't limited.
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(sessions.get(self.url).content, b'%PDF-1.4')
+        slots.release()
+        thread.join()
+        self.assertEqual(results, [b'%PDF-1.4'])
+        self.assertIsNone(sessions.HostLimiter().slots(self.url))
@@ -0,0 +1,150 @@
+import unittest, threading, tempfile, shutil
+
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from metapub import sessions
+from metapub.exceptions import NoPDFLink
+from metapub.config import DEFAULT_CACHE_DIR
+from metapub.findit import dances
+from metapub.findit.dances import verify_pdf_url, set_verify_method, configure_verify_cache
+
+PDF_BODY = b'%PDF-1.4\n' + b'x' * 100000
+
+
+class PublisherHandler(BaseHTTPRequestHandler):
+    """ /article.pdf: a PDF; /nohead.pdf: a PDF, but HEAD is refused;
+    /page.pdf: html; /login.pdf: 401; /gone.pdf: 404; /nohead403.pdf: a PDF, but
+    HEAD gets 403. """
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        self.requests_seen.append((self.command, self.path, self.headers.get('Range')))
+        if self.path == '/login.pdf':
+            return self.send(401, 'text/html', b'login', send_body)
+        if self.path == '/gone.pdf':
+            return self.send(404, 'text/html', b'not found', send_body)
+        if self.path == '/nohead403.pdf' and not send_body:
+            return self.send(403, 'text/html', b'', send_body)
+        if self.path == '/page.pdf':
+            return self.send(200, 'text/html', b'<html></html>', send_body)
+        if self.path == '/nohead.pdf' and not send_body:
+            return self.send(405, 'text/html', b'', send_body)
+        body = PDF_BODY
+        status = 200
+        if self.headers.get('Range'):
+            start, end = self.headers.get('Range').split('=')[1].split('-')
+            body = PDF_BODY[int(start):int(end) + 1]
+            status = 206
+        self.send(status, 'application/octet-stream', body, send_body)
+
+    def send(self, status, content_type, body, send_body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestVerifyPdfUrl(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), PublisherHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = 'http://127.0.0.1:%i' % self.server.server_address[1]
+        PublisherHandler.requests_seen = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.ttls = (dances.VERIFY_CACHE_TTL, dances.VERIFY_CACHE_NEGATIVE_TTL)
+        configure_verify_cache(self.tmpdir)
+
+    def tearDown(self):
+        configure_verify_cache(DEFAULT_CACHE_DIR, *self.ttls)
+        shutil.rmtree(self.tmpdir)
+        set_verify_method('127.0.0.1', None)
+        sessions.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_range_checks_magic_number(self):
+        # served as application/octet-stream, so a HEAD alone isn't conclusive.
+        url = self.base + '/article.pdf'
+        self.assertEqual(verify_pdf_url(url), url)
+        self.assertEqual(PublisherHandler.requests_seen,
+                         [('HEAD', '/article.pdf', None), ('GET', '/article.pdf', 'bytes=0-1023')])
+
+    def test_head_refused(self):
+        url = self.base + '/nohead.pdf'
+        self.assertEqual(verify_pdf_url(url), url)
+        self.assertEqual(PublisherHandler.requests_seen[-1][0], 'GET')
+
+    def test_head_forbidden(self):
+        url = self.base + '/nohead403.pdf'
+        self.assertEqual(verify_pdf_url(url), url)
+        self.assertEqual([req[0] for req in PublisherHandler.requests_seen], ['HEAD', 'GET'])
+
+    def test_dead_link_not_retried(self):
+        try:
+            verify_pdf_url(self.base + '/gone.pdf', 'Test')
+            self.fail('NoPDFLink not raised')
+        except NoPDFLink as error:
+            self.assertTrue(str(error).startswith('TXERROR: 404 status returned from Test url'))
+        # a 404 on HEAD is definitive: no range GET follows.
+        self.assertEqual(PublisherHandler.requests_seen, [('HEAD', '/gone.pdf', None)])
+
+    def test_not_a_pdf(self):
+        self.assertRaises(NoPDFLink, verify_pdf_url, self.base + '/page.pdf')
+        try:
+            verify_pdf_url(self.base + '/login.pdf', 'Test')
+        except NoPDFLink as error:
+            self.assertTrue(str(error).startswith('DENIED: Test url'))
+        # a 401 on HEAD is taken at its word.
+        self.assertEqual(len(PublisherHandler.requests_seen), 3)
+
+    def test_per_host_method(self):
+        set_verify_method('127.0.0.1', 'range')
+        verify_pdf_url(self.base + '/article.pdf')
+        self.assertEqual([req[0] for req in PublisherHandler.requests_seen], ['GET'])
+        self.assertRaises(ValueError, set_verify_method, 'Wiley', 'bogus')
+
+    def test_get_method(self):
+        # plain GET relies on the content-type.
+        self.assertRaises(NoPDFLink, verify_pdf_url, self.base + '/article.pdf', method='get')
+        self.assertEqual(PublisherHandler.requests_seen, [('GET', '/article.pdf', None)])
+
+    def test_cache(self):
+        url = self.base + '/article.pdf'
+        verify_pdf_url(url, method='range')
+        verify_pdf_url(url, method='range')
+        self.assertEqual(len(PublisherHandler.requests_seen), 1)
+        entry = dances.VERIFY_CACHE[url]
+        self.assertEqual((entry['status'], entry['reason']), (206, None))
+        verify_pdf_url(url, method='range', use_cache=False)
+        self.assertEqual(len(PublisherHandler.requests_seen), 2)
+
+    def test_cache_negative_expiry(self):
+        url = self.base + '/login.pdf'
+        self.assertRaises(NoPDFLink, verify_pdf_url, url)
+        self.assertRaises(NoPDFLink, verify_pdf_url, url)
+        self.assertEqual(len(PublisherHandler.requests_seen), 1)
+        self.assertTrue(dances.VERIFY_CACHE[url]['reason'].startswith('DENIED'))
+
+        configure_verify_cache(self.tmpdir, negative_ttl=-1)
+        self.assertRaises(NoPDFLink, verify_pdf_url, url)
+        self.assertEqual(len(PublisherHandler.requests_seen), 2)
+
+    def test_cache_disabled(self):
+        configure_verify_cache(None)
+        verify_pdf_url(self.base + '/article.pdf', method='range')
+        self.assertEqual(dances._get_verify_cache(), None)